@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import statistics
+from typing import Callable, List, Any
+
+# Benchmarks are run as scripts from any directory, make the generator modules importable
+generator_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+if generator_dir not in sys.path:
+    sys.path.insert(0, generator_dir)
+
+def measure(function:Callable[[], Any], repeat:int=10) -> List[float]:
+    times: List[float] = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return times
+
+def report(name:str, times:List[float]) -> None:
+    print('{:<40} min {:>9.3f} ms   median {:>9.3f} ms   ({} runs)'.format(
+        name, min(times) * 1000, statistics.median(times) * 1000, len(times)))
+
+def state_machine(number_of_states:int) -> str:
+    # Description of a state machine with the given number of leaf states, in composite states of
+    # ten leaf states each. The first leaf state of a composite state has guarded transitions to its
+    # siblings, all leaf states have guarded transitions to the next composite state and an internal
+    # transition, so all phases of parsing and semantic analysis have work to do
+    groups = (number_of_states + 9) // 10
+    lines = ['[*] --> C0']
+    for c in range(groups):
+        lines.append('state C{} {{'.format(c))
+        leaves = range(c * 10, min(c * 10 + 10, number_of_states))
+        for s in leaves:
+            lines.append('    state S{}'.format(s))
+        lines.append('    [*] --> S{}'.format(leaves[0]))
+        lines.append('}')
+
+        for s in leaves[1:]:
+            lines.append('S{} --> S{} : E{} [G{} & !G{}] / A{}'.format(leaves[0], s, s % 10, s % 5, (s + 1) % 5, s % 7))
+
+    for s in range(number_of_states):
+        lines.append('S{} --> C{} : F{} [!G{}] / A{}'.format(s, (s // 10 + 1) % groups, s % 10, s % 5, s % 3))
+        lines.append('S{} : I{} / A{}'.format(s, s % 10, s % 11))
+
+    return '\n'.join(lines) + '\n'
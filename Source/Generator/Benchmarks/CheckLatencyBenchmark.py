@@ -0,0 +1,70 @@
+import BenchmarkHelpers
+import os
+import io
+import sys
+import contextlib
+import subprocess
+import tempfile
+from Parser import FloHsmParser
+from SemanticAnalyzer import SemanticAnalyzer
+import FloHsm
+
+# Measures the latency of checking a state machine description (lexer, parser and semantic analyzer,
+# no code generation) and fails (exit code 1) when checking a model with 1,000 states takes longer
+# than the target. The model cache is disabled, because editors check a different text on every
+# keystroke. Start up of a separate FloHsm.py --check process is reported, but not part of the target.
+# The parser uses the lexer of FloHsm.check
+
+TARGET_MS = 100.0
+TARGET_STATES = 1000
+
+def check_phases(parser:FloHsmParser, text:str) -> None:
+    parser.parse(text, merge=True)
+    SemanticAnalyzer().analyze(parser.states, parser.merge_errors)
+
+def main() -> int:
+    with contextlib.redirect_stderr(io.StringIO()):
+        parser = FloHsmParser(lexer=FloHsm.check_lexer(None))
+
+    success = True
+    for number_of_states in [100, TARGET_STATES]:
+        text = BenchmarkHelpers.state_machine(number_of_states)
+        diagnostics = FloHsm.check_model(text, '', parser)
+        if len(diagnostics) != 0:
+            print('FAILED: unexpected diagnostic: {}'.format(diagnostics[0].message))
+            return 1
+
+        parse = BenchmarkHelpers.measure(lambda: parser.parse(text), repeat=5)
+        check = BenchmarkHelpers.measure(lambda: check_phases(parser, text), repeat=5)
+        BenchmarkHelpers.report('Parse, {} states'.format(number_of_states), parse)
+        BenchmarkHelpers.report('Check, {} states'.format(number_of_states), check)
+
+        if number_of_states == TARGET_STATES:
+            print('Check {:.3f} ms, target {:.3f} ms'.format(min(check) * 1000, TARGET_MS))
+            if min(check) * 1000 > TARGET_MS:
+                print('FAILED: check exceeds target')
+                success = False
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file = os.path.join(temp_dir, 'machine.txt')
+        with open(input_file, 'w') as f:
+            f.write(BenchmarkHelpers.state_machine(TARGET_STATES))
+
+        # The parser tables are cached, so only the first run generates them
+        command = [sys.executable, os.path.join(BenchmarkHelpers.generator_dir, 'FloHsm.py'), '--check', input_file]
+        env = dict(os.environ, FLOHSM_CACHE_DIR=os.path.join(temp_dir, 'cache'))
+        run = lambda: subprocess.run(command, env=env, capture_output=True, check=True)
+        run()
+
+        # Every run checks a new text, so the model cache doesn't hit
+        def run_changed() -> None:
+            with open(input_file, 'a') as f:
+                f.write('\n')
+            run()
+
+        BenchmarkHelpers.report('FloHsm.py --check, {} states'.format(TARGET_STATES), BenchmarkHelpers.measure(run_changed, repeat=5))
+
+    return 0 if success else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import BenchmarkHelpers
+import io
+import sys
+import gc
+import contextlib
+import tracemalloc
+import Descriptors
+import Parser
+from Parser import FloHsmParser
+from typing import Dict, List, Tuple
+
+# Measures the peak memory (tracemalloc) of parsing a large model, which creates a State for every
+# line and the transitions, actions and guards on it, and the memory that the parsed states keep.
+# The descriptor classes have __slots__. For comparison, the same is measured with copies of the
+# classes without __slots__, which have a __dict__ per instance like before. Fails (exit code 1)
+# when the slotted classes don't reduce the peak by at least MIN_REDUCTION
+
+NUMBER_OF_STATES = 12000
+MIN_REDUCTION = 0.10
+
+SLOTTED_CLASSES = ['Guard', 'SimpleGuard', 'NotGuard', 'OrGuard', 'AndGuard', 'Action', 'InternalTransition',
+                   'StateTransition', 'InitialTransition', 'ChoiceTransition', 'EntryExit', 'EventTransitions', 'State']
+
+def without_slots() -> Dict[str, type]:
+    # Copies of the descriptor classes with the same methods, but without __slots__. Base classes come
+    # first in SLOTTED_CLASSES, so that the copies of subclasses derive from the copies of their bases
+    copies: Dict[str, type] = dict()
+    for name in SLOTTED_CLASSES:
+        cls = getattr(Descriptors, name)
+        slots = cls.__dict__['__slots__']
+        namespace = {k : v for k, v in cls.__dict__.items() if k not in slots and k not in ('__slots__', '__dict__', '__weakref__')}
+        bases = tuple(copies.get(base.__name__, base) for base in cls.__bases__)
+        copies[name] = type(name, bases, namespace)
+
+    return copies
+
+def use_classes(classes:Dict[str, type]) -> None:
+    for module in [Descriptors, Parser]:
+        for name, cls in classes.items():
+            if hasattr(module, name):
+                setattr(module, name, cls)
+
+def measure_parse(parser:FloHsmParser, text:str) -> Tuple[int, int]:
+    # Returns the peak memory during parsing and the memory still used by the parsed states
+    parser.states = list()
+    gc.collect()
+    tracemalloc.start()
+    parser.parse(text)
+    gc.collect()
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, kept
+
+def main() -> int:
+    with contextlib.redirect_stderr(io.StringIO()):
+        parser = FloHsmParser()
+
+    text = BenchmarkHelpers.state_machine(NUMBER_OF_STATES)
+    lines = text.count('\n')
+    slotted = {name : getattr(Descriptors, name) for name in SLOTTED_CLASSES}
+
+    results: List[Tuple[str, int, int]] = list()
+    for name, classes in [('__dict__', without_slots()), ('__slots__', slotted)]:
+        use_classes(classes)
+        peak, kept = measure_parse(parser, text)
+        if len(parser.errors) != 0:
+            print('FAILED: unexpected error: {}'.format(parser.errors[0]))
+            return 1
+
+        print('Parse {} lines, {:<10} peak {:>8.1f} MB   kept {:>8.1f} MB'.format(lines, name, peak / 2**20, kept / 2**20))
+        results.append((name, peak, kept))
+
+    reduction = 1 - results[1][1] / results[0][1]
+    print('Peak reduced by {:.0%}'.format(reduction))
+    if reduction < MIN_REDUCTION:
+        print('FAILED: reduction below {:.0%}'.format(MIN_REDUCTION))
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
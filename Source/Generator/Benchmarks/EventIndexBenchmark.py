@@ -0,0 +1,75 @@
+import BenchmarkHelpers
+import sys
+from Descriptors import State, StateTransition, InternalTransition, Action, SimpleGuard, Guard
+from typing import List, Set
+
+# Measures the queries per event (events, guards, guard conditions, internal and state transitions)
+# on a state with 1,000 events, in the order in which the code generator and the semantic analyzer use
+# them. The state keeps an index of its transitions per event, the same queries scanning all
+# transitions of the state for every event are measured for comparison. Fails (exit code 1) when the
+# index isn't at least MIN_SPEEDUP times faster. Scanning is quadratic in the number of events, the
+# threshold is well below the measured speedup (about 15x), because timings vary a lot between runs
+
+NUMBER_OF_EVENTS = 1000
+MIN_SPEEDUP = 5.0
+
+def state_with_events(number_of_events:int) -> State:
+    state_transitions = list()
+    internal_transitions = list()
+    for e in range(number_of_events):
+        event = 'E{}'.format(e)
+        state_transitions.append(StateTransition(event, 'S1', guard=SimpleGuard('G{}'.format(e), e)))
+        state_transitions.append(StateTransition(event, 'S2', guard=SimpleGuard('H{}'.format(e), e)))
+        internal_transitions.append(InternalTransition(event, action=Action('A{}'.format(e))))
+
+    return State('S0', 1, internal_transitions=internal_transitions, state_transitions=state_transitions)
+
+def query_index(state:State) -> int:
+    count = 0
+    for e in sorted(state.events()):
+        count += len(state.guards_for_event(e))
+        count += len(state.guard_conditions_for_event(e))
+        count += len(state.internal_transitions_for_event(e))
+        count += len(state.state_transitions_for_event(e))
+
+    return count
+
+def query_scan(state:State) -> int:
+    count = 0
+    events = {it.event for it in state.internal_transitions} | {st.event for st in state.state_transitions}
+    for e in sorted(events):
+        guards: List[Guard] = [it.guard for it in state.internal_transitions if it.event == e and it.guard is not None]
+        guards.extend(st.guard for st in state.state_transitions if st.event == e and st.guard is not None)
+        conditions: Set[str] = set()
+        count += len(guards)
+        count += len(conditions.union(*[g.guard_conditions() for g in guards]))
+        count += len([it for it in state.internal_transitions if it.event == e])
+        count += len([st for st in state.state_transitions if st.event == e])
+
+    return count
+
+def main() -> int:
+    state = state_with_events(NUMBER_OF_EVENTS)
+    if query_index(state) != query_scan(state):
+        print('FAILED: index and scan give different results')
+        return 1
+
+    def indexed() -> None:
+        state.event_index = None
+        query_index(state)
+
+    scan_times = BenchmarkHelpers.measure(lambda: query_scan(state), repeat=3)
+    index_times = BenchmarkHelpers.measure(indexed, repeat=10)
+    BenchmarkHelpers.report('Scan, {} events'.format(NUMBER_OF_EVENTS), scan_times)
+    BenchmarkHelpers.report('Index, {} events (incl. building)'.format(NUMBER_OF_EVENTS), index_times)
+
+    speedup = min(scan_times) / min(index_times)
+    print('Speedup: {:.1f}x'.format(speedup))
+    if speedup < MIN_SPEEDUP:
+        print('FAILED: speedup below {:.1f}x'.format(MIN_SPEEDUP))
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import BenchmarkHelpers
+import sys
+from GuardAnalysis import guard_engine, GUARD_ENGINES
+from Descriptors import Guard, SimpleGuard, NotGuard, AndGuard, OrGuard
+from typing import List
+
+# Measures how the guard engines scale with the number of guard conditions of one event. The
+# event has a guard per condition that is true when that condition and the next are true and the
+# condition after that is false, which keeps guards from overlapping for most assignments.
+# Engines that can't analyze a number of guard conditions within the time limit are skipped for
+# larger numbers
+
+TIME_LIMIT = 5.0
+
+def guards(number_of_conditions:int) -> List[Guard]:
+    conditions = ['G{:02}'.format(i) for i in range(number_of_conditions)]
+    result: List[Guard] = list()
+    for i, c in enumerate(conditions):
+        next_condition = conditions[(i + 1) % number_of_conditions]
+        after_next_condition = conditions[(i + 2) % number_of_conditions]
+        result.append(AndGuard(AndGuard(SimpleGuard(c, i), SimpleGuard(next_condition, i)), NotGuard(SimpleGuard(after_next_condition, i))))
+
+    result.append(OrGuard(SimpleGuard(conditions[0], 0), NotGuard(SimpleGuard(conditions[-1], 0))))
+    return result
+
+def main() -> int:
+    too_slow = set()
+    for number_of_conditions in [4, 8, 12, 16, 20, 30, 40, 60]:
+        event_guards = guards(number_of_conditions)
+        conditions = set().union(*[g.guard_conditions() for g in event_guards])
+        bit_index = Guard.generate_bit_index(conditions)
+
+        for name in sorted(GUARD_ENGINES):
+            if name in too_slow:
+                continue
+
+            engine = guard_engine(name)
+            def analyze() -> None:
+                engine.first_overlap(event_guards, bit_index)
+                engine.first_uncovered(event_guards, bit_index)
+
+            times = BenchmarkHelpers.measure(analyze, repeat=3)
+            BenchmarkHelpers.report('{}, {} conditions'.format(name, number_of_conditions), times)
+            if min(times) > TIME_LIMIT / 10:
+                too_slow.add(name)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import BenchmarkHelpers
+import os
+import io
+import sys
+import contextlib
+from Parser import FloHsmParser
+from Descriptors import Guard
+from GuardAnalysis import EnumerationEngine
+from typing import Callable, List, Tuple, Dict
+
+# Measures the analysis of guards by the enumeration engine (constant values, overlapping and
+# uncovered assignments per event and per choice pseudo state), with the guards evaluated by walking
+# the tree (Guard.evaluate), compiled (Guard.compile) and as the engine chooses by the number of guard
+# conditions (EnumerationEngine.MIN_COMPILED_CONDITIONS). The guards are those of
+# TestExhaustive/exhaustive.txt and of generated models in the same style, one with the guards of
+# BenchmarkHelpers.state_machine and one with wider guards of eight conditions per event. Small models
+# are analyzed repeatedly, so that every measurement has at least MIN_EVALUATIONS evaluations. The
+# three ways are measured in turns, so that they are equally affected by other load on the machine.
+# Compilation is done once per guard and is reported separately. Fails (exit code 1) when the choice
+# of the engine is more than MAX_SLOWDOWN times slower than the fastest way for any model, or when
+# compiled guards aren't at least MIN_SPEEDUP times faster than walking the tree for the wide guards
+
+MIN_EVALUATIONS = 20000
+MAX_SLOWDOWN = 1.25
+MIN_SPEEDUP = 2.0
+ROUNDS = 9
+
+Groups = List[Tuple[List[Guard], Dict[str, int]]]
+
+def wide_guards(number_of_states:int) -> str:
+    lines = ['[*] --> S0']
+    for s in range(number_of_states):
+        for k in range(4):
+            g = ['G{}'.format((s + k + j) % 8) for j in range(8)]
+            guard = '{} & !{} | ({} & {}) | !{} & {} & {} | {}'.format(*g)
+            lines.append('S{} --> S{} : E{} [{}] / A{}'.format(s, (s + k + 1) % number_of_states, s % 3, guard, k))
+
+    return '\n'.join(lines) + '\n'
+
+def guard_groups(parser:FloHsmParser, text:str) -> Groups:
+    parser.parse(text)
+    groups = list()
+    for state in parser.states:
+        for event in sorted(state.events()):
+            guards = state.guards_for_event(event)
+            if len(guards) != 0:
+                groups.append((guards, Guard.generate_bit_index(state.guard_conditions_for_event(event))))
+        if len(state.choice_transitions) != 0:
+            groups.append((state.choice_guards(), Guard.generate_bit_index(state.choice_guard_conditions())))
+
+    return groups
+
+def engine(min_compiled_conditions:int) -> EnumerationEngine:
+    enumeration = EnumerationEngine()
+    enumeration.MIN_COMPILED_CONDITIONS = min_compiled_conditions
+    return enumeration
+
+def analyze(enumeration:EnumerationEngine, groups:Groups) -> None:
+    for guards, bit_index in groups:
+        for g in guards:
+            enumeration.constant_value(g)
+        enumeration.first_overlap(guards, bit_index)
+        enumeration.first_uncovered(guards, bit_index)
+
+def measure_in_turns(functions:List[Callable[[], None]]) -> List[List[float]]:
+    times: List[List[float]] = [list() for _ in functions]
+    for _ in range(ROUNDS):
+        for function, function_times in zip(functions, times):
+            function_times.extend(BenchmarkHelpers.measure(function, repeat=1))
+
+    return times
+
+def speedup(reference:List[float], times:List[float]) -> str:
+    ratio = min(reference) / min(times)
+    return '{:.1f}x faster'.format(ratio) if ratio >= 1 else '{:.1f}x slower'.format(1 / ratio)
+
+def main() -> int:
+    with contextlib.redirect_stderr(io.StringIO()):
+        parser = FloHsmParser()
+
+    with open(os.path.join(BenchmarkHelpers.generator_dir, '..', 'Generated', 'TestExhaustive', 'exhaustive.txt')) as f:
+        exhaustive = f.read()
+
+    success = True
+    models = [('exhaustive.txt', exhaustive), ('1000 states', BenchmarkHelpers.state_machine(1000)), ('wide guards', wide_guards(100))]
+    for name, text in models:
+        groups = guard_groups(parser, text)
+        compilation = BenchmarkHelpers.measure(lambda: [g.compile(bit_index) for guards, bit_index in groups for g in guards], repeat=1)
+
+        evaluations = sum(len(guards) * 2**len(bit_index) for guards, bit_index in groups)
+        groups = groups * max(1, MIN_EVALUATIONS // evaluations)
+        walk, compiled, chosen = measure_in_turns([lambda: analyze(engine(sys.maxsize), groups),
+                                                   lambda: analyze(engine(0), groups),
+                                                   lambda: analyze(EnumerationEngine(), groups)])
+
+        BenchmarkHelpers.report('Compile, {}'.format(name), compilation)
+        BenchmarkHelpers.report('Tree walk, {}'.format(name), walk)
+        BenchmarkHelpers.report('Compiled, {}'.format(name), compiled)
+        BenchmarkHelpers.report('Enumeration engine, {}'.format(name), chosen)
+        print('Compiled {}, enumeration engine {} than walking the tree'.format(speedup(walk, compiled), speedup(walk, chosen)))
+
+        if min(chosen) > min(min(walk), min(compiled)) * MAX_SLOWDOWN:
+            print('FAILED: the enumeration engine is more than {:.2f}x slower than the fastest way'.format(MAX_SLOWDOWN))
+            success = False
+
+        if name == 'wide guards' and min(walk) < min(compiled) * MIN_SPEEDUP:
+            print('FAILED: compiled guards are less than {:.1f}x faster'.format(MIN_SPEEDUP))
+            success = False
+
+    return 0 if success else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
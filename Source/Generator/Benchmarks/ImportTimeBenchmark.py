@@ -0,0 +1,73 @@
+import BenchmarkHelpers
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+from typing import List, Dict
+
+# Measures the start up time of FloHsm.py when there is nothing to generate (the outputs are up to date)
+# and fails (exit code 1) when it exceeds the budget. The budget is the time on top of starting a bare
+# interpreter, so it doesn't depend on how slow interpreter start up is on a particular machine.
+# Imports are analyzed with 'python -X importtime', and modules that are expensive to import and only
+# needed when files are actually generated must not be imported at all
+
+BUDGET_MS = 50.0
+FORBIDDEN_MODULES = ['mako', 'ply', 'Parser', 'Lexer', 'SemanticAnalyzer', 'CodeGenerator', 'concurrent.futures']
+
+generator = os.path.join(BenchmarkHelpers.generator_dir, 'FloHsm.py')
+example = os.path.join(BenchmarkHelpers.generator_dir, '..', 'Generated', 'TestChoice', 'choice.txt')
+
+def run(args:List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + args, capture_output=True, text=True, check=True)
+
+def imported_modules(importtime_output:str) -> Dict[str, int]:
+    # Lines look like 'import time:  self [us] | cumulative | imported package'. Returns the
+    # cumulative import time in microseconds by module name
+    modules: Dict[str, int] = dict()
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+
+    return modules
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_file = os.path.join(temp_dir, 'choice.txt')
+        shutil.copy(example, input_file)
+        noop = [generator, input_file, '--cache-dir', os.path.join(temp_dir, 'cache')]
+        run(noop)
+
+        modules = imported_modules(run(['-X', 'importtime'] + noop).stderr)
+        interpreter = BenchmarkHelpers.measure(lambda: run(['-c', 'pass']))
+        generator_noop = BenchmarkHelpers.measure(lambda: run(noop))
+
+    print('Slowest imports (cumulative)')
+    for name, cumulative in sorted(modules.items(), key=lambda m: m[1], reverse=True)[:10]:
+        print('    {:<36} {:>9.3f} ms'.format(name, cumulative / 1000))
+
+    BenchmarkHelpers.report('Interpreter start up', interpreter)
+    BenchmarkHelpers.report('FloHsm.py, outputs up to date', generator_noop)
+
+    overhead = (min(generator_noop) - min(interpreter)) * 1000
+    print('Overhead {:.3f} ms, budget {:.3f} ms'.format(overhead, BUDGET_MS))
+
+    success = True
+    for name in FORBIDDEN_MODULES:
+        if name in modules:
+            print('FAILED: {} is imported'.format(name))
+            success = False
+
+    if overhead > BUDGET_MS:
+        print('FAILED: overhead exceeds budget')
+        success = False
+
+    if sys.flags.dont_write_bytecode:
+        print('Note: bytecode is not written (PYTHONDONTWRITEBYTECODE), so every module is compiled on every run')
+
+    return 0 if success else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
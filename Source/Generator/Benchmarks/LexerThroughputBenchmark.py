@@ -0,0 +1,62 @@
+import BenchmarkHelpers
+import io
+import sys
+import contextlib
+from Lexer import FloHsmLexer, ScanningLexer
+from typing import Union
+
+# Measures the throughput (MB/s) of the PLY lexer and the scanning lexer on a large description and
+# checks that both produce the same tokens. Fails (exit code 1) when the scanning lexer is not at
+# least MIN_SPEEDUP times faster. The scanning lexer is about 1.5x faster, MIN_SPEEDUP leaves room for
+# timing noise
+
+NUMBER_OF_STATES = 20000
+MIN_SPEEDUP = 1.2
+
+def count_tokens(lexer:Union[FloHsmLexer, ScanningLexer], text:str) -> int:
+    lexer.input(text)
+    count = 0
+    token = lexer.token
+    while token() is not None:
+        count += 1
+    return count
+
+def same_tokens(ply_lexer:FloHsmLexer, scanning_lexer:ScanningLexer, text:str) -> bool:
+    ply_lexer.input(text)
+    scanning_lexer.input(text)
+    while True:
+        a = ply_lexer.token()
+        b = scanning_lexer.token()
+        if a is None or b is None:
+            return a is None and b is None
+        if (a.type, a.value, a.lineno, a.lexpos) != (b.type, b.value, b.lineno, b.lexpos):
+            return False
+
+def main() -> int:
+    with contextlib.redirect_stderr(io.StringIO()):
+        ply_lexer = FloHsmLexer()
+    scanning_lexer = ScanningLexer()
+
+    text = BenchmarkHelpers.state_machine(NUMBER_OF_STATES)
+    megabytes = len(text.encode('utf-8')) / 2**20
+    if not same_tokens(ply_lexer, scanning_lexer, text):
+        print('FAILED: the lexers produce different tokens')
+        return 1
+
+    best = dict()
+    for name, lexer in [('ply', ply_lexer), ('scanner', scanning_lexer)]:
+        times = BenchmarkHelpers.measure(lambda: count_tokens(lexer, text), repeat=3)
+        BenchmarkHelpers.report('Lexer {}, {:.1f} MB'.format(name, megabytes), times)
+        print('{:<40} {:>9.2f} MB/s'.format('', megabytes / min(times)))
+        best[name] = min(times)
+
+    speedup = best['ply'] / best['scanner']
+    print('Speedup: {:.1f}x'.format(speedup))
+    if speedup < MIN_SPEEDUP:
+        print('FAILED: speedup below {:.1f}x'.format(MIN_SPEEDUP))
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import BenchmarkHelpers
+import sys
+import gc
+import time
+from SemanticAnalyzer import SemanticAnalyzer
+from Descriptors import State, StateTransition
+from typing import List
+
+# Measures merging of the states the parser creates for every line of a description, from 100 to
+# 100,000 lines, and fails (exit code 1) when the time per line at 100,000 lines is more than
+# MAX_GROWTH times the time per line at 1,000 lines. Every line is a transition, which gives a state
+# for its source and its destination, and there is a state for every ten lines. The former search by
+# comparing names with all merged states is measured for comparison up to 10,000 lines
+
+LINES = [100, 1000, 10000, 100000]
+MAX_GROWTH = 3.0
+REPEAT = 3
+
+def fragments(number_of_lines:int) -> List[State]:
+    number_of_states = max(number_of_lines // 10, 10)
+    states = list()
+    for line in range(number_of_lines):
+        source = 'S{}'.format(line % number_of_states)
+        destination = 'S{}'.format((line * 7 + 1) % number_of_states)
+        states.append(State(source, line + 1, state_transitions=[StateTransition('E{}'.format(line % 10), destination)]))
+        states.append(State(destination, line + 1))
+
+    return states
+
+def search_by_comparing_names(states:List[State]) -> None:
+    merged: List[State] = list()
+    for state in states:
+        current_states = [s for s in merged if s.name == state.name]
+        if len(current_states) == 0:
+            merged.append(state)
+        else:
+            current_states[0].merge(state)
+
+def measure_merge(number_of_lines:int, merge_function) -> List[float]: # type: ignore
+    # Merging changes the states, so every run gets new ones
+    times = list()
+    for _ in range(REPEAT):
+        states = fragments(number_of_lines)
+        gc.collect()
+        start = time.perf_counter()
+        merge_function(states)
+        times.append(time.perf_counter() - start)
+
+    return times
+
+def main() -> int:
+    per_line = dict()
+    for number_of_lines in LINES:
+        times = measure_merge(number_of_lines, lambda states: SemanticAnalyzer().merge_states(states))
+        BenchmarkHelpers.report('Merge, {} lines'.format(number_of_lines), times)
+        per_line[number_of_lines] = min(times) / number_of_lines
+
+        if number_of_lines <= 10000:
+            BenchmarkHelpers.report('Compare names, {} lines'.format(number_of_lines), measure_merge(number_of_lines, search_by_comparing_names))
+
+    for number_of_lines in LINES:
+        print('{:>7} lines: {:.3f} us per line'.format(number_of_lines, per_line[number_of_lines] * 1e6))
+
+    growth = per_line[LINES[-1]] / per_line[1000]
+    print('Time per line grows {:.2f}x from 1,000 to {:,} lines, maximum {:.2f}x'.format(growth, LINES[-1], MAX_GROWTH))
+    if growth > MAX_GROWTH:
+        print('FAILED: merging is not linear')
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
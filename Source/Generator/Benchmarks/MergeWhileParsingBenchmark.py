@@ -0,0 +1,55 @@
+import BenchmarkHelpers
+import io
+import gc
+import sys
+import contextlib
+import tracemalloc
+from Parser import FloHsmParser
+from SemanticAnalyzer import SemanticAnalyzer
+from typing import Callable, Tuple
+
+# Compares parsing a large model into a State per line followed by SemanticAnalyzer.merge_states with
+# merging the states while parsing (FloHsmParser.parse with merge). Reports time and peak memory
+# (tracemalloc) of both and fails (exit code 1) when merging while parsing doesn't use less memory. Both
+# spend nearly all of their time in the parser, so their times are reported but not compared
+
+NUMBER_OF_STATES = 12000
+
+def peak_memory(function:Callable[[], None]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def main() -> int:
+    with contextlib.redirect_stderr(io.StringIO()):
+        parser = FloHsmParser()
+
+    text = BenchmarkHelpers.state_machine(NUMBER_OF_STATES)
+
+    def parse_then_merge() -> None:
+        parser.parse(text)
+        SemanticAnalyzer().merge_states(parser.states)
+
+    def merge_while_parsing() -> None:
+        parser.parse(text, merge=True)
+        SemanticAnalyzer().merge_states(parser.states)
+
+    results = list()
+    for name, function in [('parse, then merge', parse_then_merge), ('merge while parsing', merge_while_parsing)]:
+        times = BenchmarkHelpers.measure(function, repeat=3)
+        peak = peak_memory(function)
+        BenchmarkHelpers.report('{}, {} lines'.format(name, text.count('\n')), times)
+        print('{:<40} peak {:>9.1f} MB'.format('', peak / 2**20))
+        results.append((min(times), peak))
+
+    if results[1][1] >= results[0][1]:
+        print('FAILED: merging while parsing doesn\'t reduce the peak memory')
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+import BenchmarkHelpers
+import io
+import contextlib
+import tempfile
+from Parser import FloHsmParser
+
+# Measures construction time of FloHsmParser (lexer and parser tables)
+# - cold: empty cache directory, tables are generated and stored in the cache
+# - warm: tables are loaded from the cache
+# - no cache: caching disabled, tables are generated every time
+
+def construct_cold() -> None:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        FloHsmParser(cache_dir)
+
+def main() -> None:
+    with contextlib.redirect_stderr(io.StringIO()), tempfile.TemporaryDirectory() as cache_dir:
+        FloHsmParser(cache_dir)
+
+        cold = BenchmarkHelpers.measure(construct_cold)
+        warm = BenchmarkHelpers.measure(lambda: FloHsmParser(cache_dir))
+        no_cache = BenchmarkHelpers.measure(lambda: FloHsmParser(''))
+
+    BenchmarkHelpers.report('FloHsmParser construction (cold)', cold)
+    BenchmarkHelpers.report('FloHsmParser construction (warm)', warm)
+    BenchmarkHelpers.report('FloHsmParser construction (no cache)', no_cache)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import BenchmarkHelpers
+import sys
+from SemanticAnalyzer import SemanticAnalyzer
+from Descriptors import State, StateTransition, InitialTransition
+from typing import List
+
+# Measures the detection of unreachable states at 10,000 states and fails (exit code 1) when it takes
+# longer than TARGET_MS. The detection visits every state once, so the target is a small multiple of
+# the time it takes to list the transitions of all states once. One model is a single chain of transitions, which is as deep as the model is
+# large, the other has composite states of ten states each with transitions between them (see
+# BenchmarkHelpers.state_machine)
+
+TARGET_MS = 25.0
+NUMBER_OF_STATES = 10000
+
+def chain(number_of_states:int) -> List[State]:
+    states = [State('FloHsmInitial_5OdpEA31BEcPrWrNx8u7', -1, initial_transition=InitialTransition('S0'))]
+    for s in range(number_of_states):
+        states.append(State('S{}'.format(s), s + 1, state_transitions=[StateTransition('E', 'S{}'.format(s + 1))]))
+
+    return states
+
+def composites(number_of_states:int) -> List[State]:
+    states = [State('FloHsmInitial_5OdpEA31BEcPrWrNx8u7', -1, initial_transition=InitialTransition('C0'))]
+    groups = number_of_states // 10
+    for c in range(groups):
+        states.append(State('C{}'.format(c), c + 1, initial_transition=InitialTransition('S{}'.format(c * 10))))
+        for s in range(c * 10, c * 10 + 10):
+            transitions = [StateTransition('E', 'S{}'.format(s + 1)), StateTransition('F', 'C{}'.format((c + 1) % groups))]
+            states.append(State('S{}'.format(s), s + 1, parent='C{}'.format(c), state_transitions=transitions))
+
+    return states
+
+def main() -> int:
+    success = True
+    for name, states in [('chain', chain(NUMBER_OF_STATES)), ('composite states', composites(NUMBER_OF_STATES))]:
+        analyzer = SemanticAnalyzer()
+        analyzer.merge_states(states)
+        analyzer.check_inheritance()
+        analyzer.sort_states()
+
+        def detect() -> None:
+            analyzer.errors.clear()
+            analyzer.detect_unreachable_states()
+
+        times = BenchmarkHelpers.measure(detect, repeat=10)
+        if len(analyzer.errors) != 0:
+            print('FAILED: unexpected error: {}'.format(analyzer.errors[0]))
+            return 1
+
+        BenchmarkHelpers.report('Reachability, {}, {} states'.format(name, len(states)), times)
+        if min(times) * 1000 > TARGET_MS:
+            print('FAILED: exceeds target of {:.3f} ms'.format(TARGET_MS))
+            success = False
+
+    return 0 if success else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import BenchmarkHelpers
+import os
+import gc
+import sys
+import tempfile
+import tracemalloc
+from Lexer import ScanningLexer
+from LineReader import read_line_groups
+from typing import Callable, Iterable
+
+# Compares the peak memory (tracemalloc) of lexing an input file that is read as a whole with lexing
+# it in groups of lines (LineReader.read_line_groups), for files of increasing size. The memory of
+# the model itself is the same in both cases and is left out. Fails (exit code 1) when the peak
+# memory of the line groups grows with the size of the file
+
+SIZES = [5000, 20000]
+BLOCK_SIZE = 1 << 16
+
+def peak_memory(function:Callable[[], None]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def lex(lexer:ScanningLexer, chunks:Iterable[str]) -> None:
+    lexer.input_stream(chunks)
+    while lexer.token() is not None:
+        pass
+
+def main() -> int:
+    lexer = ScanningLexer()
+    streaming_peaks = list()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in SIZES:
+            input_file = os.path.join(temp_dir, 'sm{}.txt'.format(size))
+            with open(input_file, 'w') as f:
+                f.write(BenchmarkHelpers.state_machine(size))
+
+            def whole_file() -> None:
+                with open(input_file, 'r') as f:
+                    lex(lexer, (f.read(),))
+
+            def line_groups() -> None:
+                lex(lexer, read_line_groups(input_file, BLOCK_SIZE))
+
+            print('{} states, {:.1f} MB'.format(size, os.path.getsize(input_file) / 2**20))
+            for name, function in [('whole file', whole_file), ('line groups', line_groups)]:
+                BenchmarkHelpers.report(name, BenchmarkHelpers.measure(function, repeat=3))
+                peak = peak_memory(function)
+                print('{:<40} peak {:>9.1f} MB'.format('', peak / 2**20))
+
+            streaming_peaks.append(peak)
+
+    if streaming_peaks[-1] > 2 * streaming_peaks[0]:
+        print('FAILED: memory of reading line groups grows with the size of the input file')
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import os
+import sys
+import hashlib
+from typing import Any, Iterable, Iterator, Optional
+
+# Environment variable that overrides the default cache directory. Set it to an empty
+# string to disable caching altogether
+CACHE_DIR_VARIABLE = 'FLOHSM_CACHE_DIR'
+
+def default_cache_directory() -> str:
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+        return os.path.join(base, 'FloHsm', 'Cache')
+
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'flohsm')
+
+def cache_directory(path:Optional[str]=None) -> Optional[str]:
+    # An explicit path takes precedence over the environment. An empty string, either
+    # explicit or from the environment, means that caching is disabled (None is returned)
+    if path is None:
+        path = os.environ.get(CACHE_DIR_VARIABLE)
+
+    if path is None:
+        return default_cache_directory()
+
+    return os.path.abspath(path) if path != '' else None
+
+def digest(*parts:str) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+
+    return h.hexdigest()
+
+class DigestingReader(object):
+    # Passes on the chunks of a text and hashes them on the way, so that a text that is read only once
+    # can be processed and hashed. The digest is that of exactly the chunks that were passed on
+    def __init__(self, chunks:Iterable[str]) -> None:
+        self.chunks = iter(chunks)
+        self.hash = hashlib.sha1()
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        chunk = next(self.chunks)
+        self.hash.update(chunk.encode('utf-8'))
+        return chunk
+
+    def digest(self, *parts:str) -> str:
+        # Same as digest(''.join(chunks), *parts). Chunks that were not read yet are read first
+        for _ in self:
+            pass
+
+        h = self.hash.copy()
+        h.update(b'\0')
+        for part in parts:
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+
+        return h.hexdigest()
+
+def digest_chunks(chunks:Iterable[str], *parts:str) -> str:
+    # Same as digest(''.join(chunks), *parts), without joining the chunks
+    return DigestingReader(chunks).digest(*parts)
+
+def file_digest(*paths:str) -> str:
+    contents = list()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            contents.append(f.read())
+
+    return digest(*contents)
+
+def load(directory:Optional[str], name:str) -> Any:
+    # A missing, unreadable or corrupt cache entry is a cache miss. The modification time of
+    # an entry that is loaded is updated, so that prune removes the least recently used entries
+    if directory is None:
+        return None
+
+    import pickle
+    path = os.path.join(directory, name)
+    try:
+        with open(path, 'rb') as f:
+            obj = pickle.load(f)
+    except Exception:
+        return None
+
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return obj
+
+def store(directory:Optional[str], name:str, obj:Any) -> None:
+    # Entries are written to a temporary file first and then renamed, so concurrent
+    # readers never see a partially written entry. Failing to write (e.g. read-only
+    # directory) is not an error, the entry is simply not cached
+    if directory is None:
+        return
+
+    import pickle
+    import tempfile
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(prefix=name, suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_name, os.path.join(directory, name))
+        except BaseException:
+            os.remove(temp_name)
+            raise
+    except (OSError, pickle.PicklingError, RecursionError):
+        pass
+
+def prune(directory:Optional[str], prefix:str, keep:int) -> None:
+    # Removes all but the keep most recently used entries whose name starts with prefix. Entries
+    # that another process removes or writes at the same time are skipped
+    if directory is None:
+        return
+
+    entries = list()
+    try:
+        for entry in os.scandir(directory):
+            if entry.name.startswith(prefix) and not entry.name.endswith('.tmp'):
+                entries.append((entry.stat().st_mtime_ns, entry.path))
+    except OSError:
+        return
+
+    entries.sort(reverse=True)
+    for _, path in entries[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
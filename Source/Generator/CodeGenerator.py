@@ -0,0 +1,310 @@
+import os.path
+from Descriptors import State, StateType, StateTransition, InternalTransition, EntryExit, Action, ActionType
+from Model import Model
+from SymbolTable import SymbolTable, SymbolKind
+from typing import List, Dict, Set, Any, Optional
+from mako.template import Template
+
+# Renders an analyzed model to C++. This module is imported only when files are actually generated,
+# because importing Mako and compiling the templates dominates the start up time of the generator
+
+class StateWriter(object):
+    lines: List[str]
+    if_condition: str
+    if_body: List[str]
+
+    def __init__(self) -> None:
+        self.lines = list()
+        self.__indent = 0
+        self.if_body = []
+
+    def __enter__(self) -> None:
+        self.indent_and_append('{')
+        self.indent()
+
+    def __exit__(self, type:Any, value:Any, traceback:Any) -> None:
+        self.unindent()
+        self.indent_and_append('}')
+
+    def code_block(self) -> 'StateWriter':
+        return self
+
+    def if_block(self, condition:str) -> 'StateWriter':
+        self.indent_and_append('if ({})'.format(condition))
+        return self
+
+    def namespace_block(self, name:str=None) -> 'StateWriter':
+        self.indent_and_append('namespace {}'.format(name if name else ''))
+        return self;
+
+    def indent(self) -> None:
+        self.__indent += 4
+
+    def unindent(self) -> None:
+        self.__indent -= 4
+
+    def indent_and_append(self, s:str) -> None:
+        self.lines.append(' ' * self.__indent + s)
+
+    def write_if_statement(self, condition:str, body:List[str]) -> None:
+        with self.if_block(condition):
+            for body_line in body:
+                self.indent_and_append(body_line)
+
+    def write_transition_details(self, to_state:str, action:Optional[Action]) -> None:
+        action_str:str = ''
+        if action is None:
+            action_str ='Function()'
+        elif action.type == ActionType.NONE:
+            action_str = 'Function(&IActions::{}, actions)'.format(action.name)
+        else:
+            action_str = 'Function(&IActions::{}, actions, {})'.format(action.name, action.value())
+
+        self.indent_and_append('SetTransitionDetails(StateId_{}, {});'.format(to_state, action_str))
+
+    def write_constructor_body(self, state:State) -> None:
+        with self.code_block():
+            with self.if_block('MustCallEntry(Id, fromState, toState)'):
+                if state.entry is not None:
+                    if state.entry.guard is not None:
+                        for g in sorted(state.entry.guard.guard_conditions()):
+                            self.indent_and_append('const bool {} = guards->{}();'.format(g, g))
+
+                if state.entry is not None:
+                    if state.entry.guard is not None:                    
+                        self.write_if_statement(state.entry.guard.to_string(), ['actions->{};'.format(state.entry.action.invocation_string())])
+                    else:
+                        self.indent_and_append('actions->{};'.format(state.entry.action.invocation_string()))
+
+                it = state.initial_transition
+                if it is not None:
+                    self.write_transition_details(it.toState, it.action)
+
+    def write_choice_constructor(self, state:State) -> None:
+        with self.code_block():
+            for g in sorted(state.choice_guard_conditions()):
+                self.indent_and_append('const bool {} = guards->{}();'.format(g, g))
+
+            for ct in state.choice_transitions:
+                with self.if_block(ct.guard.to_string()):
+                    self.write_transition_details(ct.toState, ct.action)
+
+    def write_constructor(self, state:State) -> None:
+        if state.parent or state.entry or state.initial_transition:
+            self.indent_and_append('{}(StateId fromState, StateId toState, IActions* _actions, IGuards* _guards)'.format(state.name))
+        else:
+            self.indent_and_append('{}(StateId, StateId, IActions* _actions, IGuards* _guards)'.format(state.name))
+
+        if state.parent is not None:
+            self.indent_and_append('    : {}(fromState, toState, _actions, _guards)'.format(state.parent))
+        else:
+            self.indent_and_append('    : StateBase(_actions, _guards)')
+
+        if state.state_type == StateType.CHOICE:
+            self.write_choice_constructor(state)
+        elif state.entry is None and state.initial_transition is None:
+            self.indent_and_append('{}')
+        else:
+            self.write_constructor_body(state)
+
+    def write_destructor_body(self, exit:EntryExit) -> None:
+        with self.code_block():
+            with self.if_block('MustCallExit(Id)'):
+                if exit.guard is not None:
+                    for g in sorted(exit.guard.guard_conditions()):
+                        self.indent_and_append('const bool {} = guards->{}();'.format(g, g))
+
+                if exit.guard is not None:
+                    self.write_if_statement(exit.guard.to_string(), ['actions->{};'.format(exit.action.invocation_string())])
+                else:
+                    self.indent_and_append('actions->{};'.format(exit.action.invocation_string()))
+
+    def write_destructor(self, state:State) -> None:
+        self.indent_and_append('virtual ~{}()'.format(state.name))
+        
+        if state.exit is None:
+            self.indent_and_append('{}')
+        else:
+            self.write_destructor_body(state.exit)
+
+    def write_state_transition(self, st:StateTransition) -> None:
+        if st.guard is not None:
+            with self.if_block(st.guard.to_string()):
+                self.write_transition_details(st.toState, st.action)
+        else:
+            self.write_transition_details(st.toState, st.action)
+
+    def write_internal_transition(self, it:InternalTransition) -> None:
+        action = 'actions->{};'.format(it.action.invocation_string())
+
+        if it.guard is not None:
+            with self.if_block(it.guard.to_string()):
+                self.indent_and_append(action)
+        else:
+            self.indent_and_append(action)
+
+    def write_event_method(self, event:str, state:State) -> None:
+        self.indent_and_append('void {}() override'.format(event))
+        with self.code_block():
+            for g in sorted(state.guard_conditions_for_event(event)):
+                self.indent_and_append('const bool {} = guards->{}();'.format(g, g))
+
+            for st in state.state_transitions_for_event(event):
+                self.write_state_transition(st)
+
+            for it in state.internal_transitions_for_event(event):
+                self.write_internal_transition(it)
+
+    def write_methods(self, state:State) -> None:
+        self.write_constructor(state)
+        self.lines.append('')
+        self.write_destructor(state)
+        self.lines.append('')
+
+        for e in sorted(state.events()):
+            self.write_event_method(e, state)
+            self.lines.append('')
+
+    def write_id(self, state:State) -> None:
+        self.indent_and_append('StateId GetId() const override { return Id; }')
+        self.indent_and_append('')
+        self.unindent()
+        self.indent_and_append('private:')
+        self.indent()
+        self.indent_and_append('static const StateId Id = StateId_{};'.format(state.name))
+        self.lines.append('')
+
+    def write(self, state:State) -> List[str]:
+        self.indent_and_append('class {} : public {}'.format(state.name, state.parent if state.parent is not None else 'StateBase'))
+        self.indent_and_append('{')
+        self.indent_and_append('public:')
+        self.indent()
+        self.write_methods(state)
+        self.write_id(state)
+        self.unindent()
+        self.indent_and_append('};')
+
+        return self.lines
+
+def template_file(file_name:str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', file_name + '.template')
+
+# Compiled templates by file name. Compiled templates are immutable and can be rendered concurrently, so
+# they are compiled only once. Threads that compile the same template at the same time use the first one
+templates: Dict[str, Template] = dict()
+
+def load_template(file_name:str) -> Template:
+    template = templates.get(file_name)
+    if template is None:
+        template = templates.setdefault(file_name, Template(filename = template_file(file_name)))
+
+    return template
+
+def generate_file(file_name:str, context:Dict[str, Any]) -> str:
+    return load_template(file_name).render(**context)
+
+def generate_interfaces(guard_names:Set[str], action_prototypes:Set[str], event_names:Set[str]) -> str:
+    # All sets are sorted before they are emitted, so that the generated code (and the
+    # vtable layout) doesn't depend on the hash seed of the Python interpreter
+    context = \
+      {\
+       'guard_names' : sorted(guard_names),\
+       'action_prototypes' : sorted(action_prototypes),\
+       'event_names' : sorted(event_names),\
+      }
+
+    return generate_file('Interfaces.hpp', context)
+
+def state_id(symbols:SymbolTable, name:str) -> int:
+    id = symbols.id(SymbolKind.STATE, name)
+    if id is None:
+        raise KeyError('State {} is not in the symbol table of the model'.format(name))
+
+    return id
+
+def generate_state_ids(states:List[State], symbols:SymbolTable=None) -> str:
+    # States are numbered by their ids in the symbol table of the model. Leaf states are numbered
+    # per parent, top-level leaf states have parent id -1. The symbol table may belong to a cached model,
+    # so it is only read
+    if symbols is None:
+        symbols = SymbolTable()
+        for s in states:
+            symbols.add(SymbolKind.STATE, s.name)
+
+    composite_state_index = 0
+    leaf_state_index: Dict[int, int] = dict()
+    state_ids: List[str] = [''] * len(states)
+
+    for i, s in enumerate(states):
+        parent = s.parent
+        if s.is_composite and parent is None:
+            state_ids[i] = '1 << (CompositeStatesRegion + {})'.format(composite_state_index)
+            composite_state_index += 1
+        elif s.is_composite and parent is not None:
+            state_ids[i] = 'StateId_{} | 1 << (CompositeStatesRegion + {})'.format(parent, composite_state_index)
+            composite_state_index += 1
+        else:
+            parent_id = state_id(symbols, parent) if parent is not None else -1
+            index = leaf_state_index.get(parent_id, 1)
+            state_ids[i] = '{}'.format(index) if parent is None else 'StateId_{} | {}'.format(parent, index)
+            leaf_state_index[parent_id] = index + 1
+
+    context = \
+      {\
+        'states' : states,\
+        'state_ids' : state_ids,\
+      }
+
+    return generate_file('StateIds.hpp', context)
+
+def generate_states(states:List[State]) -> str:
+    lines = ['#pragma once',
+             '#include "Interfaces.hpp"',
+             '#include "StateIds.hpp"',
+             '#include "Hsm/StateMachineBase.hpp"',
+             '#include "Hsm/Function.hpp"',
+             '',
+             'namespace',
+             '{',
+             'class StateBase : public hsm::StateBase, public IEvents',
+             '{',
+             'public:',
+             '    StateBase(IActions* _actions, IGuards* _guards)',
+             '        : actions(_actions)',
+             '        , guards(_guards)',
+             '    {}',
+             '',
+             '    virtual ~StateBase(){}',
+             '',
+             'protected:',
+             '    IActions* actions;',
+             '    IGuards* guards;',
+             '};',
+             '']
+
+    for s in states:
+        state_writer = StateWriter()
+        lines.extend(state_writer.write(s))
+        lines.append('')
+
+    lines.append('}')
+
+    return '\n'.join(lines)
+
+def generate_statemachine(states:List[str], events:Set[str]) -> str:
+    context = \
+      {\
+        'states' : states,\
+        'events' : sorted(events),\
+      }
+
+    return generate_file('StateMachine.hpp', context)
+
+def render_model(model:Model) -> Dict[str, str]:
+    return \
+      {\
+        'Interfaces.hpp' : generate_interfaces(model.guard_names, model.action_prototypes, model.event_names),\
+        'StateIds.hpp' : generate_state_ids(model.states, model.symbols),\
+        'States.hpp' : generate_states(model.states),\
+        'StateMachine.hpp' : generate_statemachine(model.state_names, model.event_names),\
+      }
@@ -1,12 +1,125 @@
-﻿from typing import Set, List, Optional, Any, Dict
+﻿from typing import Set, List, Optional, Any, Dict, Tuple, Callable, Sequence
 from enum import Enum
 
+class GuardNode(object):
+    # Expression of a guard, interned in a GuardTable: structurally equal (sub)expressions of a model
+    # are the same node. Everything that only depends on the structure is computed once, when the node
+    # is created: the guard conditions, the string and the canonical form. The canonical form removes
+    # double negations, flattens chains of and/or and sorts their operands without duplicates, so that
+    # equivalent expressions such as (A && B) and (B && A) have the same canonical form. Compiled
+    # functions (see Guard.compile) are cached per node
+    def __init__(self, table:'GuardTable', kind:str, value:Optional[str], operands:Tuple['GuardNode', ...]) -> None:
+        self.table = table
+        self.kind = kind
+        self.value = value
+        self.operands = operands
+        self.compiled: Dict[Tuple[Any, ...], Callable[[Any], Any]] = dict()
+
+        if kind == 'simple':
+            assert value is not None
+            self.string = value
+            self.conditions = set([value])
+            self.canonical = value
+            self.conjuncts: Tuple[str, ...] = (value,)
+            self.disjuncts: Tuple[str, ...] = (value,)
+        elif kind == 'not':
+            operand = operands[0]
+            self.string = '!{}'.format(operand.string)
+            if self.string.startswith('!!'):
+                self.string = self.string.lstrip('!')
+            self.conditions = operand.conditions
+            if operand.kind == 'not':
+                self.canonical = operand.operands[0].canonical
+                self.conjuncts = operand.operands[0].conjuncts
+                self.disjuncts = operand.operands[0].disjuncts
+            else:
+                self.canonical = '!{}'.format(operand.canonical)
+                self.conjuncts = (self.canonical,)
+                self.disjuncts = (self.canonical,)
+        else:
+            operator = '&&' if kind == 'and' else '||'
+            self.string = '({} {} {})'.format(operands[0].string, operator, operands[1].string)
+            self.conditions = operands[0].conditions.union(operands[1].conditions)
+            if kind == 'and':
+                self.conjuncts = tuple(sorted(set(operands[0].conjuncts + operands[1].conjuncts)))
+                terms = self.conjuncts
+            else:
+                self.disjuncts = tuple(sorted(set(operands[0].disjuncts + operands[1].disjuncts)))
+                terms = self.disjuncts
+            self.canonical = terms[0] if len(terms) == 1 else '({})'.format(' {} '.format(operator).join(terms))
+            if kind == 'and':
+                self.disjuncts = (self.canonical,)
+            else:
+                self.conjuncts = (self.canonical,)
+
+        self.sorted_conditions = sorted(self.conditions)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Compiled functions can't be pickled (see Cache)
+        state = self.__dict__.copy()
+        state['compiled'] = dict()
+        return state
+
+class GuardTable(object):
+    # Interns the guard expressions of a model. The parser uses a table per model, guards that are
+    # created without a table use default_guard_table. Guards with the same structure and bit indices
+    # have the same source and share the compiled function, per table so that the functions of a
+    # model are released with the model
+    nodes : Dict[Tuple[Any, ...], GuardNode]
+    compiled_sources : Dict[str, Callable[[Any], Any]]
+
+    def __init__(self) -> None:
+        self.nodes = dict()
+        self.compiled_sources = dict()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Compiled functions can't be pickled (see Cache)
+        state = self.__dict__.copy()
+        state['compiled_sources'] = dict()
+        return state
+
+    def compile_source(self, source:str) -> Callable[[Any], Any]:
+        function = self.compiled_sources.get(source)
+        if function is None:
+            function = eval(source, {'__builtins__' : {}})
+            self.compiled_sources[source] = function
+
+        return function
+
+    def node(self, kind:str, value:Optional[str], operands:Tuple[GuardNode, ...]) -> GuardNode:
+        # Operands are interned, so they are compared by identity
+        key = (kind, value) + operands
+        node = self.nodes.get(key)
+        if node is None:
+            node = GuardNode(self, kind, value, operands)
+            self.nodes[key] = node
+
+        return node
+
+default_guard_table = GuardTable()
+
 class Guard(object):
+    # A guard expression as it appears in the input, with its line number. Guards with the same
+    # structure share their GuardNode, so guard conditions, strings and compiled forms are computed
+    # once per distinct expression and guards are compared by identity of their nodes.
+    # compile returns a function that evaluates the guard for an assignment (see evaluate) with
+    # a single flat Python expression over precomputed bit masks. compile_bitwise returns a function
+    # that evaluates the guard with bitwise operations on the values of all conditions, indexed by bit
+    # index, so that one call evaluates the guard for many assignments (for example all bits of a
+    # word or an array of words). evaluate walks the tree and is kept as the reference.
+    # Descriptors have __slots__ instead of a __dict__ per instance, because the parser creates
+    # them for every line of the input
+    __slots__ = ('node',)
+    node : GuardNode
+
     def to_string(self) -> str:
-        assert False, 'Abstract base'
+        return self.node.string
+
+    def canonical_string(self) -> str:
+        return self.node.canonical
 
     def guard_conditions(self) -> Set[str]:
-        assert False, 'Abstract base'
+        return self.node.conditions
 
     def evaluate(self, guard_values:int, bit_index:Dict[str, int] = None) -> bool:
         assert False, 'Abstract base'
@@ -14,6 +127,28 @@ class Guard(object):
     def lineno(self) -> int:
         assert False, 'Abstract base'
 
+    # Python expression of the guard. In the integer form, v is the assignment. In the bitwise form,
+    # b is the sequence of condition values. Operands of the same operator are not nested, so that
+    # long chains of conditions don't exceed the nesting limit of the Python parser
+    def expression(self, bit_index:Dict[str, int], bitwise:bool) -> str:
+        assert False, 'Abstract base'
+
+    def compile(self, bit_index:Dict[str, int]) -> Callable[[int], bool]:
+        return self.compiled_function('lambda v: {}', bit_index, False)
+
+    def compile_bitwise(self, bit_index:Dict[str, int]) -> Callable[[Any], Any]:
+        return self.compiled_function('lambda b: {}', bit_index, True)
+
+    def compiled_function(self, template:str, bit_index:Dict[str, int], bitwise:bool) -> Callable[[Any], Any]:
+        # Functions only depend on the bit indices of the conditions of the guard
+        key = (bitwise,) + tuple(bit_index[c] for c in self.node.sorted_conditions)
+        function = self.node.compiled.get(key)
+        if function is None:
+            function = self.node.table.compile_source(template.format(self.expression(bit_index, bitwise)))
+            self.node.compiled[key] = function
+
+        return function
+
     @staticmethod
     def generate_bit_index(guard_conditions:Set[str]) -> Dict[str, int]:
         bit_indices = dict()
@@ -27,24 +162,27 @@ class Guard(object):
         return bit_indices
 
     def __eq__(self, other:object) -> bool:
-        if isinstance(other, self.__class__):
-            return self.to_string() == other.to_string()
-        else:
+        if not isinstance(other, self.__class__):
             return False
+        if self.node.table is other.node.table:
+            return self.node is other.node
+
+        # Guards of different models
+        return self.to_string() == other.to_string()
 
     def __ne__(self, other:object) -> bool:
         return not self.__eq__(other)
 
+    def __hash__(self) -> int:
+        return hash(self.to_string())
+
 class SimpleGuard(Guard):
-    def __init__(self, guard:str, lineno:int):
+    __slots__ = ('value', 'line_number')
+
+    def __init__(self, guard:str, lineno:int, table:GuardTable=None):
         self.value = guard
         self.line_number = lineno
-
-    def to_string(self) -> str:
-        return self.value
-
-    def guard_conditions(self) -> Set[str]:
-        return set([self.value])
+        self.node = (table or default_guard_table).node('simple', guard, ())
 
     def evaluate(self, guard_values:int, bit_index:Dict[str, int] = None) -> bool:
         bi = bit_index
@@ -53,22 +191,21 @@ class SimpleGuard(Guard):
          
         return (guard_values & (1 << bi[self.value]) != 0)
 
+    def expression(self, bit_index:Dict[str, int], bitwise:bool) -> str:
+        if bitwise:
+            return 'b[{}]'.format(bit_index[self.value])
+
+        return '(v & {} != 0)'.format(1 << bit_index[self.value])
+
     def lineno(self) -> int:
         return self.line_number
 
 class NotGuard(Guard):
+    __slots__ = ('operand',)
+
     def __init__(self, operand:Guard):
         self.operand = operand
-
-    def to_string(self) -> str:
-        guard_expression = '!{}'.format(self.operand.to_string())
-        if guard_expression.startswith('!!'):
-            guard_expression = guard_expression.lstrip('!')
-
-        return guard_expression
-
-    def guard_conditions(self) -> Set[str]:
-        return self.operand.guard_conditions()
+        self.node = operand.node.table.node('not', None, (operand.node,))
 
     def evaluate(self, guard_values:int, bit_index:Dict[str, int] = None) -> bool:
         bi = bit_index
@@ -77,21 +214,18 @@ class NotGuard(Guard):
         
         return not self.operand.evaluate(guard_values, bi)
 
+    def expression(self, bit_index:Dict[str, int], bitwise:bool) -> str:
+        return '{}({})'.format('~' if bitwise else 'not ', self.operand.expression(bit_index, bitwise))
+
     def lineno(self) -> int:
         return self.operand.lineno()
 
 class OrGuard(Guard):
+    __slots__ = ('operands',)
+
     def __init__(self, operand1:Guard, operand2:Guard):
         self.operands = [operand1, operand2]
-
-    def to_string(self) -> str:
-        return '({} || {})'.format(self.operands[0].to_string(), self.operands[1].to_string())
-
-    def guard_conditions(self) -> Set[str]:
-        guard_conditions : Set[str] = set()
-        guard_conditions = guard_conditions.union(self.operands[0].guard_conditions())
-        guard_conditions = guard_conditions.union(self.operands[1].guard_conditions())
-        return guard_conditions
+        self.node = operand1.node.table.node('or', None, (operand1.node, operand2.node))
 
     def evaluate(self, guard_values:int, bit_index:Dict[str, int] = None) -> bool:
         bi = bit_index
@@ -100,21 +234,18 @@ class OrGuard(Guard):
 
         return self.operands[0].evaluate(guard_values, bi) or self.operands[1].evaluate(guard_values, bi)
 
+    def expression(self, bit_index:Dict[str, int], bitwise:bool) -> str:
+        return '({})'.format(' {} '.format('|' if bitwise else 'or').join(chain_expressions(self, bit_index, bitwise)))
+
     def lineno(self) -> int:
         return self.operands[0].lineno()
 
 class AndGuard(Guard):
+    __slots__ = ('operands',)
+
     def __init__(self, operand1:Guard, operand2:Guard):
         self.operands = [operand1, operand2]
-
-    def to_string(self) -> str:
-        return '({} && {})'.format(self.operands[0].to_string(), self.operands[1].to_string())
-
-    def guard_conditions(self) -> Set[str]:
-        guard_conditions : Set[str] = set()
-        guard_conditions = guard_conditions.union(self.operands[0].guard_conditions())
-        guard_conditions = guard_conditions.union(self.operands[1].guard_conditions())
-        return guard_conditions
+        self.node = operand1.node.table.node('and', None, (operand1.node, operand2.node))
 
     def evaluate(self, guard_values:int, bit_index:Dict[str, int] = None) -> bool:
         bi = bit_index
@@ -123,9 +254,26 @@ class AndGuard(Guard):
 
         return self.operands[0].evaluate(guard_values, bi) and self.operands[1].evaluate(guard_values, bi)
 
+    def expression(self, bit_index:Dict[str, int], bitwise:bool) -> str:
+        return '({})'.format(' {} '.format('&' if bitwise else 'and').join(chain_expressions(self, bit_index, bitwise)))
+
     def lineno(self) -> int:
         return self.operands[0].lineno()
 
+def chain_expressions(guard:Guard, bit_index:Dict[str, int], bitwise:bool) -> List[str]:
+    # Expressions of the operands of a chain of and guards or or guards, from left to right.
+    # Iterative, because chains are as long as the number of conditions in the guard
+    expressions: List[str] = list()
+    pending = [guard]
+    while len(pending) != 0:
+        g = pending.pop()
+        if type(g) is type(guard):
+            pending.extend(reversed(g.operands)) # type: ignore
+        else:
+            expressions.append(g.expression(bit_index, bitwise))
+
+    return expressions
+
 class ActionType(Enum):
     NONE = 0
     INT = 1
@@ -134,6 +282,8 @@ class ActionType(Enum):
     STRING = 4
 
 class Action(object):
+    __slots__ = ('name', 'type', '_value')
+
     def __init__(self, name:str, type:ActionType=ActionType.NONE, value:str=None) -> None:
         self.name = name
         self.type = type
@@ -165,12 +315,16 @@ class Action(object):
         return '{}({})'.format(self.name, self.value())
 
 class InternalTransition(object):
+    __slots__ = ('event', 'action', 'guard')
+
     def __init__(self, event:str, action:Action, guard:Guard=None) -> None:
         self.event = event
         self.action = action
         self.guard = guard
 
 class StateTransition(object):
+    __slots__ = ('toState', 'event', 'action', 'guard')
+
     def __init__(self, event:str, toState:str, action:Action=None, guard:Guard=None) -> None:
         self.toState = toState
         self.event = event
@@ -178,17 +332,23 @@ class StateTransition(object):
         self.guard = guard
 
 class InitialTransition(object):
+    __slots__ = ('toState', 'action')
+
     def __init__(self, toState:str, action:Action=None) -> None:
         self.toState = toState
         self.action = action
 
 class ChoiceTransition(object):
+    __slots__ = ('toState', 'guard', 'action')
+
     def __init__(self, toState:str, guard:Guard, action:Action=None) -> None:
         self.toState = toState
         self.guard = guard
         self.action = action
 
 class EntryExit():
+    __slots__ = ('guard', 'action')
+
     def __init__(self, action:Action, guard:Guard=None):
         self.guard = guard
         self.action = action
@@ -199,11 +359,38 @@ class EntryExit():
         else:
             return False
 
+class EventTransitions(object):
+    # The transitions of a state for one event (see State.transitions_by_event). Guards and guard
+    # conditions are collected on first use
+    __slots__ = ('internal_transitions', 'state_transitions', 'event_guards', 'event_guard_conditions')
+
+    def __init__(self) -> None:
+        self.internal_transitions: List[InternalTransition] = list()
+        self.state_transitions: List[StateTransition] = list()
+        self.event_guards: Optional[List[Guard]] = None
+        self.event_guard_conditions: Optional[Set[str]] = None
+
+    def guards(self) -> List[Guard]:
+        if self.event_guards is None:
+            self.event_guards = [it.guard for it in self.internal_transitions if it.guard is not None]
+            self.event_guards.extend(st.guard for st in self.state_transitions if st.guard is not None)
+
+        return self.event_guards
+
+    def guard_conditions(self) -> Set[str]:
+        if self.event_guard_conditions is None:
+            guard_conditions: Set[str] = set()
+            self.event_guard_conditions = guard_conditions.union(*[g.guard_conditions() for g in self.guards()])
+
+        return self.event_guard_conditions
+
 class StateType(Enum):
     NORMAL = 0
     CHOICE = 1
 
 class State(object):
+    __slots__ = ('name', 'parent', 'initial_transition', 'internal_transitions', 'state_transitions', 'choice_transitions',
+                 'entry', 'exit', 'is_composite', 'state_type', 'lineno', 'merge_errors', 'event_index', 'event_index_size')
     lineno: List[int]
     merge_errors: List[str]
     name: str
@@ -212,6 +399,7 @@ class State(object):
     internal_transitions: List[InternalTransition]
     state_transitions: List[StateTransition]
     choice_transitions: List[ChoiceTransition]
+    event_index: Optional[Dict[str, 'EventTransitions']]
 
     def __init__(self, name:str, lineno:int, parent:str=None,
                  initial_transition:InitialTransition=None,
@@ -233,8 +421,20 @@ class State(object):
         self.lineno = list()
         self.lineno.append(lineno)
         self.merge_errors = list()
+        self.event_index = None
+        self.event_index_size = (0, 0)
 
     def merge(self, s:'State') -> bool:
+        return self.merge_parts(s.name, s.lineno, s.parent, s.state_type, s.entry, s.exit, s.initial_transition,
+                                s.internal_transitions, s.state_transitions, s.choice_transitions, s.is_composite)
+
+    def merge_parts(self, name:str, lineno:List[int], parent:Optional[str], state_type:'StateType',
+                    entry:Optional[EntryExit], exit:Optional[EntryExit], initial_transition:Optional[InitialTransition],
+                    internal_transitions:Sequence[InternalTransition], state_transitions:Sequence[StateTransition],
+                    choice_transitions:Sequence[ChoiceTransition], is_composite:bool) -> bool:
+        # Merges the parts of another definition of the state, see merge. The parser merges the
+        # parts of every line directly, without creating a State for the line
+        #
         # internal transitions must be merged as sets (wrt to the event). All internal transitions
         # on a common event must have a mutually exclusive guard or equal guard and action
         #
@@ -247,110 +447,114 @@ class State(object):
         # - same event and guard and action
 
         # name
-        if self.name != s.name:
-            self.merge_errors.append('Unable to merge states with different names ({} and {}). Possibly involved line(s): {}'.format(self.name, s.name, self.lineno + s.lineno))
+        if self.name != name:
+            self.merge_errors.append('Unable to merge states with different names ({} and {}). Possibly involved line(s): {}'.format(self.name, name, self.lineno + lineno))
             return False
         
-        if self.state_type == StateType.NORMAL and s.state_type == StateType.CHOICE:
+        if self.state_type == StateType.NORMAL and state_type == StateType.CHOICE:
             self.state_type = StateType.CHOICE
 
         #parent
-        if self.parent is None and s.parent is None:
+        if self.parent is None and parent is None:
             pass
-        elif self.parent is None and s.parent is not None:
-            self.parent = s.parent
-        elif self.parent is not None and s.parent is None:
+        elif self.parent is None and parent is not None:
+            self.parent = parent
+        elif self.parent is not None and parent is None:
             pass
-        elif self.parent is not None and s.parent is not None:
-            if self.parent != s.parent:
-                self.merge_errors.append('Unable to merge different parents {} and {} for state {}. Possibly involved line(s): {}'.format(self.parent, s.parent, self.name, self.lineno + s.lineno))
+        elif self.parent is not None and parent is not None:
+            if self.parent != parent:
+                self.merge_errors.append('Unable to merge different parents {} and {} for state {}. Possibly involved line(s): {}'.format(self.parent, parent, self.name, self.lineno + lineno))
                 return False
 
         #entry
-        if self.entry is not None and s.entry is not None:
-            self.merge_errors.append('Unable to merge. Only one entry is allowed for state {}, but detected two. Possibly involved line(s): {})'.format(self.name, self.lineno + s.lineno))
+        if self.entry is not None and entry is not None:
+            self.merge_errors.append('Unable to merge. Only one entry is allowed for state {}, but detected two. Possibly involved line(s): {})'.format(self.name, self.lineno + lineno))
             return False
-        elif self.entry is not None and s.entry is None:
+        elif self.entry is not None and entry is None:
             pass
-        elif self.entry is None and s.entry is not None:
-            self.entry = s.entry
-        elif self.entry is None and s.entry is None:
+        elif self.entry is None and entry is not None:
+            self.entry = entry
+        elif self.entry is None and entry is None:
             pass
 
 
         #exit
-        if self.exit is not None and s.exit is not None:
-            self.merge_errors.append('Unable to merge. Only one exit is allowed for state {}, but detected two. Possibly involved line(s): {})'.format(self.name, self.lineno + s.lineno))
+        if self.exit is not None and exit is not None:
+            self.merge_errors.append('Unable to merge. Only one exit is allowed for state {}, but detected two. Possibly involved line(s): {})'.format(self.name, self.lineno + lineno))
             return False
-        elif self.exit is not None and s.exit is None:
+        elif self.exit is not None and exit is None:
             pass
-        elif self.exit is None and s.exit is not None:
-            self.exit = s.exit
-        elif self.exit is None and s.exit is None:
+        elif self.exit is None and exit is not None:
+            self.exit = exit
+        elif self.exit is None and exit is None:
             pass
 
         #initial transition
-        if self.initial_transition and s.initial_transition:
-            self.merge_errors.append('Unable to merge. Only one initial transition is allowed for state {}, but detected two. Possibly involved line(s): {})'.format(self.name, self.lineno + s.lineno))
+        if self.initial_transition and initial_transition:
+            self.merge_errors.append('Unable to merge. Only one initial transition is allowed for state {}, but detected two. Possibly involved line(s): {})'.format(self.name, self.lineno + lineno))
             return False
 
-        self.initial_transition = s.initial_transition or self.initial_transition
+        self.initial_transition = initial_transition or self.initial_transition
 
         #internal transitions
-        self.internal_transitions.extend(s.internal_transitions)
+        self.internal_transitions.extend(internal_transitions)
         # TODO: detect invalid combinations
 
         #state transitions
-        self.state_transitions.extend(s.state_transitions)
+        self.state_transitions.extend(state_transitions)
         # TODO: detect invalid combinations
 
         #choice transitions
-        self.choice_transitions.extend(s.choice_transitions)
+        self.choice_transitions.extend(choice_transitions)
 
         #is_composite
-        self.is_composite = self.is_composite or s.is_composite
+        self.is_composite = self.is_composite or is_composite
         
         # lineno
-        self.lineno.extend(s.lineno)
+        self.lineno.extend(lineno)
 
+        self.event_index = None
         return True
 
-    def events(self) -> Set[str]:
-        return set([it.event for it in self.internal_transitions] + [st.event for st in self.state_transitions])
+    def transitions_by_event(self) -> Dict[str, 'EventTransitions']:
+        # Index of the transitions per event, built on first use, so that the queries per event don't
+        # scan all transitions. merge invalidates the index, and it is rebuilt when transitions were
+        # added to the lists. The lists the queries return belong to the index and must not be changed
+        size = (len(self.internal_transitions), len(self.state_transitions))
+        if self.event_index is None or self.event_index_size != size:
+            index: Dict[str, EventTransitions] = dict()
+            for it in self.internal_transitions:
+                index.setdefault(it.event, EventTransitions()).internal_transitions.append(it)
+            for st in self.state_transitions:
+                index.setdefault(st.event, EventTransitions()).state_transitions.append(st)
 
-    def guards_for_event(self, event:str) -> List[Guard]:
-        guards: List[Guard] = list()
-        for it in self.internal_transitions:
-            if it.guard is not None and it.event == event:
-                guards.append(it.guard)
+            self.event_index = index
+            self.event_index_size = size
 
-        for st in self.state_transitions:
-            if st.guard is not None and st.event == event:
-                guards.append(st.guard)
+        return self.event_index
 
-        return guards
+    def transitions_for_event(self, event:str) -> 'EventTransitions':
+        transitions = self.transitions_by_event().get(event)
+        return transitions if transitions is not None else EventTransitions()
 
-    def guard_conditions_for_event(self, event:str) -> Set[str]:
-        guard_conditions: Set[str] = set()
+    def events(self) -> Set[str]:
+        return set(self.transitions_by_event())
 
-        for g in self.guards_for_event(event):
-            guard_conditions = guard_conditions.union(g.guard_conditions())
+    def guards_for_event(self, event:str) -> List[Guard]:
+        return self.transitions_for_event(event).guards()
 
-        return guard_conditions
+    def guard_conditions_for_event(self, event:str) -> Set[str]:
+        return self.transitions_for_event(event).guard_conditions()
 
     def internal_transitions_for_event(self, event:str) -> List[InternalTransition]:
-        return [it for it in self.internal_transitions if it.event == event]
+        return self.transitions_for_event(event).internal_transitions
 
     def state_transitions_for_event(self, event:str) -> List[StateTransition]:
-        return [st for st in self.state_transitions if st.event == event]
+        return self.transitions_for_event(event).state_transitions
 
     def choice_guard_conditions(self) -> Set[str]:
         guard_conditions: Set[str] = set()
-
-        for ct in self.choice_transitions:
-            guard_conditions = guard_conditions.union(ct.guard.guard_conditions())
-
-        return guard_conditions
+        return guard_conditions.union(*[ct.guard.guard_conditions() for ct in self.choice_transitions])
 
     def choice_guards(self) -> List[Guard]:
         guards: List[Guard] = list()
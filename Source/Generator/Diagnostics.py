@@ -0,0 +1,28 @@
+from typing import List, Dict, Any, Optional
+
+class Diagnostic(object):
+    ERROR = 'error'
+    WARNING = 'warning'
+
+    severity : str
+    message : str
+    lines : List[int]
+
+    def __init__(self, severity:str, message:str, lines:List[int]=None) -> None:
+        self.severity = severity
+        self.message = message
+        # Involved lines of the description in ascending order. States that are not in the
+        # description (e.g. the top-level initial state) have no line number
+        self.lines = sorted(set(l for l in lines if l > 0)) if lines is not None else list()
+
+    def line(self) -> Optional[int]:
+        return self.lines[0] if len(self.lines) != 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return \
+          {\
+            'severity' : self.severity,\
+            'message' : self.message,\
+            'line' : self.line(),\
+            'lines' : self.lines,\
+          }
@@ -2,332 +2,382 @@
 import os.path
 import argparse
 import sys
+import time
+import json
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Parser'))
-from Descriptors import State, StateType, StateTransition, InternalTransition, EntryExit, Action, ActionType
-from Parser import FloHsmParser
-from SemanticAnalyzer import SemanticAnalyzer
-from typing import List, Dict, Set, Any, Optional
-import pathlib
-from mako.template import Template
-
-class StateWriter(object):
-    lines: List[str]
-    if_condition: str
-    if_body: List[str]
-
-    def __init__(self) -> None:
-        self.lines = list()
-        self.__indent = 0
-        self.if_body = []
-
-    def __enter__(self) -> None:
-        self.indent_and_append('{')
-        self.indent()
-
-    def __exit__(self, type:Any, value:Any, traceback:Any) -> None:
-        self.unindent()
-        self.indent_and_append('}')
-
-    def code_block(self) -> 'StateWriter':
-        return self
-
-    def if_block(self, condition:str) -> 'StateWriter':
-        self.indent_and_append('if ({})'.format(condition))
-        return self
-
-    def namespace_block(self, name:str=None) -> 'StateWriter':
-        self.indent_and_append('namespace {}'.format(name if name else ''))
-        return self;
-
-    def indent(self) -> None:
-        self.__indent += 4
-
-    def unindent(self) -> None:
-        self.__indent -= 4
-
-    def indent_and_append(self, s:str) -> None:
-        self.lines.append(' ' * self.__indent + s)
-
-    def write_if_statement(self, condition:str, body:List[str]) -> None:
-        with self.if_block(condition):
-            for body_line in body:
-                self.indent_and_append(body_line)
-
-    def write_transition_details(self, to_state:str, action:Optional[Action]) -> None:
-        action_str:str = ''
-        if action is None:
-            action_str ='Function()'
-        elif action.type == ActionType.NONE:
-            action_str = 'Function(&IActions::{}, actions)'.format(action.name)
-        else:
-            action_str = 'Function(&IActions::{}, actions, {})'.format(action.name, action.value())
-
-        self.indent_and_append('SetTransitionDetails(StateId_{}, {});'.format(to_state, action_str))
-
-    def write_constructor_body(self, state:State) -> None:
-        with self.code_block():
-            with self.if_block('MustCallEntry(Id, fromState, toState)'):
-                if state.entry is not None:
-                    if state.entry.guard is not None:
-                        for g in state.entry.guard.guard_conditions():
-                            self.indent_and_append('const bool {} = guards->{}();'.format(g, g))
-
-                if state.entry is not None:
-                    if state.entry.guard is not None:                    
-                        self.write_if_statement(state.entry.guard.to_string(), ['actions->{};'.format(state.entry.action.invocation_string())])
-                    else:
-                        self.indent_and_append('actions->{};'.format(state.entry.action.invocation_string()))
-
-                it = state.initial_transition
-                if it is not None:
-                    self.write_transition_details(it.toState, it.action)
-
-    def write_choice_constructor(self, state:State) -> None:
-        with self.code_block():
-            for g in state.choice_guard_conditions():
-                self.indent_and_append('const bool {} = guards->{}();'.format(g, g))
-
-            for ct in state.choice_transitions:
-                with self.if_block(ct.guard.to_string()):
-                    self.write_transition_details(ct.toState, ct.action)
-
-    def write_constructor(self, state:State) -> None:
-        if state.parent or state.entry or state.initial_transition:
-            self.indent_and_append('{}(StateId fromState, StateId toState, IActions* _actions, IGuards* _guards)'.format(state.name))
-        else:
-            self.indent_and_append('{}(StateId, StateId, IActions* _actions, IGuards* _guards)'.format(state.name))
-
-        if state.parent is not None:
-            self.indent_and_append('    : {}(fromState, toState, _actions, _guards)'.format(state.parent))
-        else:
-            self.indent_and_append('    : StateBase(_actions, _guards)')
-
-        if state.state_type == StateType.CHOICE:
-            self.write_choice_constructor(state)
-        elif state.entry is None and state.initial_transition is None:
-            self.indent_and_append('{}')
-        else:
-            self.write_constructor_body(state)
-
-    def write_destructor_body(self, exit:EntryExit) -> None:
-        with self.code_block():
-            with self.if_block('MustCallExit(Id)'):
-                if exit.guard is not None:
-                    for g in exit.guard.guard_conditions():
-                        self.indent_and_append('const bool {} = guards->{}();'.format(g, g))
-
-                if exit.guard is not None:
-                    self.write_if_statement(exit.guard.to_string(), ['actions->{};'.format(exit.action.invocation_string())])
-                else:
-                    self.indent_and_append('actions->{};'.format(exit.action.invocation_string()))
-
-    def write_destructor(self, state:State) -> None:
-        self.indent_and_append('virtual ~{}()'.format(state.name))
-        
-        if state.exit is None:
-            self.indent_and_append('{}')
-        else:
-            self.write_destructor_body(state.exit)
-
-    def write_state_transition(self, st:StateTransition) -> None:
-        if st.guard is not None:
-            with self.if_block(st.guard.to_string()):
-                self.write_transition_details(st.toState, st.action)
-        else:
-            self.write_transition_details(st.toState, st.action)
-
-    def write_internal_transition(self, it:InternalTransition) -> None:
-        action = 'actions->{};'.format(it.action.invocation_string())
-
-        if it.guard is not None:
-            with self.if_block(it.guard.to_string()):
-                self.indent_and_append(action)
-        else:
-            self.indent_and_append(action)
-
-    def write_event_method(self, event:str, state:State) -> None:
-        self.indent_and_append('void {}() override'.format(event))
-        with self.code_block():
-            for g in state.guard_conditions_for_event(event):
-                self.indent_and_append('const bool {} = guards->{}();'.format(g, g))
-
-            for st in state.state_transitions_for_event(event):
-                self.write_state_transition(st)
-
-            for it in state.internal_transitions_for_event(event):
-                self.write_internal_transition(it)
-
-    def write_methods(self, state:State) -> None:
-        self.write_constructor(state)
-        self.lines.append('')
-        self.write_destructor(state)
-        self.lines.append('')
-
-        for e in state.events():
-            self.write_event_method(e, state)
-            self.lines.append('')
-
-    def write_id(self, state:State) -> None:
-        self.indent_and_append('StateId GetId() const override { return Id; }')
-        self.indent_and_append('')
-        self.unindent()
-        self.indent_and_append('private:')
-        self.indent()
-        self.indent_and_append('static const StateId Id = StateId_{};'.format(state.name))
-        self.lines.append('')
-
-    def write(self, state:State) -> List[str]:
-        self.indent_and_append('class {} : public {}'.format(state.name, state.parent if state.parent is not None else 'StateBase'))
-        self.indent_and_append('{')
-        self.indent_and_append('public:')
-        self.indent()
-        self.write_methods(state)
-        self.write_id(state)
-        self.unindent()
-        self.indent_and_append('};')
-
-        return self.lines
-
-
-
-destination_folder:str
-
-def generate_file(file_name, context):
-    generate_dir = pathlib.Path(__file__).parent.absolute()
-    template_file = os.path.join(generate_dir, 'templates', file_name + '.template')
-    template = Template(filename = template_file)
-
-    with open(os.path.join(destination_folder, file_name), "w") as f:
-        f.write(template.render(**context))
-
-def generate_interfaces(guard_names:Set[str], action_prototypes:Set[str], event_names:Set[str]) -> None:
-    context = \
-      {\
-       'guard_names' : guard_names,\
-       'action_prototypes' : action_prototypes,\
-       'event_names' : event_names,\
-      }
-
-    generate_file('Interfaces.hpp', context)
-
-def generate_state_ids(states:List[State]) -> None:
-    composite_state_index = 0
-    leaf_state_index: Dict[str, int] = dict()
-    state_ids: Dict[str, str] = dict()
-
-    for s in states:
-        if s.is_composite and s.parent is None:
-            state_ids[s.name] = '1 << (CompositeStatesRegion + {})'.format(composite_state_index)
-            composite_state_index += 1
-        elif s.is_composite and s.parent is not None:
-            state_ids[s.name] = 'StateId_{} | 1 << (CompositeStatesRegion + {})'.format(s.parent, composite_state_index)
-            composite_state_index += 1
-        elif not s.is_composite and s.parent is None:
-            if 'TopLevel' not in leaf_state_index:
-                leaf_state_index.update({'TopLevel':1})
-            state_ids[s.name] = '{}'.format(leaf_state_index['TopLevel'])
-            leaf_state_index['TopLevel'] += 1
-        else:
-            parent = s.parent
-            if parent is not None:
-                if parent not in leaf_state_index:
-                    leaf_state_index.update({parent:1})
-                state_ids[s.name] = 'StateId_{} | {}'.format(parent, leaf_state_index[parent])
-                leaf_state_index[parent] += 1
-
-    context = \
-      {\
-        'states' : states,\
-        'state_ids' : state_ids,\
-      }
-
-    generate_file('StateIds.hpp', context)
-
-def generate_states(states:List[State]) -> None:
-    file_name = 'States.hpp'
-
-    with open(os.path.join(destination_folder, file_name), "w") as f:
-        lines = ['#pragma once',
-                 '#include "Interfaces.hpp"',
-                 '#include "StateIds.hpp"',
-                 '#include "Hsm/StateMachineBase.hpp"',
-                 '#include "Hsm/Function.hpp"',
-                 '',
-                 'namespace',
-                 '{',
-                 'class StateBase : public hsm::StateBase, public IEvents',
-                 '{',
-                 'public:',
-                 '    StateBase(IActions* _actions, IGuards* _guards)',
-                 '        : actions(_actions)',
-                 '        , guards(_guards)',
-                 '    {}',
-                 '',
-                 '    virtual ~StateBase(){}',
-                 '',
-                 'protected:',
-                 '    IActions* actions;',
-                 '    IGuards* guards;',
-                 '};',
-                 '']
-
-        for s in states:
-            state_writer = StateWriter()
-            lines.extend(state_writer.write(s))
-            lines.append('')
-
-        lines.append('}')
-
-        f.write('\n'.join(lines))
-
-def generate_statemachine(states:List[str], events:Set[str]) -> None:
-    context = \
-      {\
-        'states' : states,\
-        'events' : events,\
-      }
-
-    generate_file('StateMachine.hpp', context)
-
-def generate(input_file:str) -> None:
-    with open(input_file, 'r') as f:
-        parser = FloHsmParser()
-        parser.parse(f.read())
-        if len(parser.errors) != 0:
-            for e in parser.errors:
-                print (e)
-            return
-
-        semantic_analyzer = SemanticAnalyzer()
-        semantic_analyzer.analyze(parser.states)
-        if len(semantic_analyzer.errors) != 0:
-            for e in semantic_analyzer.errors:
-                print (e)
-            return
-
-        if len(semantic_analyzer.warnings) != 0:
-            for w in semantic_analyzer.warnings:
-                print (w)
-            return
-    
-    generate_interfaces(semantic_analyzer.guard_names, semantic_analyzer.action_prototypes, semantic_analyzer.event_names)
-    generate_state_ids(semantic_analyzer.states)
-    generate_states(semantic_analyzer.states)
-    generate_statemachine(semantic_analyzer.state_names, semantic_analyzer.event_names)
-
-
-parser = argparse.ArgumentParser(description='FloHSM generator')
-parser.add_argument('files', nargs='+', help='State machine descriptor files')
-parser.add_argument('-o', '--outdir', dest='outdir', help='''Output directory to generate files in. If not specified,
-files are generated in the same folder as the input file. Output directory will be created if it doesn't exist''')
-
-
-args = parser.parse_args()
-
-# don't use destination_folder
-if args.outdir is None:
-    destination_folder = os.path.dirname(os.path.abspath(args.files[0]))
-else:
-    destination_folder = os.path.abspath(args.outdir)
-
-generate(args.files[0])
+from Model import Model, analyze, analyze_file, FRONT_END_MODULES
+from LineReader import read_line_groups
+from Manifest import Manifest
+import Cache
+from Diagnostics import Diagnostic
+from typing import List, Dict, Tuple, Iterator, Any, Optional, TYPE_CHECKING
+
+# Only what is needed to find out that the outputs are up to date is imported at module level. The
+# parser (PLY), the code generator (Mako) and the process pool are imported when they are needed,
+# so that a no-op run finishes in a few tens of milliseconds. Run Benchmarks/ImportTimeBenchmark.py
+# after adding imports
+if TYPE_CHECKING:
+    from Parser import FloHsmParser
+
+GENERATOR_MODULES = ['FloHsm.py', 'CodeGenerator.py', 'Manifest.py', 'Cache.py'] + FRONT_END_MODULES
+TEMPLATES = ['Interfaces.hpp', 'StateIds.hpp', 'StateMachine.hpp']
+OUTPUTS = ['Interfaces.hpp', 'StateIds.hpp', 'States.hpp', 'StateMachine.hpp']
+
+generator_dir = os.path.dirname(os.path.abspath(__file__))
+
+def template_file(file_name:str) -> str:
+    return os.path.join(generator_dir, 'templates', file_name + '.template')
+
+def generator_fingerprint() -> str:
+    return Cache.file_digest(*[os.path.join(generator_dir, module) for module in GENERATOR_MODULES])
+
+def write_file(destination_folder:str, file_name:str, content:str) -> bool:
+    # Only write the file if its content changes, so that its timestamp doesn't change
+    # and it doesn't trigger recompilation of everything that includes it
+    path = os.path.join(destination_folder, file_name)
+    try:
+        with open(path, 'r') as f:
+            if f.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+
+    with open(path, 'w') as f:
+        f.write(content)
+
+    return True
+
+def depfile_path(path:str) -> str:
+    # Escaping as understood by both Make and Ninja
+    return path.replace('$', '$$').replace('#', '\\#').replace(' ', '\\ ')
+
+def write_depfile(depfile:str, input_file:str, destination_folder:str) -> None:
+    targets = [os.path.join(destination_folder, file_name) for file_name in OUTPUTS]
+    dependencies = [os.path.abspath(input_file)]
+    dependencies += [template_file(t) for t in TEMPLATES]
+    dependencies += [os.path.join(generator_dir, module) for module in GENERATOR_MODULES]
+
+    lines = [' '.join(depfile_path(t) for t in targets) + ':']
+    lines += [' ' + depfile_path(d) for d in dependencies]
+    content = ' \\\n'.join(lines) + '\n'
+
+    depfile = os.path.abspath(depfile)
+    os.makedirs(os.path.dirname(depfile), exist_ok=True)
+    write_file(os.path.dirname(depfile), os.path.basename(depfile), content)
+
+class GenerationError(Exception):
+    messages : List[str]
+
+    def __init__(self, messages:List[str]) -> None:
+        super().__init__('\n'.join(messages))
+        self.messages = messages
+
+class GenerationResult(object):
+    input_file : str
+    success : bool
+    up_to_date : bool
+    messages : List[str]
+    seconds : float
+
+    def __init__(self, input_file:str) -> None:
+        self.input_file = input_file
+        self.success = False
+        self.up_to_date = False
+        self.messages = list()
+        self.seconds = 0.0
+
+# Generates the state machine described by text in memory and returns the content of the generated files
+# by file name. Raises GenerationError with all messages if the description has errors or warnings.
+# There are no side effects other than the parser and model cache (pass an empty string as cache_dir to
+# disable it). It can be called concurrently from multiple threads, as long as threads don't share a parser.
+# guard_engine selects the engine that analyzes guard expressions (see GuardAnalysis.GUARD_ENGINES) and
+# lexer the lexer of a parser that is created when none is given (see Lexer.LEXERS)
+def generate_model(text:str, cache_dir:str=None, parser:'FloHsmParser'=None, guard_engine:str=None, lexer:str=None) -> Dict[str, str]:
+    return render(analyze(text, cache_dir, parser, guard_engine, lexer))
+
+def render(model:Model) -> Dict[str, str]:
+    # Generated files of an analyzed model, see generate_model
+    if len(model.errors) != 0:
+        raise GenerationError(model.errors)
+
+    if len(model.warnings) != 0:
+        raise GenerationError(model.warnings)
+
+    from CodeGenerator import render_model
+    return render_model(model)
+
+def generate(input_file:str, destination_folder:str, cache_dir:str=None, depfile:str=None, parser:'FloHsmParser'=None, guard_engine:str=None, lexer:str=None) -> GenerationResult:
+    result = GenerationResult(input_file)
+
+    # The input file is never read as a whole, so that memory use doesn't depend on its size
+    input_hash = Cache.digest_chunks(read_line_groups(input_file))
+    templates = {t : Cache.file_digest(template_file(t)) for t in TEMPLATES}
+    manifest = Manifest(generator_fingerprint(), os.path.abspath(input_file), input_hash, templates)
+
+    # Nothing to do if inputs are unchanged since the previous run and nobody touched the outputs
+    previous_manifest = Manifest.load(destination_folder)
+    if previous_manifest is not None and previous_manifest.same_inputs(manifest) and previous_manifest.outputs_up_to_date(destination_folder):
+        if depfile is not None:
+            write_depfile(depfile, input_file, destination_folder)
+        result.success = True
+        result.up_to_date = True
+        return result
+
+    try:
+        model = analyze_file(input_file, cache_dir, parser, guard_engine, input_hash, lexer)
+        outputs = render(model)
+    except GenerationError as e:
+        result.messages = e.messages
+        return result
+
+    # The file may have changed after it was hashed above, the outputs are generated from the text that was parsed
+    manifest.input_hash = model.input_hash
+
+    os.makedirs(destination_folder, exist_ok=True)
+    for file_name, content in outputs.items():
+        write_file(destination_folder, file_name, content)
+        manifest.outputs[file_name] = Cache.digest(content)
+
+    manifest.save(destination_folder)
+
+    if depfile is not None:
+        write_depfile(depfile, input_file, destination_folder)
+
+    result.success = True
+    return result
+
+# Parser of a batch worker process. It is created once per worker and reused for all files the worker processes
+worker_parser: Optional['FloHsmParser'] = None
+
+def init_worker(cache_dir:Optional[str], lexer:Optional[str]) -> None:
+    from Parser import FloHsmParser
+    global worker_parser
+    worker_parser = FloHsmParser(cache_dir, lexer)
+
+def generate_timed(input_file:str, destination_folder:str, cache_dir:Optional[str], depfile:Optional[str], parser:Optional['FloHsmParser'], guard_engine:Optional[str], lexer:Optional[str]=None) -> GenerationResult:
+    # Failures are reported in the result, so that one failing file doesn't abort a batch
+    start = time.perf_counter()
+    try:
+        result = generate(input_file, destination_folder, cache_dir, depfile, parser, guard_engine, lexer)
+    except Exception as e:
+        result = GenerationResult(input_file)
+        result.messages.append('{}: {}'.format(type(e).__name__, e))
+
+    result.seconds = time.perf_counter() - start
+    return result
+
+def generate_in_worker(input_file:str, destination_folder:str, cache_dir:Optional[str], guard_engine:Optional[str]) -> GenerationResult:
+    return generate_timed(input_file, destination_folder, cache_dir, None, worker_parser, guard_engine)
+
+def generate_batch(jobs:List[Tuple[str, str]], cache_dir:Optional[str], workers:int, guard_engine:str=None, lexer:str=None) -> Iterator[GenerationResult]:
+    # Yields the results in order of completion
+    if workers == 1:
+        from Parser import FloHsmParser
+        parser = FloHsmParser(cache_dir, lexer)
+        for input_file, destination_folder in jobs:
+            yield generate_timed(input_file, destination_folder, cache_dir, None, parser, guard_engine)
+        return
+
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache_dir, lexer)) as executor:
+        futures = [executor.submit(generate_in_worker, input_file, destination_folder, cache_dir, guard_engine) for input_file, destination_folder in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+# Editors check a description on every keystroke, so checks use the faster scanning lexer (see Lexer.LEXERS),
+# unless a lexer is selected with --lexer or the FLOHSM_LEXER environment variable
+CHECK_LEXER = 'scanner'
+
+def check_lexer(lexer:Optional[str]) -> str:
+    return lexer or os.environ.get('FLOHSM_LEXER') or CHECK_LEXER
+
+def check_model(text:str, cache_dir:str=None, parser:'FloHsmParser'=None, guard_engine:str=None, lexer:str=None) -> List[Diagnostic]:
+    # Runs lexer, parser and semantic analyzer on text without rendering any template and returns
+    # all errors and warnings with their line numbers
+    return analyze(text, cache_dir, parser, guard_engine, check_lexer(lexer)).diagnostics
+
+def check(input_files:List[str], cache_dir:Optional[str], guard_engine:str=None, lexer:str=None) -> List[Dict[str, Any]]:
+    # Diagnostics of all input files, in a form that can be serialized as JSON
+    diagnostics: List[Dict[str, Any]] = list()
+    for input_file in input_files:
+        try:
+            file_diagnostics = analyze_file(input_file, cache_dir, None, guard_engine, None, check_lexer(lexer)).diagnostics
+        except Exception as e:
+            file_diagnostics = [Diagnostic(Diagnostic.ERROR, '{}: {}'.format(type(e).__name__, e))]
+
+        diagnostics.extend(dict(file=input_file, **d.to_dict()) for d in file_diagnostics)
+
+    return diagnostics
+
+class Watcher(object):
+    # Regenerates files when they change. Changes are detected by polling the modification time and
+    # size of the input files, which is cheap and works the same on all platforms and file systems.
+    # The parser is created once, templates are compiled once and unchanged outputs are not written,
+    # so a change is regenerated without any of the start up costs of a separate run
+    jobs : List[Tuple[str, str]]
+    cache_dir : Optional[str]
+    depfile : Optional[str]
+    guard_engine : Optional[str]
+    parser : 'FloHsmParser'
+    signatures : Dict[str, Optional[Tuple[int, int]]]
+    input_hashes : Dict[str, str]
+
+    def __init__(self, jobs:List[Tuple[str, str]], cache_dir:Optional[str], depfile:Optional[str]=None, guard_engine:Optional[str]=None, lexer:Optional[str]=None) -> None:
+        from Parser import FloHsmParser
+        self.jobs = jobs
+        self.cache_dir = cache_dir
+        self.depfile = depfile
+        self.guard_engine = guard_engine
+        self.parser = FloHsmParser(cache_dir, lexer)
+        self.signatures = dict()
+        self.input_hashes = dict()
+
+    @staticmethod
+    def signature(input_file:str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(input_file)
+        except OSError:
+            return None
+
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def poll(self) -> List[GenerationResult]:
+        # Returns the results of the files that were regenerated. A missing file (e.g. while an
+        # editor replaces it) is skipped until it is back
+        results = list()
+        for input_file, destination_folder in self.jobs:
+            signature = self.signature(input_file)
+            if signature is None or signature == self.signatures.get(input_file):
+                continue
+
+            self.signatures[input_file] = signature
+            try:
+                input_hash = Cache.digest_chunks(read_line_groups(input_file))
+            except OSError:
+                continue
+
+            # Saving a file without changing it doesn't require a new analysis
+            if self.input_hashes.get(input_file) == input_hash:
+                continue
+
+            result = generate_timed(input_file, destination_folder, self.cache_dir, self.depfile, self.parser, self.guard_engine)
+            if result.success:
+                self.input_hashes[input_file] = input_hash
+            else:
+                self.input_hashes.pop(input_file, None)
+            results.append(result)
+
+        return results
+
+    def run(self, interval:float) -> None:
+        while True:
+            for result in self.poll():
+                print_result(result)
+            sys.stdout.flush()
+            time.sleep(interval)
+
+def print_result(result:GenerationResult) -> None:
+    status = 'up to date' if result.up_to_date else 'generated' if result.success else 'FAILED'
+    print ('{}: {} ({:.1f} ms)'.format(result.input_file, status, result.seconds * 1000))
+    for m in result.messages:
+        print ('    {}'.format(m))
+
+def destination_folder_for(input_file:str, outdir:Optional[str], batch:bool) -> str:
+    # In batch mode, every input file gets its own folder in the output directory
+    if outdir is None:
+        return os.path.dirname(os.path.abspath(input_file))
+    elif batch:
+        return os.path.join(os.path.abspath(outdir), os.path.splitext(os.path.basename(input_file))[0])
+    else:
+        return os.path.abspath(outdir)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='FloHSM generator')
+    parser.add_argument('files', nargs='+', help='''State machine descriptor files. When more than one file is given, all files are
+    generated in a batch''')
+    parser.add_argument('-o', '--outdir', dest='outdir', help='''Output directory to generate files in. If not specified,
+    files are generated in the same folder as the input file. In batch mode, files are generated in a subfolder
+    of the output directory with the name of the input file (without extension). Output directory will be created if it doesn't exist''')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help='''Number of worker processes for batch mode.
+    Default is 1''')
+    parser.add_argument('--cache-dir', dest='cache_dir', help='''Directory for cached parser tables and analyzed models. Defaults to the FLOHSM_CACHE_DIR
+    environment variable or the user cache directory. An empty string disables caching''')
+    parser.add_argument('--depfile', dest='depfile', help='''Write a dependency file in Makefile format (also understood by Ninja)
+    that lists the input file, templates and generator sources as dependencies of the generated files. Not supported in batch mode''')
+    parser.add_argument('--check', dest='check', action='store_true', help='''Only check the input files for errors and warnings, without
+    generating any file. Diagnostics are printed as JSON. Exit code is 1 if there are any errors or warnings''')
+    parser.add_argument('--watch', dest='watch', action='store_true', help='''Keep running and regenerate the files whenever an input file
+    changes. Stop with Ctrl+C''')
+    parser.add_argument('--watch-interval', dest='watch_interval', type=float, default=0.1, help='''Interval in seconds at which
+    input files are checked for changes in watch mode. Default is 0.1''')
+
+    parser.add_argument('--guard-engine', dest='guard_engine', help='''Engine that analyzes guard expressions for ambiguous transitions and
+    guards that are always true or false: bdd (binary decision diagrams, default), numpy (evaluates all combinations of guard
+    conditions with vector operations, requires NumPy), sat (built in SAT solver, for large guards with many conditions) or
+    enumeration (evaluates all combinations of guard conditions one by one, only practical for a few guard conditions per event).
+    All engines report the same diagnostics''')
+    parser.add_argument('--lexer', dest='lexer', help='''Lexer for the input files: ply (default) or scanner (a faster single pass scanner
+    that produces the same tokens). Overrides the FLOHSM_LEXER environment variable''')
+
+    args = parser.parse_args()
+
+    if args.guard_engine is not None:
+        import GuardAnalysis
+        if args.guard_engine not in GuardAnalysis.GUARD_ENGINES:
+            parser.error('unknown guard engine \'{}\', choose from {}'.format(args.guard_engine, ', '.join(sorted(GuardAnalysis.GUARD_ENGINES))))
+
+    if args.lexer is not None:
+        import Lexer
+        if args.lexer not in Lexer.LEXERS:
+            parser.error('unknown lexer \'{}\', choose from {}'.format(args.lexer, ', '.join(sorted(Lexer.LEXERS))))
+
+    if args.check:
+        if args.watch or args.depfile is not None:
+            parser.error('--check cannot be used with --watch or --depfile')
+
+        diagnostics = check(args.files, args.cache_dir, args.guard_engine, args.lexer)
+        print (json.dumps(diagnostics, indent=2))
+        return 0 if len(diagnostics) == 0 else 1
+
+    batch = len(args.files) != 1
+    jobs = [(f, destination_folder_for(f, args.outdir, batch)) for f in args.files]
+
+    if batch and args.depfile is not None:
+        parser.error('--depfile cannot be used with more than one input file')
+
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    if batch and len(set(destination_folder for _, destination_folder in jobs)) != len(jobs):
+        if args.outdir is None:
+            parser.error('input files must be in different folders, because the files of every input file are generated in its folder')
+        parser.error('input files must have unique names when generating into one output directory')
+
+    if args.watch:
+        watcher = Watcher(jobs, args.cache_dir, args.depfile, args.guard_engine, args.lexer)
+        try:
+            watcher.run(args.watch_interval)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if not batch:
+        input_file, destination_folder = jobs[0]
+        result = generate_timed(input_file, destination_folder, args.cache_dir, args.depfile, None, args.guard_engine, args.lexer)
+        for m in result.messages:
+            print (m)
+        return 0 if result.success else 1
+
+    workers = min(args.jobs, len(jobs))
+
+    failed = 0
+    for result in generate_batch(jobs, args.cache_dir, workers, args.guard_engine, args.lexer):
+        print_result(result)
+        if not result.success:
+            failed += 1
+
+    print ('{} file(s) processed, {} failed'.format(len(jobs), failed))
+    return 0 if failed == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,430 @@
+from Descriptors import Guard, SimpleGuard, NotGuard, AndGuard, OrGuard
+from SatSolver import SatSolver
+from typing import List, Dict, Tuple, Iterator, Any, Optional
+
+# Engines that answer the questions the semantic analyzer asks about guard expressions. Assignments
+# of guard conditions are integers, in which bit i is the value of the condition with bit index i
+# (see Guard.generate_bit_index). When more than one assignment answers a question, all engines
+# return the lowest one, so that messages don't depend on the engine
+
+class GuardEngine(object):
+    # Returns True if the guard is true for all assignments, False if it is false for all
+    # assignments and None otherwise
+    def constant_value(self, guard:Guard) -> Optional[bool]:
+        assert False, 'Abstract base'
+
+    # Returns the lowest assignment for which more than one of the guards is true
+    def first_overlap(self, guards:List[Guard], bit_index:Dict[str, int]) -> Optional[int]:
+        assert False, 'Abstract base'
+
+    # Returns the lowest assignment for which none of the guards is true
+    def first_uncovered(self, guards:List[Guard], bit_index:Dict[str, int]) -> Optional[int]:
+        assert False, 'Abstract base'
+
+class EnumerationEngine(GuardEngine):
+    # Evaluates the guards for all 2^n assignments of n guard conditions. Only practical for a
+    # small number of guard conditions, but simple enough to serve as reference for the other engines.
+    # Finding and calling the compiled form of a guard (see Guard.compile) costs more than walking the
+    # tree for a few assignments, so guards are only compiled from MIN_COMPILED_CONDITIONS conditions on
+    MIN_COMPILED_CONDITIONS = 6
+
+    def values(self, guard:Guard, bit_index:Dict[str, int]) -> List[bool]:
+        # Values of the guard for all assignments
+        if len(bit_index) < self.MIN_COMPILED_CONDITIONS:
+            return [guard.evaluate(i, bit_index) for i in range(0, 2**len(bit_index))]
+
+        return list(map(guard.compile(bit_index), range(0, 2**len(bit_index))))
+
+    def constant_value(self, guard:Guard) -> Optional[bool]:
+        bit_index = Guard.generate_bit_index(guard.guard_conditions())
+        results = set(self.values(guard, bit_index))
+        return results.pop() if len(results) == 1 else None
+
+    def first_overlap(self, guards:List[Guard], bit_index:Dict[str, int]) -> Optional[int]:
+        values = [self.values(g, bit_index) for g in guards]
+        for i, assignment_values in enumerate(zip(*values)):
+            if sum(assignment_values) > 1:
+                return i
+
+        return None
+
+    def first_uncovered(self, guards:List[Guard], bit_index:Dict[str, int]) -> Optional[int]:
+        values = [self.values(g, bit_index) for g in guards]
+        for i, assignment_values in enumerate(zip(*values)):
+            if not any(assignment_values):
+                return i
+
+        return None
+
+class Bdd(object):
+    # Reduced ordered binary decision diagram. Nodes are identified by their index in the node
+    # table. Node 0 is the constant false and node 1 is the constant true. Because nodes are unique
+    # (hash consed), two functions are equal if and only if their nodes are equal
+    FALSE = 0
+    TRUE = 1
+
+    number_of_levels : int
+    nodes : List[Tuple[int, int, int]]
+    unique : Dict[Tuple[int, int, int], int]
+    computed : Dict[Tuple[int, int, int], int]
+
+    def __init__(self, number_of_levels:int) -> None:
+        # Terminals are below the lowest level
+        self.number_of_levels = number_of_levels
+        self.nodes = [(number_of_levels, 0, 0), (number_of_levels, 1, 1)]
+        self.unique = dict()
+        self.computed = dict()
+
+    def node(self, level:int, low:int, high:int) -> int:
+        if low == high:
+            return low
+
+        key = (level, low, high)
+        node = self.unique.get(key)
+        if node is None:
+            node = len(self.nodes)
+            self.nodes.append(key)
+            self.unique[key] = node
+
+        return node
+
+    def variable(self, level:int) -> int:
+        return self.node(level, Bdd.FALSE, Bdd.TRUE)
+
+    def ite(self, f:int, g:int, h:int) -> int:
+        # if f then g else h, the basic operation all other operations are expressed in
+        if f == Bdd.TRUE:
+            return g
+        if f == Bdd.FALSE:
+            return h
+        if g == h:
+            return g
+        if g == Bdd.TRUE and h == Bdd.FALSE:
+            return f
+
+        key = (f, g, h)
+        result = self.computed.get(key)
+        if result is not None:
+            return result
+
+        level = min(self.nodes[f][0], self.nodes[g][0], self.nodes[h][0])
+        f0, f1 = self.cofactors(f, level)
+        g0, g1 = self.cofactors(g, level)
+        h0, h1 = self.cofactors(h, level)
+        result = self.node(level, self.ite(f0, g0, h0), self.ite(f1, g1, h1))
+
+        self.computed[key] = result
+        return result
+
+    def cofactors(self, f:int, level:int) -> Tuple[int, int]:
+        node_level, low, high = self.nodes[f]
+        if node_level != level:
+            return f, f
+
+        return low, high
+
+    def negation(self, f:int) -> int:
+        return self.ite(f, Bdd.FALSE, Bdd.TRUE)
+
+    def conjunction(self, f:int, g:int) -> int:
+        return self.ite(f, g, Bdd.FALSE)
+
+    def disjunction(self, f:int, g:int) -> int:
+        return self.ite(f, Bdd.TRUE, g)
+
+    def first_satisfying_levels(self, f:int) -> Optional[List[int]]:
+        # Levels that are true in the satisfying assignment that prefers false for the highest
+        # level. Every node other than FALSE has a path to TRUE, so the low branch can be taken
+        # whenever it isn't FALSE. Levels that are not on the path are false
+        if f == Bdd.FALSE:
+            return None
+
+        levels = list()
+        while f != Bdd.TRUE:
+            level, low, high = self.nodes[f]
+            if low != Bdd.FALSE:
+                f = low
+            else:
+                levels.append(level)
+                f = high
+
+        return levels
+
+class BddEngine(GuardEngine):
+    # Answers all questions symbolically with a BDD of the guards. The size of the BDD depends on
+    # the structure of the guards rather than on 2^n, so tens of guard conditions are no problem.
+    # Bit i of an assignment is at level n - 1 - i, so that the highest bit is at the root and the
+    # first satisfying assignment of the BDD is the lowest assignment
+    def build(self, bdd:Bdd, guard:Guard, bit_index:Dict[str, int]) -> int:
+        if isinstance(guard, SimpleGuard):
+            return bdd.variable(bdd.number_of_levels - 1 - bit_index[guard.value])
+        elif isinstance(guard, NotGuard):
+            return bdd.negation(self.build(bdd, guard.operand, bit_index))
+        elif isinstance(guard, AndGuard):
+            return bdd.conjunction(self.build(bdd, guard.operands[0], bit_index), self.build(bdd, guard.operands[1], bit_index))
+        elif isinstance(guard, OrGuard):
+            return bdd.disjunction(self.build(bdd, guard.operands[0], bit_index), self.build(bdd, guard.operands[1], bit_index))
+        else:
+            assert False, 'Unknown guard type {}'.format(type(guard).__name__)
+
+    def assignment(self, bdd:Bdd, f:int) -> Optional[int]:
+        levels = bdd.first_satisfying_levels(f)
+        if levels is None:
+            return None
+
+        return sum(1 << (bdd.number_of_levels - 1 - level) for level in levels)
+
+    def constant_value(self, guard:Guard) -> Optional[bool]:
+        bit_index = Guard.generate_bit_index(guard.guard_conditions())
+        bdd = Bdd(len(bit_index))
+        f = self.build(bdd, guard, bit_index)
+        return True if f == Bdd.TRUE else False if f == Bdd.FALSE else None
+
+    def first_overlap(self, guards:List[Guard], bit_index:Dict[str, int]) -> Optional[int]:
+        # at_least_two is true when at least two guards are true. It is built incrementally, so the
+        # number of operations is linear in the number of guards
+        bdd = Bdd(len(bit_index))
+        at_least_one = Bdd.FALSE
+        at_least_two = Bdd.FALSE
+        for g in guards:
+            f = self.build(bdd, g, bit_index)
+            at_least_two = bdd.disjunction(at_least_two, bdd.conjunction(at_least_one, f))
+            at_least_one = bdd.disjunction(at_least_one, f)
+
+        return self.assignment(bdd, at_least_two)
+
+    def first_uncovered(self, guards:List[Guard], bit_index:Dict[str, int]) -> Optional[int]:
+        bdd = Bdd(len(bit_index))
+        at_least_one = Bdd.FALSE
+        for g in guards:
+            at_least_one = bdd.disjunction(at_least_one, self.build(bdd, g, bit_index))
+
+        return self.assignment(bdd, bdd.negation(at_least_one))
+
+class NumpyEngine(GuardEngine):
+    # Evaluates the guards for all assignments at once, with NumPy arrays of packed 64 bit words in
+    # which bit j of word w is the value for assignment 64 * w + j. A guard is evaluated with one vector
+    # operation per node of its tree (see Guard.compile_bitwise). Assignments are processed in chunks of at most 2^CHUNK_BITS, so
+    # that memory stays bounded when there are many guard conditions. Within a word, the six lowest
+    # bits of the assignment follow fixed patterns. The next bits up to CHUNK_BITS are the same arrays
+    # in every chunk, and higher bits are constants within a chunk. NumPy is an optional dependency,
+    # it is only needed when this engine is used
+    CHUNK_BITS = 24
+    WORD_BITS = 6
+    PATTERNS = [0xAAAAAAAAAAAAAAAA, 0xCCCCCCCCCCCCCCCC, 0xF0F0F0F0F0F0F0F0, 0xFF00FF00FF00FF00, 0xFFFF0000FFFF0000, 0xFFFFFFFF00000000]
+    ONES = 0xFFFFFFFFFFFFFFFF
+
+    def __init__(self) -> None:
+        try:
+            import numpy
+        except ImportError:
+            raise ValueError('Guard engine \'numpy\' requires NumPy (pip install numpy)')
+
+        self.np = numpy
+
+    def chunks(self, number_of_conditions:int) -> Iterator[Tuple[int, Dict[int, Any]]]:
+        # Yields the first assignment of every chunk and the values of all bits in that chunk
+        np = self.np
+        chunk_bits = max(min(number_of_conditions, self.CHUNK_BITS), NumpyEngine.WORD_BITS)
+        words = np.arange(1 << (chunk_bits - NumpyEngine.WORD_BITS), dtype=np.uint64)
+        bits = {bit : np.uint64(NumpyEngine.PATTERNS[bit]) for bit in range(NumpyEngine.WORD_BITS)}
+        bits.update({bit : ((words >> np.uint64(bit - NumpyEngine.WORD_BITS)) & np.uint64(1)) * np.uint64(NumpyEngine.ONES)
+                     for bit in range(NumpyEngine.WORD_BITS, chunk_bits)})
+
+        for chunk in range(1 << max(number_of_conditions - chunk_bits, 0)):
+            first = chunk << chunk_bits
+            bits.update({bit : np.uint64(NumpyEngine.ONES if (first >> bit) & 1 else 0) for bit in range(chunk_bits, number_of_conditions)})
+            yield first, bits
+
+    def evaluate(self, guard:Guard, bit_index:Dict[str, int], bits:Dict[int, Any]) -> Any:
+        # The result is an array of words, or a single word if the guard is constant within the chunk
+        return guard.compile_bitwise(bit_index)(bits)
+
+    def words(self, values:Any, number_of_conditions:int) -> Any:
+        # All words of a chunk, without the bits of assignments that don't exist when there are less
+        # than six guard conditions
+        np = self.np
+        chunk_bits = max(min(number_of_conditions, self.CHUNK_BITS), NumpyEngine.WORD_BITS)
+        values = np.broadcast_to(values, (1 << (chunk_bits - NumpyEngine.WORD_BITS),))
+        if number_of_conditions < NumpyEngine.WORD_BITS:
+            values = values & np.uint64((1 << (1 << number_of_conditions)) - 1)
+
+        return values
+
+    def first(self, values:Any, first:int, number_of_conditions:int) -> Optional[int]:
+        words = self.words(values, number_of_conditions)
+        nonzero = self.np.flatnonzero(words)
+        if len(nonzero) == 0:
+            return None
+
+        w = int(nonzero[0])
+        word = int(words[w])
+        return first + (w << NumpyEngine.WORD_BITS) + (word & -word).bit_length() - 1
+
+    def constant_value(self, guard:Guard) -> Optional[bool]:
+        bit_index = Guard.generate_bit_index(guard.guard_conditions())
+        any_true = False
+        any_false = False
+        for first, bits in self.chunks(len(bit_index)):
+            values = self.evaluate(guard, bit_index, bits)
+            any_true = any_true or bool(self.words(values, len(bit_index)).any())
+            any_false = any_false or bool(self.words(self.np.invert(values), len(bit_index)).any())
+            if any_true and any_false:
+                return None
+
+        return any_true
+
+    def first_overlap(self, guards:List[Guard], bit_index:Dict[str, int]) -> Optional[int]:
+        np = self.np
+        for first, bits in self.chunks(len(bit_index)):
+            at_least_one = np.uint64(0)
+            at_least_two = np.uint64(0)
+            for g in guards:
+                values = self.evaluate(g, bit_index, bits)
+                at_least_two = at_least_two | (at_least_one & values)
+                at_least_one = at_least_one | values
+
+            i = self.first(at_least_two, first, len(bit_index))
+            if i is not None:
+                return i
+
+        return None
+
+    def first_uncovered(self, guards:List[Guard], bit_index:Dict[str, int]) -> Optional[int]:
+        np = self.np
+        for first, bits in self.chunks(len(bit_index)):
+            at_least_one = np.uint64(0)
+            for g in guards:
+                at_least_one = at_least_one | self.evaluate(g, bit_index, bits)
+
+            i = self.first(np.invert(at_least_one), first, len(bit_index))
+            if i is not None:
+                return i
+
+        return None
+
+class SatEncoding(object):
+    # Guards in conjunctive normal form, with the Tseitin encoding: every and/or node of a guard gets
+    # a variable that is equivalent to the node. Equal nodes share their variable, so guards that
+    # repeat subexpressions don't grow the formula
+    solver : SatSolver
+    condition_variables : Dict[str, int]
+    nodes : Dict[Tuple[str, int, int], int]
+
+    def __init__(self, bit_index:Dict[str, int]) -> None:
+        self.solver = SatSolver()
+        self.condition_variables = {c : self.solver.new_variable() for c in sorted(bit_index, key=lambda c: bit_index[c])}
+        self.bit_index = bit_index
+        self.nodes = dict()
+
+    def literal(self, guard:Guard) -> int:
+        if isinstance(guard, SimpleGuard):
+            return self.condition_variables[guard.value]
+        elif isinstance(guard, NotGuard):
+            return -self.literal(guard.operand)
+        elif isinstance(guard, AndGuard):
+            return self.conjunction(self.literal(guard.operands[0]), self.literal(guard.operands[1]))
+        elif isinstance(guard, OrGuard):
+            return self.disjunction(self.literal(guard.operands[0]), self.literal(guard.operands[1]))
+        else:
+            assert False, 'Unknown guard type {}'.format(type(guard).__name__)
+
+    def conjunction(self, a:int, b:int) -> int:
+        key = ('and', min(a, b), max(a, b))
+        x = self.nodes.get(key)
+        if x is None:
+            x = self.solver.new_variable()
+            self.solver.add_clause([-x, a])
+            self.solver.add_clause([-x, b])
+            self.solver.add_clause([x, -a, -b])
+            self.nodes[key] = x
+
+        return x
+
+    def disjunction(self, a:int, b:int) -> int:
+        return -self.conjunction(-a, -b)
+
+    def lowest_assignment(self) -> Optional[int]:
+        # Fixes the guard conditions from the highest bit down, each to false if a solution remains.
+        # A solution in which the next bit is already false needs no call of the solver
+        solution = self.solver.solve()
+        if solution is None:
+            return None
+
+        assumptions: List[int] = list()
+        result = 0
+        for condition, variable in sorted(self.condition_variables.items(), key=lambda c: -self.bit_index[c[0]]):
+            if solution[variable]:
+                attempt = self.solver.solve(assumptions + [-variable])
+                if attempt is None:
+                    assumptions.append(variable)
+                    result |= 1 << self.bit_index[condition]
+                    continue
+
+                solution = attempt
+
+            assumptions.append(-variable)
+
+        return result
+
+class SatEngine(GuardEngine):
+    # Encodes the questions as satisfiability problems and solves them with the built in CDCL solver
+    # (see SatSolver). The size of the formula is linear in the size of the guards, so this engine is
+    # meant for events with many guard conditions and large guards. "More than one guard is true"
+    # is encoded with a sequential counter. The lowest assignment takes at most one extra solver call
+    # per guard condition
+    def constant_value(self, guard:Guard) -> Optional[bool]:
+        encoding = SatEncoding(Guard.generate_bit_index(guard.guard_conditions()))
+        g = encoding.literal(guard)
+        if encoding.solver.solve([g]) is None:
+            return False
+        if encoding.solver.solve([-g]) is None:
+            return True
+
+        return None
+
+    def first_overlap(self, guards:List[Guard], bit_index:Dict[str, int]) -> Optional[int]:
+        encoding = SatEncoding(bit_index)
+        at_least_one = None
+        at_least_two = None
+        for g in guards:
+            f = encoding.literal(g)
+            if at_least_one is None:
+                at_least_one = f
+                continue
+
+            both = encoding.conjunction(at_least_one, f)
+            at_least_two = both if at_least_two is None else encoding.disjunction(at_least_two, both)
+            at_least_one = encoding.disjunction(at_least_one, f)
+
+        if at_least_two is None:
+            return None
+
+        encoding.solver.add_clause([at_least_two])
+        return encoding.lowest_assignment()
+
+    def first_uncovered(self, guards:List[Guard], bit_index:Dict[str, int]) -> Optional[int]:
+        encoding = SatEncoding(bit_index)
+        for g in guards:
+            encoding.solver.add_clause([-encoding.literal(g)])
+
+        return encoding.lowest_assignment()
+
+GUARD_ENGINES = \
+  {\
+    'bdd' : BddEngine,\
+    'enumeration' : EnumerationEngine,\
+    'numpy' : NumpyEngine,\
+    'sat' : SatEngine,\
+  }
+
+DEFAULT_GUARD_ENGINE = 'bdd'
+
+def guard_engine(name:str=None) -> GuardEngine:
+    if name is None:
+        name = DEFAULT_GUARD_ENGINE
+
+    if name not in GUARD_ENGINES:
+        raise ValueError('Unknown guard engine \'{}\'. Available engines are {}'.format(name, ', '.join(sorted(GUARD_ENGINES))))
+
+    return GUARD_ENGINES[name]()
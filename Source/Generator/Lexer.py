@@ -1,22 +1,96 @@
 ﻿import ply.lex as lex
-from typing import List
+import os
+import re
+import operator
+import types
+import Cache
+from typing import List, Set, Dict, Any, Optional, Iterable, Iterator, Tuple, Union, Callable, Type
 
 # Enter the regular expressions ar regex101.com for a detailed explanation
 
 class FloHsmLexer(object):
     finalTokens : List[str]
+    chunks : Iterator[str]
+    offset : int
 
-    def __init__(self) -> None:
-        self.lexer = lex.lex(module=self, debug=False)
+    def __init__(self, cache_dir:str=None) -> None:
+        self.lexer = self.build(Cache.cache_directory(cache_dir))
         self.finalTokens = list()
         self.finalTokens.append('\n') # final newline to make sure that statements at end of file are also correctly parsed (syntax requires newline after every statement)
+        self.chunks = iter(())
+        self.offset = 0
             
+    @classmethod
+    def grammar_hash(cls) -> str:
+        # Hash of everything that ends up in the master regular expression. Token rules
+        # are hashed in definition order, which is the order PLY uses for function rules
+        rules = ['{}={}'.format(name, value if isinstance(value, str) else value.__doc__)
+                 for name, value in vars(cls).items() if name.startswith('t_')]
+        return Cache.digest(lex.__tabversion__, repr(cls.tokens), repr(cls.reserved), *rules)
+
+    def build(self, cache_dir:Optional[str]) -> lex.Lexer:
+        table_name = 'lextab_{}.pickle'.format(self.grammar_hash())
+        table = Cache.load(cache_dir, table_name)
+
+        if table is not None and table.get('_tabversion') == lex.__tabversion__:
+            lextab = types.ModuleType('lextab')
+            lextab.__dict__.update(table)
+            lexer = lex.Lexer()
+            lexer.readtab(lextab, {name : getattr(self, name) for name in table['_functions']})
+            return lexer
+
+        lexer = lex.lex(module=self, debug=False)
+        Cache.store(cache_dir, table_name, self.table(lexer))
+        return lexer
+
+    @staticmethod
+    def table(lexer:lex.Lexer) -> Dict[str, Any]:
+        # Same content as the lextab module that PLY writes in optimized mode, but pickled so
+        # that it can be stored anywhere and loaded without importing it from sys.path
+        functions: Set[str] = set()
+        lexstatere = dict()
+        for state, lre in lexer.lexstatere.items():
+            names = [lex._funcs_to_names(funcs, renames) for (_, funcs), renames in zip(lre, lexer.lexstaterenames[state])]
+            lexstatere[state] = list(zip(lexer.lexstateretext[state], names))
+            functions.update(n[0] for n_list in names for n in n_list if n and n[0])
+
+        errorf = {state : f.__name__ if f else None for state, f in lexer.lexstateerrorf.items()}
+        eoff = {state : f.__name__ if f else None for state, f in lexer.lexstateeoff.items()}
+        functions.update(name for name in list(errorf.values()) + list(eoff.values()) if name)
+
+        return {'_tabversion' : lex.__tabversion__,
+                '_lextokens' : lexer.lextokens,
+                '_lexreflags' : int(lexer.lexreflags),
+                '_lexliterals' : lexer.lexliterals,
+                '_lexstateinfo' : lexer.lexstateinfo,
+                '_lexstatere' : lexstatere,
+                '_lexstateignore' : lexer.lexstateignore,
+                '_lexstateerrorf' : errorf,
+                '_lexstateeoff' : eoff,
+                '_functions' : sorted(functions)}
+
     def token(self) -> lex.Token:
+        # PLY positions are relative to the current chunk
         t = self.lexer.token()
+        if t is not None:
+            t.lexpos += self.offset
         return t
 
+    def line_number(self) -> int:
+        return self.lexer.lineno
+
     def input(self, s:str) -> None:
-        self.lexer.input(s)
+        # A lexer can be reused for multiple inputs
+        self.input_stream((s,))
+
+    def input_stream(self, chunks:Iterable[str]) -> None:
+        # The input is the concatenation of the chunks, which must not split tokens (see
+        # LineReader.line_groups). The next chunk is only read when the previous one is scanned
+        self.finalTokens = ['\n']
+        self.chunks = iter(chunks)
+        self.offset = 0
+        self.lexer.lineno = 1
+        self.lexer.input(next(self.chunks, ''))
 
     reserved = {
         'state' : 'STATE',
@@ -79,9 +153,15 @@ class FloHsmLexer(object):
         return t
 
     def t_eof(self, t:lex.Token) -> lex.Token:
-        if len(self.finalTokens) == 0:
+        chunk = next(self.chunks, None)
+        if chunk is not None:
+            self.offset += len(self.lexer.lexdata)
+            self.lexer.input(chunk)
+            return self.lexer.token()
+        elif len(self.finalTokens) == 0:
             return None
         else:
+            self.offset = 0
             self.lexer.input(self.finalTokens.pop(0))
             return self.lexer.token()
 
@@ -115,3 +195,126 @@ class FloHsmLexer(object):
     def t_STRING(self, t:lex.Token) -> lex.Token:
         r'"[ -~]*?(?<=[^\\])"'
         return t
+
+class Token(tuple):
+    # Token of the ScanningLexer, a tuple (type, value, line number, position) with the attributes of a
+    # PLY token that the parser uses. PLY sets the lexer of a token that causes a syntax error, unless
+    # the token already has one
+    __slots__ = ()
+    type = property(operator.itemgetter(0))
+    value = property(operator.itemgetter(1))
+    lineno = property(operator.itemgetter(2))
+    lexpos = property(operator.itemgetter(3))
+    lexer = None
+
+class ScanningLexer(object):
+    # Alternative to FloHsmLexer with the same tokens (type, value, line number and position, a
+    # 'lexerror' token for every character that doesn't start a token and a final newline at
+    # position 0). It scans the input in a single pass with one regular expression, built from the
+    # rules of FloHsmLexer in the order in which PLY tries them: function rules in definition order,
+    # then string rules with the longest regular expression first. Ignored characters are skipped
+    # at the start of every match and a single character that doesn't start a token is the last
+    # alternative, so that the matches cover the input
+    tokens = FloHsmLexer.tokens
+    lineno : int
+    token : Callable[[], Optional[Token]]
+
+    def __init__(self, cache_dir:str=None) -> None:
+        # cache_dir is accepted because create_lexer creates all lexers the same way. The regular
+        # expression is built in a few milliseconds, so unlike the tables of FloHsmLexer it isn't cached
+        self.expression = self.build()
+        self.names: Dict[str, Tuple[str, str]] = dict()
+        self.input('')
+
+    @staticmethod
+    def rules() -> List[Tuple[str, str]]:
+        rules = vars(FloHsmLexer)
+        functions = [(name[2:], rule.__doc__) for name, rule in rules.items()
+                     if name.startswith('t_') and callable(rule) and rule.__doc__]
+        strings = [(name[2:], rule) for name, rule in sorted(rules.items())
+                   if name.startswith('t_') and name != 't_ignore' and isinstance(rule, str)]
+        strings.sort(key=lambda r: len(r[1]), reverse=True)
+        return functions + strings
+
+    @classmethod
+    def build(cls) -> 're.Pattern[str]':
+        # Named groups of the rules are made non-capturing, so that the name of the last group of a match is the rule
+        alternatives = ['(?P<{}>{})'.format(name, re.sub(r'\(\?P<\w+>', '(?:', pattern)) for name, pattern in cls.rules()]
+        # No rule starts with an ignored character, so they can't be an error either. Otherwise, ignored
+        # characters at the end of the input would be given back to the error alternative
+        ignore = re.escape(FloHsmLexer.t_ignore)
+        alternatives.append('(?P<error>[^{}])'.format(ignore))
+
+        # PLY compiles the rules in verbose mode
+        return re.compile('[{}]*(?:{})'.format(ignore, '|'.join(alternatives)), re.VERBOSE)
+
+    def name(self, value:str) -> Tuple[str, str]:
+        # Type and value of a NAME token, reserved words are case insensitive
+        keyword = value.lower()
+        if keyword in FloHsmLexer.reserved:
+            return FloHsmLexer.reserved[keyword], keyword
+
+        return 'NAME', value
+
+    def scan(self, chunks:Iterable[str]) -> Iterator[Optional[Token]]:
+        # Chunks must not split tokens, positions are relative to the start of the first chunk
+        names = self.names
+        lineno = 1
+        offset = 0
+        for data in chunks:
+            for m in self.expression.finditer(data):
+                # Every alternative is a named group. typing.cast would cost a function call per token
+                kind: str = m.lastgroup # type: ignore
+                value = m.group(kind)
+                if kind == 'NAME':
+                    name = names.get(value)
+                    if name is None:
+                        name = names[value] = self.name(value)
+                    yield Token((name[0], name[1], lineno, offset + m.start(kind)))
+                elif kind == 'newline':
+                    token = Token(('NEWLINE', value, lineno, offset + m.start(kind)))
+                    lineno += len(value)
+                    self.lineno = lineno
+                    yield token
+                elif kind == 'error':
+                    yield Token(('lexerror', value, lineno, offset + m.start(kind)))
+                else:
+                    yield Token((kind, value, lineno, offset + m.start(kind)))
+
+            offset += len(data)
+
+        # Statements at the end of the input need a newline, see FloHsmLexer.t_eof
+        self.lineno = lineno + 1
+        yield Token(('NEWLINE', '\n', lineno, 0))
+
+        while True:
+            yield None
+
+    def input(self, s:str) -> None:
+        self.input_stream((s,))
+
+    def input_stream(self, chunks:Iterable[str]) -> None:
+        # The generator is called directly by the parser for every token
+        self.lineno = 1
+        self.token = self.scan(chunks).__next__
+
+    def line_number(self) -> int:
+        return self.lineno
+
+LEXERS : Dict[str, Type[Union[FloHsmLexer, ScanningLexer]]] = \
+  {\
+    'ply' : FloHsmLexer,\
+    'scanner' : ScanningLexer,\
+  }
+
+DEFAULT_LEXER = 'ply'
+
+def create_lexer(name:str=None, cache_dir:str=None) -> Union[FloHsmLexer, ScanningLexer]:
+    # Without a name, the lexer is selected with the environment variable FLOHSM_LEXER
+    if name is None:
+        name = os.environ.get('FLOHSM_LEXER') or DEFAULT_LEXER
+
+    if name not in LEXERS:
+        raise ValueError('Unknown lexer \'{}\'. Available lexers are {}'.format(name, ', '.join(sorted(LEXERS))))
+
+    return LEXERS[name](cache_dir)
@@ -0,0 +1,34 @@
+from typing import IO, Iterator
+
+# Input files are read in blocks of this many characters
+BLOCK_SIZE = 1 << 20
+
+def line_groups(f:IO[str], block_size:int=BLOCK_SIZE) -> Iterator[str]:
+    # Splits the text of a file into groups of complete lines, without reading the whole file. Every
+    # statement ends with a newline and no token contains one, except NEWLINE itself, which is a run of
+    # newlines. A group therefore ends just before the last run of newlines of a block, so that every
+    # token is in exactly one group. A line that is longer than a block makes its group longer
+    pending = ''
+    while True:
+        block = f.read(block_size)
+        if block == '':
+            break
+
+        data = pending + block
+        end = data.rfind('\n')
+        while end > 0 and data[end - 1] == '\n':
+            end -= 1
+
+        if end <= 0:
+            pending = data
+        else:
+            yield data[:end]
+            pending = data[end:]
+
+    if pending != '':
+        yield pending
+
+def read_line_groups(input_file:str, block_size:int=BLOCK_SIZE) -> Iterator[str]:
+    # The file is only open while the groups are read
+    with open(input_file, 'r') as f:
+        yield from line_groups(f, block_size)
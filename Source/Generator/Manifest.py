@@ -0,0 +1,72 @@
+import os
+import json
+import Cache
+from typing import Dict, Any, Optional
+
+# The manifest is written next to the generated files. It records everything the generated files
+# depend on, so that a next run can tell whether generation is necessary at all
+MANIFEST_NAME = 'FloHsm.manifest.json'
+
+class Manifest(object):
+    generator : str
+    input_file : str
+    input_hash : str
+    templates : Dict[str, str]
+    outputs : Dict[str, str]
+
+    def __init__(self, generator:str, input_file:str, input_hash:str, templates:Dict[str, str], outputs:Dict[str, str]=None) -> None:
+        self.generator = generator
+        self.input_file = input_file
+        self.input_hash = input_hash
+        self.templates = templates
+        self.outputs = dict() if outputs is None else outputs
+
+    def same_inputs(self, other:'Manifest') -> bool:
+        return self.generator == other.generator and \
+               self.input_file == other.input_file and \
+               self.input_hash == other.input_hash and \
+               self.templates == other.templates
+
+    def outputs_up_to_date(self, destination_folder:str) -> bool:
+        if len(self.outputs) == 0:
+            return False
+
+        for file_name, output_hash in self.outputs.items():
+            try:
+                if Cache.file_digest(os.path.join(destination_folder, file_name)) != output_hash:
+                    return False
+            except (OSError, UnicodeDecodeError):
+                return False
+
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'generator' : self.generator,
+                'input' : {'file' : self.input_file, 'hash' : self.input_hash},
+                'templates' : self.templates,
+                'outputs' : self.outputs}
+
+    @staticmethod
+    def from_dict(d:Dict[str, Any]) -> 'Manifest':
+        return Manifest(d['generator'], d['input']['file'], d['input']['hash'], d['templates'], d['outputs'])
+
+    @staticmethod
+    def load(destination_folder:str) -> Optional['Manifest']:
+        try:
+            with open(os.path.join(destination_folder, MANIFEST_NAME), 'r') as f:
+                return Manifest.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, destination_folder:str) -> None:
+        path = os.path.join(destination_folder, MANIFEST_NAME)
+        content = json.dumps(self.to_dict(), indent=2, sort_keys=True)
+        try:
+            with open(path, 'r') as f:
+                if f.read() == content:
+                    return
+        except (OSError, UnicodeDecodeError):
+            pass
+
+        with open(path, 'w') as f:
+            f.write(content)
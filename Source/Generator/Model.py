@@ -0,0 +1,111 @@
+import os
+import Cache
+import LineReader
+from SymbolTable import SymbolTable
+from typing import List, Set, Optional, Iterable, Callable, TYPE_CHECKING
+
+# Parser and semantic analyzer are imported only when a model is not found in the cache
+if TYPE_CHECKING:
+    from Descriptors import State
+    from Diagnostics import Diagnostic
+    from Parser import FloHsmParser
+    from SemanticAnalyzer import SemanticAnalyzer
+
+# Modules that determine the analyzed model. The model cache is invalidated whenever one of them changes
+FRONT_END_MODULES = ['Descriptors.py', 'Diagnostics.py', 'GuardAnalysis.py', 'Lexer.py', 'LineReader.py', 'Parser.py', 'SatSolver.py', 'SemanticAnalyzer.py', 'SymbolTable.py', 'Model.py']
+
+# Number of analyzed models that are kept in the cache. Every text that is checked or generated adds one, so
+# editor integrations and watch mode would otherwise fill the cache directory without limit
+MAX_CACHED_MODELS = 64
+
+class Model(object):
+    errors : List[str]
+    warnings : List[str]
+    diagnostics : List['Diagnostic']
+    states : List['State']
+    state_names : List[str]
+    event_names : Set[str]
+    guard_names : Set[str]
+    action_prototypes : Set[str]
+    symbols : SymbolTable
+    input_hash : str
+
+    def __init__(self) -> None:
+        self.errors = list()
+        self.warnings = list()
+        self.diagnostics = list()
+        self.states = list()
+        self.state_names = list()
+        self.event_names = set()
+        self.guard_names = set()
+        self.action_prototypes = set()
+        self.symbols = SymbolTable()
+        self.input_hash = ''
+
+    @staticmethod
+    def from_analyzer(semantic_analyzer:'SemanticAnalyzer') -> 'Model':
+        model = Model()
+        model.errors = semantic_analyzer.errors
+        model.warnings = semantic_analyzer.warnings
+        model.diagnostics = semantic_analyzer.diagnostics
+        model.states = semantic_analyzer.states
+        model.state_names = semantic_analyzer.state_names
+        model.event_names = semantic_analyzer.event_names
+        model.guard_names = semantic_analyzer.guard_names
+        model.action_prototypes = semantic_analyzer.action_prototypes
+        model.symbols = semantic_analyzer.symbols
+        return model
+
+def front_end_fingerprint() -> str:
+    generator_dir = os.path.dirname(os.path.abspath(__file__))
+    return Cache.file_digest(*[os.path.join(generator_dir, module) for module in FRONT_END_MODULES])
+
+def model_name(input_hash:str, guard_engine:Optional[str]) -> str:
+    return 'model_{}.pickle'.format(Cache.digest(input_hash, front_end_fingerprint(), guard_engine or ''))
+
+def analyze(text:str, cache_dir:str=None, parser:'FloHsmParser'=None, guard_engine:str=None, lexer:str=None) -> Model:
+    # Runs parser and semantic analyzer on the text, unless the analyzed model for the same text,
+    # the same front end and the same guard engine is found in the cache. A parser is only created when
+    # needed, with the lexer selected by name (see Lexer.LEXERS). All lexers produce the same tokens, so
+    # the lexer is not part of the cache key
+    return analyze_chunks(lambda: (text,), cache_dir, parser, guard_engine, None, lexer)
+
+def analyze_file(input_file:str, cache_dir:str=None, parser:'FloHsmParser'=None, guard_engine:str=None, input_hash:str=None, lexer:str=None) -> Model:
+    # Same as analyze for the text of the input file, which is read in groups of lines and never as a
+    # whole. input_hash is Cache.digest of the text, when the caller already has it
+    return analyze_chunks(lambda: LineReader.read_line_groups(input_file), cache_dir, parser, guard_engine, input_hash, lexer)
+
+def analyze_chunks(read:Callable[[], Iterable[str]], cache_dir:str=None, parser:'FloHsmParser'=None, guard_engine:str=None, input_hash:str=None, lexer:str=None) -> Model:
+    # read returns the chunks of the text (see FloHsmParser.parse_stream) every time it is called. The
+    # text is read once to look up the model in the cache and, when it is not found, once more to parse
+    # it. The text may change in between, so the model is stored with the hash of the text that was parsed
+    cache_directory = Cache.cache_directory(cache_dir)
+    if input_hash is None:
+        input_hash = Cache.digest_chunks(read())
+
+    model = Cache.load(cache_directory, model_name(input_hash, guard_engine))
+    if isinstance(model, Model):
+        return model
+
+    from Parser import FloHsmParser
+    from SemanticAnalyzer import SemanticAnalyzer
+
+    if parser is None:
+        parser = FloHsmParser(cache_directory if cache_directory is not None else '', lexer)
+
+    chunks = Cache.DigestingReader(read())
+    parser.parse_stream(chunks, merge=True)
+    input_hash = chunks.digest()
+    if len(parser.errors) != 0:
+        model = Model()
+        model.errors = parser.errors
+        model.diagnostics = parser.diagnostics
+    else:
+        semantic_analyzer = SemanticAnalyzer(guard_engine)
+        semantic_analyzer.analyze(parser.states, parser.merge_errors)
+        model = Model.from_analyzer(semantic_analyzer)
+
+    model.input_hash = input_hash
+    Cache.store(cache_directory, model_name(input_hash, guard_engine), model)
+    Cache.prune(cache_directory, 'model_', MAX_CACHED_MODELS)
+    return model
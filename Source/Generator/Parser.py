@@ -1,15 +1,68 @@
 ﻿import ply.yacc as yacc
-from Lexer import FloHsmLexer
+from Lexer import FloHsmLexer, create_lexer
 from Descriptors import State, StateType, EntryExit, StateTransition, \
                                     InitialTransition, InternalTransition, \
                                     ChoiceTransition, Action, ActionType
-from Descriptors import SimpleGuard, NotGuard, AndGuard, OrGuard
+from Descriptors import SimpleGuard, NotGuard, AndGuard, OrGuard, GuardTable
+from Diagnostics import Diagnostic
 import binascii
-from typing import List
+import os
+import Cache
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+
+# The grammar rules describe the parts of states that are defined on a line as fragments: the name of
+# the state, the line number, the kind of part and its value. Parents are only known when a composite
+# state is complete, so fragments are added to the model when their composite state (or the input) ends
+Fragment = Tuple[str, int, str, Any]
+
+class ModelBuilder(object):
+    # Collects the states of the fragments. Without merging, there is a State for every fragment, in
+    # the order in which the fragments are added, as input for SemanticAnalyzer.merge_states. With
+    # merging, the parts of a fragment are merged directly into the State with the same name, which
+    # gives the same states and the same merge errors as merging a State per fragment in that order
+    states : List[State]
+    state_for_name : Dict[str, State]
+    merge_errors : List[Tuple[str, List[int]]]
+
+    def __init__(self, merge:bool=False) -> None:
+        self.merge = merge
+        self.states = list()
+        self.state_for_name = dict()
+        self.merge_errors = list()
+
+    def add(self, name:str, lineno:int, parent:Optional[str], kind:str, value:Any) -> None:
+        state_type = StateType.CHOICE if kind == 'choice' or kind == 'choice_state' else StateType.NORMAL
+        entry = value if kind == 'entry' else None
+        exit = value if kind == 'exit' else None
+        initial_transition = value if kind == 'initial' else value[1] if kind == 'composite' else None
+        is_composite = value[0] if kind == 'composite' else False
+
+        current = self.state_for_name.get(name) if self.merge else None
+        if current is None:
+            state = State(name=name, lineno=lineno, parent=parent, initial_transition=initial_transition,
+                          internal_transitions=[value] if kind == 'internal' else None,
+                          state_transitions=[value] if kind == 'transition' else None,
+                          choice_transitions=[value] if kind == 'choice' else None,
+                          entry=entry, exit=exit, is_composite=is_composite, state_type=state_type)
+            self.states.append(state)
+            if self.merge:
+                self.state_for_name[name] = state
+        else:
+            # Errors of earlier merges were already reported with the lines of those merges
+            previous_errors = len(current.merge_errors)
+            success = current.merge_parts(name, [lineno], parent, state_type, entry, exit, initial_transition,
+                                          (value,) if kind == 'internal' else (),
+                                          (value,) if kind == 'transition' else (),
+                                          (value,) if kind == 'choice' else (), is_composite)
+            if not success:
+                for merge_error in current.merge_errors[previous_errors:]:
+                    self.merge_errors.append((merge_error, current.lineno + [lineno]))
 
 class FloHsmParser(object):
     states : List[State]
+    merge_errors : List[Tuple[str, List[int]]]
     errors : List[str]
+    diagnostics : List[Diagnostic]
 
     precedence = (
      ('left', 'OR'),
@@ -17,26 +70,90 @@ class FloHsmParser(object):
      ('right', 'NOT')
     )
 
-    def __init__(self) -> None:
-        self.lexer = FloHsmLexer()
+    def __init__(self, cache_dir:str=None, lexer:str=None) -> None:
+        # lexer selects the lexer by name (see Lexer.LEXERS)
+        cache_directory = Cache.cache_directory(cache_dir)
+        self.lexer = create_lexer(lexer, cache_directory if cache_directory is not None else '')
         self.tokens = self.lexer.tokens
-        self.parser = yacc.yacc(module=self, debug=False)
-        self.states = list()
+        self.parser = self.build(cache_directory)
+        self.builder = ModelBuilder()
+        self.states = self.builder.states
+        self.merge_errors = self.builder.merge_errors
+        self.errors = list()
+        self.diagnostics = list()
+        self.guard_table = GuardTable()
+
+    @classmethod
+    def grammar_hash(cls) -> str:
+        # Hash of the token list, the precedence table and all grammar rules in definition
+        # order (PLY uses the first rule as start symbol)
+        rules = ['{}={}'.format(name, value.__doc__) for name, value in vars(cls).items() if name.startswith('p_')]
+        return Cache.digest(yacc.__tabversion__, repr(FloHsmLexer.tokens), repr(cls.precedence), *rules)
+
+    def build(self, cache_dir:Optional[str]) -> yacc.LRParser:
+        table_name = 'parsetab_{}.pickle'.format(self.grammar_hash())
+        table = Cache.load(cache_dir, table_name)
+
+        if table is not None and table.get('tabversion') == yacc.__tabversion__:
+            lr = yacc.LRTable()
+            lr.lr_method = table['method']
+            lr.lr_action = table['action']
+            lr.lr_goto = table['goto']
+            lr.lr_productions = [yacc.MiniProduction(*p) for p in table['productions']]
+            lr.bind_callables({p.func : getattr(self, p.func) for p in lr.lr_productions if p.func})
+            return yacc.LRParser(lr, self.p_error)
+
+        parser = yacc.yacc(module=self, debug=False, write_tables=False)
+        Cache.store(cache_dir, table_name, self.table(parser))
+        return parser
+
+    @staticmethod
+    def table(parser:yacc.LRParser) -> Dict[str, Any]:
+        # Same content as the pickle file that PLY writes, see LRGeneratedTable.pickle_table
+        productions = list()
+        for p in parser.productions:
+            if p.func:
+                productions.append((p.str, p.name, p.len, p.func, os.path.basename(p.file), p.line))
+            else:
+                productions.append((str(p), p.name, p.len, None, None, None))
+
+        return {'tabversion' : yacc.__tabversion__,
+                'method' : 'LALR',
+                'action' : parser.action,
+                'goto' : parser.goto,
+                'productions' : productions}
+
+    def parse(self, data:str, merge:bool=False) -> None:
+        # A parser can be reused for multiple inputs, the result of a previous parse is discarded.
+        # With merge, states contains one merged State per name and merge_errors the errors of merging
+        # (see ModelBuilder), to be passed to SemanticAnalyzer.analyze
+        self.parse_stream((data,), merge)
+
+    def parse_stream(self, chunks:Iterable[str], merge:bool=False) -> None:
+        # Same as parse for the concatenation of the chunks, which must not split tokens (see
+        # LineReader.line_groups). Chunks are lexed and parsed one by one as they are read
+        self.builder = ModelBuilder(merge)
+        self.states = self.builder.states
+        self.merge_errors = self.builder.merge_errors
         self.errors = list()
+        self.diagnostics = list()
+        self.guard_table = GuardTable()
+        self.lexer.input_stream(chunks)
+        self.parser.parse(lexer=self.lexer)
 
-    def parse(self, data:str) -> None:
-        self.parser.parse(data, lexer=self.lexer)
+    def add_error(self, message:str, lines:List[int]) -> None:
+        self.errors.append(message)
+        self.diagnostics.append(Diagnostic(Diagnostic.ERROR, message, lines))
 
     def p_top_level_states(self, p:yacc.Production) -> None:
         '''top_level_states : state_list
                             | empty'''
 
-        for state in p[1]:
-            if state.name == '[*]_Initial':
-                initial = State(name='FloHsmInitial_5OdpEA31BEcPrWrNx8u7', lineno=-1, initial_transition=state.initial_transition)
-                self.states.append(initial)
+        for name, lineno, kind, value in p[1]:
+            if name == '[*]_Initial':
+                self.builder.add('FloHsmInitial_5OdpEA31BEcPrWrNx8u7', -1, None, kind, value)
             else:
-                self.states.append(state)
+                self.builder.add(name, lineno, None, kind, value)
     
     def p_state_list_first_empty(self, p:yacc.Production) -> None:
         'state_list : ignore'
@@ -44,12 +161,13 @@ class FloHsmParser(object):
 
     def p_state_list_first_state(self, p:yacc.Production) -> None:
         'state_list : state'
-        p[0] = list()
-        p[0].append(p[1])
+        p[0] = [p[1]]
 
     def p_state_list_first_states(self, p:yacc.Production) -> None:
-        'state_list : states_from_transition'
-        p[0] = p[1]
+        '''state_list : transition_from_state NEWLINE
+                      | transition_from_initial NEWLINE
+                      | transition_from_choice NEWLINE'''
+        p[0] = list(p[1])
 
     def p_state_list_next_empty(self, p:yacc.Production) -> None:
         'state_list : state_list ignore'
@@ -61,54 +179,37 @@ class FloHsmParser(object):
         p[0].append(p[2])
 
     def p_state_list_next(self, p:yacc.Production) -> None:
-        'state_list : state_list states_from_transition'
+        '''state_list : state_list transition_from_state NEWLINE
+                      | state_list transition_from_initial NEWLINE
+                      | state_list transition_from_choice NEWLINE'''
         p[0] = p[1]
         p[0].extend(p[2])
 
-    def p_state_or_transition_transition(self, p:yacc.Production) -> None:
-        '''states_from_transition : transition NEWLINE'''
-        f = p[1].get('from')
-        t = p[1].get('to')
-        p[0] = list()
-        p[0].append(f)
-        p[0].append(t)
-
-    def p_transition(self, p:yacc.Production) -> None:
-        '''transition : transition_from_state
-                      | transition_from_initial 
-                      | transition_from_choice'''
-        p[0] = p[1]
-
     def p_transition_from_state(self, p:yacc.Production) -> None:
         '''transition_from_state : NAME TRANSITION NAME event_with_optional_guard optional_action
                                  | NAME TRANSITION STATE_INITIAL_OR_FINAL event_with_optional_guard optional_action'''
 
-        fromState = State(name=p[1], lineno=p.slice[1].lineno)
-        
-        event=p[4].get('event', None) if p[4] is not None else None
-        guard = p[4].get('guard', None) if p[4] is not None else None
+        event, guard = p[4] if p[4] is not None else (None, None)
         action = p[5]
 
         to_name = p[3] if p[3] != '[*]' else 'FloHsmFinal_5OdpEA31BEcPrWrNx8u7'
-        fromState.state_transitions.append(StateTransition(event, to_name, action, guard))
+        fromState = (p[1], p.slice[1].lineno, 'transition', StateTransition(event, to_name, action, guard))
 
-        toState = State(name=to_name, lineno=p.slice[3].lineno)
+        toState = (to_name, p.slice[3].lineno, 'state', None)
 
-        p[0] = {'from' : fromState, 'to' : toState}
+        p[0] = (fromState, toState)
 
     def p_transition_from_initial(self, p:yacc.Production) -> None:
         '''transition_from_initial : STATE_INITIAL_OR_FINAL TRANSITION NAME optional_action_at_initial_transition
                                    | STATE_INITIAL_OR_FINAL TRANSITION STATE_INITIAL_OR_FINAL optional_action_at_initial_transition'''
 
-        fromState = State('[*]_Initial', lineno=p.slice[1].lineno)
-        
         to_name = p[3] if p[3] != '[*]' else 'FloHsmFinal_5OdpEA31BEcPrWrNx8u7'
         action = p[4]
-        fromState.initial_transition = InitialTransition(to_name, action)
+        fromState = ('[*]_Initial', p.slice[1].lineno, 'initial', InitialTransition(to_name, action))
         
-        toState = State(name=to_name, lineno=p.slice[3].lineno)
+        toState = (to_name, p.slice[3].lineno, 'state', None)
 
-        p[0] = {'from' : fromState, 'to' : toState}
+        p[0] = (fromState, toState)
 
     def p_action_impl(self, p:yacc.Production) -> None:
         '''action_impl : NAME
@@ -149,12 +250,11 @@ class FloHsmParser(object):
     def p_transition_from_choice(self, p:yacc.Production) -> None:
         '''transition_from_choice : NAME TRANSITION NAME COLON CHOICE LBRACKET guard_exp RBRACKET optional_action'''
 
-        fromState = State(name=p[1], lineno=p.slice[1].lineno, state_type=StateType.CHOICE)
-        fromState.choice_transitions.append(ChoiceTransition(p[3], p[7], p[9]))
+        fromState = (p[1], p.slice[1].lineno, 'choice', ChoiceTransition(p[3], p[7], p[9]))
         
-        toState = State(name=p[3], lineno=p.slice[3].lineno)
+        toState = (p[3], p.slice[3].lineno, 'state', None)
 
-        p[0] = {'from' : fromState, 'to' : toState}
+        p[0] = (fromState, toState)
 
     def p_action(self, p:yacc.Production) -> None:
         'action : FORWARD_SLASH action_impl'
@@ -162,55 +262,37 @@ class FloHsmParser(object):
         p[0] = p[2]
 
     def p_optional_action(self, p:yacc.Production) -> None:
-        ''' optional_action : action
+        ''' optional_action : FORWARD_SLASH action_impl
                             | empty'''
         
-        p[0] = p[1]
-
-    def p_event_with_optional_guard(self, p:yacc.Production) -> None:
-        '''event_with_optional_guard : event
-                                     | event_with_guard'''
-        p[0] = p[1]
+        p[0] = p[2] if len(p) == 3 else None
 
+    # Every reduction costs a call of a rule function, so there are no rules that only pass on the
+    # value of another rule (like event_with_optional_guard : event)
     def p_event(self, p:yacc.Production) -> None:
-        'event : COLON NAME'
-        p[0] = {'event': p[2], 'guard' : None}
+        'event_with_optional_guard : COLON NAME'
+        p[0] = (p[2], None)
 
     def p_event_with_guard(self, p:yacc.Production) -> None:
-        'event_with_guard : COLON NAME LBRACKET guard_exp RBRACKET'
-        p[0] = {'event': p[2], 'guard' : p[4]}
-
-    def p_entry_with_optional_guard(self, p:yacc.Production) -> None:
-        '''entry_with_optional_guard : entry_pseudo_event
-                                     | entry_with_guard'''
-        p[0] = p[1]
+        'event_with_optional_guard : COLON NAME LBRACKET guard_exp RBRACKET'
+        p[0] = (p[2], p[4])
 
     def p_entry_pseudo_event(self, p:yacc.Production) -> None:
-        'entry_pseudo_event : COLON ENTRY'
+        'entry_with_optional_guard : COLON ENTRY'
         p[0] = None
 
     def p_entry_with_guard(self, p:yacc.Production) -> None:
-        'entry_with_guard : COLON ENTRY LBRACKET guard_exp RBRACKET'
+        'entry_with_optional_guard : COLON ENTRY LBRACKET guard_exp RBRACKET'
         p[0] = p[4]
 
-    def p_exit_with_optional_guard(self, p:yacc.Production) -> None:
-        '''exit_with_optional_guard : exit_pseudo_event
-                                    | exit_with_guard'''
-        p[0] = p[1]
-
     def p_exit_pseudo_event(self, p:yacc.Production) -> None:
-        'exit_pseudo_event : COLON EXIT'
+        'exit_with_optional_guard : COLON EXIT'
         p[0] = None
 
     def p_exit_with_guard(self, p:yacc.Production) -> None:
-        'exit_with_guard : COLON EXIT LBRACKET guard_exp RBRACKET'
+        'exit_with_optional_guard : COLON EXIT LBRACKET guard_exp RBRACKET'
         p[0] = p[4]
 
-    def p_guard_exp(self, p:yacc.Production) -> None:
-        '''guard_exp : simple_guard_exp
-                     | negative_guard_exp'''
-        p[0] = p[1]
-
     def p_guard_exp_in_parenthes(self, p:yacc.Production) -> None:
         '''guard_exp : LPAREN guard_exp RPAREN'''
         p[0] = p[2]
@@ -226,20 +308,20 @@ class FloHsmParser(object):
         p[0] = OrGuard(p[1], p[3])
 
     def p_simple_guard_exp(self, p:yacc.Production) -> None:
-        'simple_guard_exp : NAME'
-        p[0] = SimpleGuard(guard=p[1], lineno=p.slice[1].lineno)
+        'guard_exp : NAME'
+        p[0] = SimpleGuard(guard=p[1], lineno=p.slice[1].lineno, table=self.guard_table)
 
     def p_negative_guard_exp(self, p:yacc.Production) -> None:
-        'negative_guard_exp : NOT guard_exp'
+        'guard_exp : NOT guard_exp'
         p[0] = NotGuard(operand=p[2])
 
     def p_state_simple(self, p:yacc.Production) -> None:
         'state : STATE NAME NEWLINE'
-        p[0] = State(name=p[2], lineno=p.slice[2].lineno)
+        p[0] = (p[2], p.slice[2].lineno, 'state', None)
 
     def p_state_choice(self, p:yacc.Production) -> None:
         'state : STATE NAME CHOICE NEWLINE'
-        p[0] = State(name=p[2], lineno=p.slice[2].lineno, state_type=StateType.CHOICE)
+        p[0] = (p[2], p.slice[2].lineno, 'choice_state', None)
 
     def p_ignore_line_with_error(self, p:yacc.Production) -> None:
         'ignore : error NEWLINE'
@@ -250,56 +332,43 @@ class FloHsmParser(object):
                  | STATE NAME LBRACE NEWLINE empty RBRACE NEWLINE'''
         children = p[5] or list()
         composite = len(children) != 0
+        initial_transition = None
 
-        p[0] = State(name=p[2], lineno=p.slice[2].lineno, is_composite=composite)
-        
-        for child in children:
-            if child.name == '[*]_Initial':
-                p[0].initial_transition = child.initial_transition
-            elif child.name == 'FloHsmFinal_5OdpEA31BEcPrWrNx8u7': # final pseudo state is always at top level
-                self.states.append(child)
+        for name, lineno, kind, value in children:
+            if name == '[*]_Initial':
+                initial_transition = value
+            elif name == 'FloHsmFinal_5OdpEA31BEcPrWrNx8u7': # final pseudo state is always at top level
+                self.builder.add(name, lineno, None, kind, value)
             else:
-                child.parent = p[2]
-                self.states.append(child)
+                self.builder.add(name, lineno, p[2], kind, value)
+
+        p[0] = (p[2], p.slice[2].lineno, 'composite', (composite, initial_transition))
 
     def p_state_with_internal_transition(self, p:yacc.Production) -> None:
         '''state : STATE NAME event_with_optional_guard action NEWLINE'''
-        s = State(name=p[2], lineno=p.slice[2].lineno)
-        transition = InternalTransition(event=p[3].get('event'), guard=p[3].get('guard'), action=p[4])
-        s.internal_transitions.append(transition)
-        p[0] = s
+        transition = InternalTransition(event=p[3][0], guard=p[3][1], action=p[4])
+        p[0] = (p[2], p.slice[2].lineno, 'internal', transition)
 
     def p_state_with_entry(self, p:yacc.Production) -> None:
         '''state : STATE NAME entry_with_optional_guard action NEWLINE'''
-        s = State(name=p[2], lineno=p.slice[2].lineno)
-        s.entry = EntryExit(guard=p[3], action=p[4])
-        p[0] = s
+        p[0] = (p[2], p.slice[2].lineno, 'entry', EntryExit(guard=p[3], action=p[4]))
 
     def p_state_with_exit(self, p:yacc.Production) -> None:
         '''state : STATE NAME exit_with_optional_guard action NEWLINE'''
-        s = State(name=p[2], lineno=p.slice[2].lineno)
-        s.exit = EntryExit(guard=p[3], action=p[4])
-        p[0] = s
+        p[0] = (p[2], p.slice[2].lineno, 'exit', EntryExit(guard=p[3], action=p[4]))
 
     def p_state_with_internal_transition_without_keyword_state(self, p:yacc.Production) -> None:
-        '''state : NAME event_with_optional_guard action NEWLINE
-                 | NAME event action NEWLINE'''
-        s = State(name=p[1], lineno=p.slice[1].lineno)
-        transition = InternalTransition(event=p[2].get('event'), guard=p[2].get('guard'), action=p[3])
-        s.internal_transitions.append(transition)
-        p[0] = s
+        '''state : NAME event_with_optional_guard action NEWLINE'''
+        transition = InternalTransition(event=p[2][0], guard=p[2][1], action=p[3])
+        p[0] = (p[1], p.slice[1].lineno, 'internal', transition)
 
     def p_state_with_entry_without_keyword_state(self, p:yacc.Production) -> None:
         '''state : NAME entry_with_optional_guard action NEWLINE'''
-        s = State(name=p[1], lineno=p.slice[1].lineno)
-        s.entry = EntryExit(guard=p[2], action=p[3])
-        p[0] = s
+        p[0] = (p[1], p.slice[1].lineno, 'entry', EntryExit(guard=p[2], action=p[3]))
 
     def p_state_with_exit_without_keyword_state(self, p:yacc.Production) -> None:
         '''state : NAME exit_with_optional_guard action NEWLINE'''
-        s = State(name=p[1], lineno=p.slice[1].lineno)
-        s.exit = EntryExit(guard=p[2], action=p[3])
-        p[0] = s
+        p[0] = (p[1], p.slice[1].lineno, 'exit', EntryExit(guard=p[2], action=p[3]))
 
     def p_empty(self, p:yacc.Production) -> None:
         'empty :'
@@ -313,8 +382,8 @@ class FloHsmParser(object):
         if p is None:
             a = [token.value for token in self.parser.symstack[1:]]
             stack = ' '.join([token.value for token in self.parser.symstack[1:] if token.value is not None])
-            self.errors.append('Unexpected end of file')
+            self.add_error('Unexpected end of file', [self.lexer.line_number()])
         elif p.type == 'lexerror':
-            self.errors.append('Lexical error: illegal token \'{}\' (hex: {}) of type ({}, {})'.format(p.value, binascii.hexlify(bytes(p.value, 'utf-8')), p.type, p.lineno, p.lexpos))
+            self.add_error('Lexical error: illegal token \'{}\' (hex: {}) of type ({}, {})'.format(p.value, binascii.hexlify(bytes(p.value, 'utf-8')), p.type, p.lineno, p.lexpos), [p.lineno])
         else:
-            self.errors.append('Syntax error: unexpected token \'{}\' (hex: {}) of type {} ({}, {})'.format(p.value, binascii.hexlify(bytes(p.value, 'utf-8')), p.type, p.lineno, p.lexpos))
\ No newline at end of file
+            self.add_error('Syntax error: unexpected token \'{}\' (hex: {}) of type {} ({}, {})'.format(p.value, binascii.hexlify(bytes(p.value, 'utf-8')), p.type, p.lineno, p.lexpos), [p.lineno])
\ No newline at end of file
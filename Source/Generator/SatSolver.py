@@ -0,0 +1,238 @@
+from typing import List, Dict, Set, Tuple, Optional
+
+class SatSolver(object):
+    # CDCL (conflict driven clause learning) SAT solver for formulas in conjunctive normal form.
+    # Variables are positive integers, a literal is a variable or its negation. Clauses are watched
+    # by two literals, conflicts are analyzed up to the first unique implication point and the learned
+    # clauses are kept for later calls of solve, which can have different assumptions
+    number_of_variables : int
+    clauses : List[List[int]]
+    watches : Dict[int, List[int]]
+    values : List[Optional[bool]]
+    levels : List[int]
+    reasons : List[Optional[int]]
+    activity : List[float]
+    trail : List[int]
+    trail_limits : List[int]
+    propagated : int
+    unsatisfiable : bool
+
+    def __init__(self) -> None:
+        self.number_of_variables = 0
+        self.clauses = list()
+        self.watches = dict()
+        self.values = [None]
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        self.activity_increment = 1.0
+        self.trail = list()
+        self.trail_limits = list()
+        self.propagated = 0
+        self.unsatisfiable = False
+
+    def new_variable(self) -> int:
+        self.number_of_variables += 1
+        self.values.append(None)
+        self.levels.append(0)
+        self.reasons.append(None)
+        self.activity.append(0.0)
+        self.watches[self.number_of_variables] = list()
+        self.watches[-self.number_of_variables] = list()
+        return self.number_of_variables
+
+    def add_clause(self, literals:List[int]) -> None:
+        self.backtrack(0)
+        clause = list(dict.fromkeys(literals))
+        if any(-l in clause for l in clause):
+            return
+
+        # Literals that are false at level 0 can be removed
+        clause = [l for l in clause if self.value(l) is not False]
+        if any(self.value(l) is True for l in clause):
+            return
+
+        if len(clause) == 0:
+            self.unsatisfiable = True
+        elif len(clause) == 1:
+            self.assign(clause[0], None)
+            if self.propagate() is not None:
+                self.unsatisfiable = True
+        else:
+            self.attach(clause)
+
+    def attach(self, clause:List[int]) -> int:
+        index = len(self.clauses)
+        self.clauses.append(clause)
+        self.watches[clause[0]].append(index)
+        self.watches[clause[1]].append(index)
+        return index
+
+    def value(self, literal:int) -> Optional[bool]:
+        value = self.values[abs(literal)]
+        if value is None:
+            return None
+
+        return value if literal > 0 else not value
+
+    def assign(self, literal:int, reason:Optional[int]) -> None:
+        variable = abs(literal)
+        self.values[variable] = literal > 0
+        self.levels[variable] = len(self.trail_limits)
+        self.reasons[variable] = reason
+        self.trail.append(literal)
+
+    def backtrack(self, level:int) -> None:
+        if len(self.trail_limits) <= level:
+            return
+
+        for literal in self.trail[self.trail_limits[level]:]:
+            self.values[abs(literal)] = None
+            self.reasons[abs(literal)] = None
+
+        del self.trail[self.trail_limits[level]:]
+        del self.trail_limits[level:]
+        self.propagated = len(self.trail)
+
+    def propagate(self) -> Optional[int]:
+        # Returns the index of a conflicting clause, or None when all implications are assigned.
+        # The first two literals of a clause are watched. The implied literal of a unit clause is
+        # always the first, so that conflict analysis finds it there
+        while self.propagated < len(self.trail):
+            false_literal = -self.trail[self.propagated]
+            self.propagated += 1
+
+            watching = self.watches[false_literal]
+            self.watches[false_literal] = list()
+            for position, index in enumerate(watching):
+                clause = self.clauses[index]
+                if clause[0] == false_literal:
+                    clause[0], clause[1] = clause[1], clause[0]
+
+                if self.value(clause[0]) is True:
+                    self.watches[false_literal].append(index)
+                    continue
+
+                for i in range(2, len(clause)):
+                    if self.value(clause[i]) is not False:
+                        clause[1], clause[i] = clause[i], clause[1]
+                        self.watches[clause[1]].append(index)
+                        break
+                else:
+                    self.watches[false_literal].append(index)
+                    if self.value(clause[0]) is False:
+                        self.watches[false_literal].extend(watching[position + 1:])
+                        return index
+
+                    self.assign(clause[0], index)
+
+        return None
+
+    def analyze(self, conflict:int) -> Tuple[List[int], int]:
+        # Resolves the conflicting clause with the reasons of the literals of the current decision
+        # level, until one literal of that level is left. Returns the learned clause, with that
+        # literal first, and the level to backtrack to
+        level = len(self.trail_limits)
+        seen: Set[int] = set()
+        learned = [0]
+        pending = 0
+        literal = 0
+        clause = self.clauses[conflict]
+        position = len(self.trail) - 1
+
+        while True:
+            for l in (clause if literal == 0 else clause[1:]):
+                variable = abs(l)
+                if variable not in seen and self.levels[variable] > 0:
+                    seen.add(variable)
+                    self.bump(variable)
+                    if self.levels[variable] == level:
+                        pending += 1
+                    else:
+                        learned.append(l)
+
+            while abs(self.trail[position]) not in seen:
+                position -= 1
+
+            literal = self.trail[position]
+            position -= 1
+            pending -= 1
+            if pending == 0:
+                break
+
+            reason = self.reasons[abs(literal)]
+            assert reason is not None
+            clause = self.clauses[reason]
+
+        learned[0] = -literal
+
+        if len(learned) == 1:
+            return learned, 0
+
+        # The literal of the highest remaining level is watched, so that it is the first to become unassigned
+        highest = max(range(1, len(learned)), key=lambda i: self.levels[abs(learned[i])])
+        learned[1], learned[highest] = learned[highest], learned[1]
+        return learned, self.levels[abs(learned[1])]
+
+    def bump(self, variable:int) -> None:
+        self.activity[variable] += self.activity_increment
+        if self.activity[variable] > 1e100:
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.activity_increment *= 1e-100
+
+    def decide(self) -> Optional[int]:
+        # The unassigned variable with the highest activity is set to false, so that solutions
+        # with few true variables are found first
+        best = None
+        for variable in range(1, self.number_of_variables + 1):
+            if self.values[variable] is None and (best is None or self.activity[variable] > self.activity[best]):
+                best = variable
+
+        return -best if best is not None else None
+
+    def solve(self, assumptions:List[int]=None) -> Optional[List[bool]]:
+        # Returns the values of all variables (index 0 is unused) of a solution in which all
+        # assumptions are true, or None if there is no such solution
+        if self.unsatisfiable:
+            return None
+
+        assumptions = assumptions or list()
+        self.backtrack(0)
+
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                if len(self.trail_limits) == 0:
+                    self.unsatisfiable = True
+                    return None
+
+                learned, level = self.analyze(conflict)
+                self.backtrack(level)
+                if len(learned) == 1:
+                    self.assign(learned[0], None)
+                else:
+                    self.assign(learned[0], self.attach(learned))
+                self.activity_increment /= 0.95
+                continue
+
+            # Assumptions are the first decisions, one decision level each
+            level = len(self.trail_limits)
+            if level < len(assumptions):
+                literal = assumptions[level]
+                if self.value(literal) is False:
+                    self.backtrack(0)
+                    return None
+
+                self.trail_limits.append(len(self.trail))
+                if self.value(literal) is None:
+                    self.assign(literal, None)
+                continue
+
+            decision = self.decide()
+            if decision is None:
+                solution = [value is True for value in self.values]
+                self.backtrack(0)
+                return solution
+
+            self.trail_limits.append(len(self.trail))
+            self.assign(decision, None)
@@ -1,65 +1,87 @@
 ﻿from Descriptors import State, StateType, Guard, Action
-from typing import Set, List, Dict, Optional
+from Diagnostics import Diagnostic
+from GuardAnalysis import GuardEngine, guard_engine
+from SymbolTable import SymbolTable, SymbolKind
+from typing import Set, List, Dict, Optional, Tuple
 
 class SemanticAnalyzer(object):
     errors : List[str]
     warnings : List[str]
+    diagnostics : List[Diagnostic]
     states : List[State]
     state_names : List[str]
     event_names : Set[str]
     guard_names : Set[str]
     action_prototypes : Set[str]
+    symbols : SymbolTable
     state_for_name : Dict[str, State]
+    depth : Dict[str, int]
+    unsorted_states : List[State]
+    state_index : Dict[str, int]
+    guard_engine : GuardEngine
 
-    def __init__(self) -> None:
+    def __init__(self, guard_engine_name:str=None) -> None:
         self.errors = list()
         self.warnings = list()
+        self.diagnostics = list()
         self.states = list()
         self.state_names = list()
         self.event_names = set()
         self.guard_names = set()
         self.action_prototypes = set()
+        self.symbols = SymbolTable()
         self.state_for_name = dict()
-
-    def remove_reachable_states(self, reachable_root:State, possibly_unreachable_states:List[str]) -> None:
-        if reachable_root.name in possibly_unreachable_states:
-            possibly_unreachable_states.remove(reachable_root.name)
-
-        if len(possibly_unreachable_states) == 0:
+        self.depth = dict()
+        self.unsorted_states = list()
+        self.state_index = dict()
+        self.guard_engine = guard_engine(guard_engine_name)
+
+    def add_error(self, message:str, lines:List[int]=None) -> None:
+        self.errors.append(message)
+        self.diagnostics.append(Diagnostic(Diagnostic.ERROR, message, lines))
+
+    def add_warning(self, message:str, lines:List[int]=None) -> None:
+        self.warnings.append(message)
+        self.diagnostics.append(Diagnostic(Diagnostic.WARNING, message, lines))
+
+    def reachable_states(self, root:State) -> bytearray:
+        # Flags for the states (in the order of self.states) that are reachable from root. A state
+        # reaches the targets of its initial transition, state transitions and choice transitions, and
+        # its parent, because a state is always active together with its parent and the transitions of
+        # the parent leave the state as well. The search is iterative, so long chains of transitions and
+        # deep hierarchies don't hit the recursion limit. Every reachable state is expanded once,
+        # unknown states are ignored. The positions of the states are known from sort_states
+        index = self.state_index
+        reachable = bytearray(len(self.states))
+        pending = [index[root.name]]
+        reachable[pending[0]] = 1
+        while len(pending) != 0:
+            state = self.states[pending.pop()]
+            names = [t.toState for t in state.state_transitions]
+            if len(state.choice_transitions) != 0:
+                names.extend(t.toState for t in state.choice_transitions)
+            if state.initial_transition is not None:
+                names.append(state.initial_transition.toState)
+            if state.parent is not None:
+                names.append(state.parent)
+
+            for name in names:
+                i = index.get(name)
+                if i is not None and not reachable[i]:
+                    reachable[i] = 1
+                    pending.append(i)
+
+        return reachable
+
+    def detect_unreachable_states(self) -> None:
+        if 'FloHsmInitial_5OdpEA31BEcPrWrNx8u7' not in self.state_for_name:
+            self.add_error('No top-level initial transition found')
             return
 
-        reachable_states:List[str] = list()
-        
-        reachable : Optional[State] = reachable_root
-        while reachable is not None:
-            # Break on recursion
-            if reachable.name in reachable_states:
-                break
-
-            # Append current state
-            if reachable.name in possibly_unreachable_states:
-                reachable_states.append(reachable.name)
-            
-            # Append current state's initial transition
-            if reachable.initial_transition is not None and reachable.initial_transition.toState in possibly_unreachable_states:
-                reachable_states.append(reachable.initial_transition.toState)
-
-            # Append current state's state transitions
-            reachable_states.extend([stateName.toState for stateName in reachable.state_transitions if stateName.toState in possibly_unreachable_states])
-
-            # TODO: unit test
-            # Append choice pseudo state's transitions
-            reachable_states.extend([stateName.toState for stateName in reachable.choice_transitions if stateName.toState in possibly_unreachable_states])
-
-            # Up one level in the state hierarchy
-            if reachable.parent is not None:
-                reachable = self.state_for_name[reachable.parent]
-            else:
-                reachable = None
-        
-        
-        for stateName in reachable_states:
-            self.remove_reachable_states(self.state_for_name[stateName], possibly_unreachable_states)
+        reachable = self.reachable_states(self.state_for_name['FloHsmInitial_5OdpEA31BEcPrWrNx8u7'])
+        for state, is_reachable in zip(self.states, reachable):
+            if not is_reachable:
+                self.add_error('State \'{}\' (line(s) {}) is not reachable'.format(state.name, state.lineno), state.lineno)
 
     def analyze_guard_expressions_always_true_or_false(self) -> None:
         guards = list()
@@ -69,169 +91,216 @@ class SemanticAnalyzer(object):
             if state.exit and state.exit.guard:
                 guards.append(state.exit.guard)
 
-            for event in state.events():
+            for event in sorted(state.events()):
                 guards.extend(state.guards_for_event(event))
                 
+        # Large models repeat the same guards, equivalent guards have the same canonical form
+        values: Dict[str, Optional[bool]] = dict()
         for guard in guards:
-            expression_always_true = True
-            expression_never_true = True
-                    
-            for i in range(0, 2**(len(guard.guard_conditions()))):
-                result = guard.evaluate(i)
-                expression_always_true = expression_always_true and result
-                expression_never_true = expression_never_true and not result
+            key = guard.canonical_string()
+            if key not in values:
+                values[key] = self.guard_engine.constant_value(guard)
+            value = values[key]
+
+            if value is True:
+                self.add_warning('Guard expression {} (State {}, line {}) always evaluates to true'.format(guard.to_string(), state.name, guard.lineno()), [guard.lineno()])
 
-            if expression_always_true:
-                self.warnings.append('Guard expression {} (State {}, line {}) always evaluates to true'.format(guard.to_string(), state.name, guard.lineno()))
+            if value is False:
+                self.add_warning('Guard expression {} (State {}, line {}) always evaluates to false'.format(guard.to_string(), state.name, guard.lineno()), [guard.lineno()])
 
-            if expression_never_true:
-                self.warnings.append('Guard expression {} (State {}, line {}) always evaluates to false'.format(guard.to_string(), state.name, guard.lineno()))
+    def conditions_string(self, guard_conditions:Set[str], bit_index:Dict[str, int], guard_values:int) -> str:
+        conditions = list()
+        for c in sorted(guard_conditions):
+            conditions.append('{}=={}'.format(c, str(guard_values & (1 << bit_index[c]) != 0).lower()))
+
+        return ' and '.join(conditions)
 
     def detect_ambiguous_transitions(self) -> None:
         for state in self.states:
-            for event in state.events():
-                guard_conditions = state.guard_conditions_for_event(event)
+            for event in sorted(state.events()):
+                # Transitions without guard are not compared, so at least two guards are needed for an overlap
                 guards = state.guards_for_event(event)
+                if len(guards) < 2:
+                    continue
 
+                guard_conditions = state.guard_conditions_for_event(event)
                 bit_index = Guard.generate_bit_index(guard_conditions)
 
-                for i in range(0, 2**(len(guard_conditions))):
-                    positive_guards = list()
-                    for g in guards:
-                        if g.evaluate(i, bit_index):
-                            positive_guards.append(g)
-
-                    if len(positive_guards) > 1:
-                        offending_conditions = list(guard_conditions)
-                        offending_conditions.sort()
-
-                        error_message = 'Ambiguous transition for event {} in {}: Guard expressions '.format(event, state.name)
-                        error_message += ' and '.join([g.to_string() for g in positive_guards])
-                        error_message += ' evaluate to true when '
-                        conditions = list()
-                        for oc in offending_conditions:
-                            conditions.append('{}=={}'.format(oc, str(i & (1 << bit_index[oc]) != 0).lower()))
+                i = self.guard_engine.first_overlap(guards, bit_index)
+                if i is not None:
+                    positive_guards = [g for g in guards if g.evaluate(i, bit_index)]
 
-                        error_message += ' and '.join(conditions)
-                        error_message += '. See lines '
-                        error_message += ' and '.join([str(g.lineno()) for g in positive_guards])
+                    error_message = 'Ambiguous transition for event {} in {}: Guard expressions '.format(event, state.name)
+                    error_message += ' and '.join([g.to_string() for g in positive_guards])
+                    error_message += ' evaluate to true when '
+                    error_message += self.conditions_string(guard_conditions, bit_index, i)
+                    error_message += '. See lines '
+                    error_message += ' and '.join([str(g.lineno()) for g in positive_guards])
 
-                        self.errors.append(error_message)
-                        break # TODO: remove break
+                    self.add_error(error_message, [g.lineno() for g in positive_guards])
 
     def detect_ambiguous_choice_transitions(self) -> None:
+        # The first assignment for which more than one guard is true and the first assignment for which
+        # no guard is true are reported, in the order of the assignments
         for state in [s for s in self.states if s.state_type == StateType.CHOICE]:
             guard_conditions = state.choice_guard_conditions()
             guards = state.choice_guards()
 
             bit_index = Guard.generate_bit_index(guard_conditions)
 
-            for i in range(0, 2**(len(guard_conditions))):
-                positive_guards = list()
-                for g in guards:
-                    if g.evaluate(i, bit_index):
-                        positive_guards.append(g)
+            assignments = [self.guard_engine.first_overlap(guards, bit_index)]
+            if len(guards) > 1:
+                assignments.append(self.guard_engine.first_uncovered(guards, bit_index))
 
-                if len(positive_guards) > 1:
-                    offending_conditions = list(guard_conditions)
-                    offending_conditions.sort()
+            for i in sorted(i for i in assignments if i is not None):
+                positive_guards = [g for g in guards if g.evaluate(i, bit_index)]
 
+                if len(positive_guards) > 1:
                     error_message = 'Ambiguous outgoing transition for choice pseudo state {}: Guard expressions '.format(state.name)
                     error_message += ' and '.join([g.to_string() for g in positive_guards])
                     error_message += ' evaluate to true when '
-                    conditions = list()
-                    for oc in offending_conditions:
-                        conditions.append('{}=={}'.format(oc, str(i & (1 << bit_index[oc]) != 0).lower()))
-
-                    error_message += ' and '.join(conditions)
+                    error_message += self.conditions_string(guard_conditions, bit_index, i)
                     error_message += '. See lines '
                     error_message += ' and '.join([str(g.lineno()) for g in positive_guards])
 
-                    self.errors.append(error_message)
-                elif len(positive_guards) == 0 and len(guards) > 1:
-                    offending_conditions = list(guard_conditions)
-                    offending_conditions.sort()
-
+                    self.add_error(error_message, [g.lineno() for g in positive_guards])
+                else:
                     error_message = 'No outgoing transition for choice pseudo state {}: Guard expressions '.format(state.name)
                     error_message += ' and '.join([g.to_string() for g in guards])
                     error_message += ' evaluate to false when '
-                    conditions = list()
-                    for oc in offending_conditions:
-                        conditions.append('{}=={}'.format(oc, str(i & (1 << bit_index[oc]) != 0).lower()))
-
-                    error_message += ' and '.join(conditions)
+                    error_message += self.conditions_string(guard_conditions, bit_index, i)
                     error_message += '. See lines '
                     error_message += ' and '.join([str(g.lineno()) for g in guards])
 
-                    self.errors.append(error_message)
+                    self.add_error(error_message, [g.lineno() for g in guards])
 
+    def add_guard_names(self, guard:Guard) -> None:
+        # Guard conditions in sorted order, so that their ids don't depend on the hash seed
+        for condition in guard.node.sorted_conditions:
+            self.symbols.add(SymbolKind.GUARD, condition)
 
-    def analyze(self, states:List[State]) -> None:
-        # merge states
+    def merge_states(self, states:List[State]) -> None:
+        # The parser creates a state for every line that mentions it. All states with the same name
+        # are merged into the first one, which is found by name, so merging is linear in the number of lines
         for state in states:
-            current_states = [s for s in self.states if s.name == state.name]
-            assert(len(current_states) < 2)
+            current = self.state_for_name.get(state.name)
 
-            if len(current_states) == 0:
+            if current is None:
                 self.states.append(state)
                 self.state_for_name[state.name] = state
             else:
-                success = current_states[0].merge(state)
+                # Errors of earlier merges were already reported with the lines of those merges
+                previous_errors = len(current.merge_errors)
+                success = current.merge(state)
                 if not success:
-                    self.errors.extend(current_states[0].merge_errors)
+                    for merge_error in current.merge_errors[previous_errors:]:
+                        self.add_error(merge_error, current.lineno + state.lineno)
+
+    def check_inheritance(self) -> None:
+        # Follows the parents of every state once, colouring states white (not visited), grey (on the
+        # current path) and black (done). A path ends at a top-level state, at an unknown parent, at a
+        # grey state (circular inheritance) or at a black state. At the end of a path, the depth in the
+        # state hierarchy of all states on the path is known, or they can't be sorted because they or
+        # one of their ancestors have a circular inheritance or an unknown parent. Every cycle and every
+        # unknown parent is found once. Messages are reported in the order of the states
+        WHITE, GREY, BLACK = 0, 1, 2
+        colour = {state.name : WHITE for state in self.states}
+        messages: Dict[str, str] = dict()
+        message_lines: Dict[str, List[int]] = dict()
+        self.depth = dict()
 
-        # sort states
-        levels:List[List[State]] = list()
-        levels.append(list())
-        numberStates = len(self.states)
-        numberSortedStates = 0
+        for state in self.states:
+            path: List[State] = list()
+            current: Optional[State] = state
+            base: Optional[int] = None
+            while current is not None and colour[current.name] == WHITE:
+                colour[current.name] = GREY
+                path.append(current)
+                parent = current.parent
+                if parent is None:
+                    base = -1
+                    current = None
+                elif parent not in self.state_for_name:
+                    messages[current.name] = 'Detected unknown state \'{}\' at line(s) {}'.format(parent, current.lineno)
+                    message_lines[current.name] = current.lineno
+                    current = None
+                else:
+                    current = self.state_for_name[parent]
+
+            if current is not None and colour[current.name] == GREY:
+                # The parent of every state of the cycle is the next state, the parent of the last is the first.
+                # Every state of the cycle is reported with the line(s) of the state that has it as parent
+                cycle = path[path.index(current):]
+                for i, member in enumerate(cycle):
+                    child = cycle[i - 1]
+                    messages[member.name] = 'Detected circular inheritance for state {} on line(s) {}'.format(member.name, child.lineno)
+                    message_lines[member.name] = child.lineno
+            elif current is not None:
+                base = self.depth.get(current.name)
+
+            for s in reversed(path):
+                colour[s.name] = BLACK
+                if base is not None:
+                    base += 1
+                    self.depth[s.name] = base
 
         for state in self.states:
-            if state.parent is None:
-                levels[-1].append(state)
-                numberSortedStates += 1
-
-        number_iterations = 0
-        while numberSortedStates != numberStates and number_iterations != numberStates:
-            number_iterations += 1
-            levels.append(list())
-            for state in self.states:
-                if state.parent in [s.name for s in levels[-2]]:
-                    levels[-1].append(state)
-                    numberSortedStates += 1
+            if state.name in messages:
+                self.add_error(messages[state.name], message_lines[state.name])
+
+    def sort_states(self) -> None:
+        # Sorts the states by their depth in the state hierarchy (see check_inheritance), top-level
+        # states first. States of the same depth keep their order. States without depth are not sorted
+        self.unsorted_states = [state for state in self.states if state.name not in self.depth]
 
-        if number_iterations == numberStates:
-            self.errors.append('Failed to sort states hierarchically. Continue with unsorted states.')
+        # Like the unsorted states, an empty list of states is reported as not sorted
+        if len(self.unsorted_states) != 0 or len(self.states) == 0:
+            self.add_error('Failed to sort states hierarchically. Continue with unsorted states.')
         else:
+            levels: List[List[State]] = [list() for _ in range(max(self.depth.values()) + 1)]
+            for state in self.states:
+                levels[self.depth[state.name]].append(state)
+
             self.states.clear()
             for level in levels:
-                for state in level:
-                    self.states.append(state)
+                self.states.extend(level)
+
+        self.state_index = {state.name : i for i, state in enumerate(self.states)}
+
+    def analyze(self, states:List[State], merge_errors:List[Tuple[str, List[int]]]=None) -> None:
+        # merge_errors are the errors of states that were merged by the parser (see FloHsmParser.parse)
+        for message, lines in merge_errors or list():
+            self.add_error(message, lines)
+
+        self.merge_states(states)
+        self.check_inheritance()
+        self.sort_states()
 
         for state in self.states:
             if state.state_type == StateType.CHOICE:
                 line_numbers = [str(l) for l in state.lineno]
                 if state.entry is not None:
-                    self.errors.append('A choice pseudo state cannot have an entry. See line(s) {}'.format(' and '.join(line_numbers)))
+                    self.add_error('A choice pseudo state cannot have an entry. See line(s) {}'.format(' and '.join(line_numbers)), state.lineno)
 
                 if state.exit is not None:
-                    self.errors.append('A choice pseudo state cannot have an exit. See line(s) {}'.format(' and '.join(line_numbers)))
+                    self.add_error('A choice pseudo state cannot have an exit. See line(s) {}'.format(' and '.join(line_numbers)), state.lineno)
 
                 if len(state.internal_transitions) != 0:
-                    self.errors.append('A choice pseudo state cannot have any internal transitions. See line(s) {}'.format(' and '.join(line_numbers)))
+                    self.add_error('A choice pseudo state cannot have any internal transitions. See line(s) {}'.format(' and '.join(line_numbers)), state.lineno)
 
                 if len(state.state_transitions) != 0:
-                    self.errors.append('A choice pseudo state cannot have any state transitions. See line(s) {}'.format(' and '.join(line_numbers)))
+                    self.add_error('A choice pseudo state cannot have any state transitions. See line(s) {}'.format(' and '.join(line_numbers)), state.lineno)
 
                 if len(state.choice_transitions) < 2:
-                    self.errors.append('A choice pseudo state must have at least two outgoing transitions. See line(s) {}'.format(' and '.join(line_numbers)))
+                    self.add_error('A choice pseudo state must have at least two outgoing transitions. See line(s) {}'.format(' and '.join(line_numbers)), state.lineno)
 
 
-        # Create list of state names, list of events, list of guards, list of action prototypes
+        # Add state names, event names, guard names and action names to the symbol table and create the set of action prototypes
+        symbols = self.symbols
         actions: List[Action] = list()
 
         for state in self.states:
-            self.state_names.append(state.name)
+            symbols.add(SymbolKind.STATE, state.name)
             
             initial_transition = state.initial_transition;
             if initial_transition is not None:
@@ -240,81 +309,65 @@ class SemanticAnalyzer(object):
                     actions.append(action)
 
             for st in state.state_transitions:
-                self.event_names.add(st.event)
+                symbols.add(SymbolKind.EVENT, st.event)
                 if st.guard is not None:
-                    self.guard_names.update(st.guard.guard_conditions())
+                    self.add_guard_names(st.guard)
                 if st.action is not None:
                     actions.append(st.action)
 
             for it in state.internal_transitions:
-                self.event_names.add(it.event)
+                symbols.add(SymbolKind.EVENT, it.event)
                 if it.guard is not None:
-                    self.guard_names.update(it.guard.guard_conditions())
+                    self.add_guard_names(it.guard)
                 if it.action is not None:
                     actions.append(it.action)
 
             for ct in state.choice_transitions:
-                self.guard_names.update(ct.guard.guard_conditions())
+                self.add_guard_names(ct.guard)
                 if ct.action is not None:
                     actions.append(ct.action)
 
             if state.entry is not None:
                 actions.append(state.entry.action)
                 if state.entry.guard is not None:
-                    self.guard_names.update(state.entry.guard.guard_conditions())
+                    self.add_guard_names(state.entry.guard)
 
             if state.exit is not None:
                 actions.append(state.exit.action)
                 if state.exit.guard is not None:
-                    self.guard_names.update(state.exit.guard.guard_conditions())
+                    self.add_guard_names(state.exit.guard)
 
         for a in actions:
+            symbols.add(SymbolKind.ACTION, a.name)
             self.action_prototypes.add(a.prototype_string())
 
-        action_names = [action.name for action in actions]
-
-        for s in self.state_names:
-            if s in self.event_names:
-                self.errors.append('State name \'{}\' is also used as event name'.format(s))
-            if s in self.guard_names:
-                self.errors.append('State name \'{}\' is also used as guard name'.format(s))
-            if s in action_names:
-                self.errors.append('State name \'{}\' is also used as action name'.format(s))
-
-        for e in self.event_names:
-            if e in self.guard_names:
-                self.errors.append('Event name \'{}\' is also used as guard name'.format(e))
-            if e in action_names:
-                self.errors.append('Event name \'{}\' is also used as action name'.format(e))
-
-        for guard in self.guard_names:
-            if guard in action_names:
-                self.errors.append('Guard name \'{}\' is also used as action name'.format(guard))
+        self.state_names = symbols.names_of(SymbolKind.STATE)
+        self.event_names = set(symbols.names_of(SymbolKind.EVENT))
+        self.guard_names = set(symbols.names_of(SymbolKind.GUARD))
+
+        # Names of different kinds are compared by their symbols, in the order in which they were added
+        for symbol in symbols.symbols_of(SymbolKind.STATE):
+            s = symbols.names[symbol]
+            if symbols.has_symbol(SymbolKind.EVENT, symbol):
+                self.add_error('State name \'{}\' is also used as event name'.format(s), self.state_for_name[s].lineno)
+            if symbols.has_symbol(SymbolKind.GUARD, symbol):
+                self.add_error('State name \'{}\' is also used as guard name'.format(s), self.state_for_name[s].lineno)
+            if symbols.has_symbol(SymbolKind.ACTION, symbol):
+                self.add_error('State name \'{}\' is also used as action name'.format(s), self.state_for_name[s].lineno)
+
+        for symbol in symbols.symbols_of(SymbolKind.EVENT):
+            e = symbols.names[symbol]
+            if symbols.has_symbol(SymbolKind.GUARD, symbol):
+                self.add_error('Event name \'{}\' is also used as guard name'.format(e))
+            if symbols.has_symbol(SymbolKind.ACTION, symbol):
+                self.add_error('Event name \'{}\' is also used as action name'.format(e))
+
+        for symbol in symbols.symbols_of(SymbolKind.GUARD):
+            if symbols.has_symbol(SymbolKind.ACTION, symbol):
+                self.add_error('Guard name \'{}\' is also used as action name'.format(symbols.names[symbol]))
 
         self.analyze_guard_expressions_always_true_or_false()
         self.detect_ambiguous_transitions()
         self.detect_ambiguous_choice_transitions()
 
-        # find inheritance conflicts
-        for name, state in self.state_for_name.items():
-            current_name = name
-            while self.state_for_name[current_name].parent is not None:
-                if self.state_for_name[current_name].parent == name:
-                    self.errors.append('Detected circular inheritance for state {} on line(s) {}'.format(name, self.state_for_name[current_name].lineno))
-                    break
-                else:
-                    parent = self.state_for_name[current_name].parent 
-                    if parent is not None:
-                        current_name = parent
-                        if current_name not in self.state_for_name:
-                            self.errors.append('Detected unknown state \'{}\' at line(s) {}'.format(current_name, self.state_for_name[name].lineno))
-                            break
-
-        if 'FloHsmInitial_5OdpEA31BEcPrWrNx8u7' not in self.state_names:
-            self.errors.append('No top-level initial transition found')
-        else:
-            possibly_unreachable_states = self.state_names.copy()
-            self.remove_reachable_states(self.state_for_name['FloHsmInitial_5OdpEA31BEcPrWrNx8u7'], possibly_unreachable_states)
-
-            for s in possibly_unreachable_states:
-                self.errors.append('State \'{}\' (line(s) {}) is not reachable'.format(s, self.state_for_name[s].lineno))
\ No newline at end of file
+        self.detect_unreachable_states()
\ No newline at end of file
@@ -0,0 +1,71 @@
+import sys
+from enum import IntEnum
+from typing import List, Dict, Optional
+
+class SymbolKind(IntEnum):
+    # Kinds are integers, so that they index the lists of the symbol table without looking up their value
+    STATE = 0
+    EVENT = 1
+    GUARD = 2
+    ACTION = 3
+
+class SymbolTable(object):
+    # Identifiers of a model. Every distinct name is stored once and has a symbol, an integer that is
+    # the same for all kinds of identifiers, so that names of different kinds are compared as integers.
+    # Within a kind, names also have dense ids (0, 1, 2, ...) in the order in which they were added.
+    # Symbols and ids map back to names
+    names : List[str]
+    symbols : Dict[str, int]
+    kind_symbols : List[List[int]]
+    kind_ids : List[Dict[int, int]]
+
+    def __init__(self) -> None:
+        self.names = list()
+        self.symbols = dict()
+        self.kind_symbols = [list() for _ in SymbolKind]
+        self.kind_ids = [dict() for _ in SymbolKind]
+
+    def symbol(self, name:str) -> int:
+        symbol = self.symbols.get(name)
+        if symbol is None:
+            symbol = len(self.names)
+            name = sys.intern(name)
+            self.names.append(name)
+            self.symbols[name] = symbol
+
+        return symbol
+
+    def add(self, kind:SymbolKind, name:str) -> int:
+        # Returns the id of the name within the kind, a name that is added again keeps its id
+        symbol = self.symbol(name)
+        ids = self.kind_ids[kind]
+        id = ids.get(symbol)
+        if id is None:
+            id = len(self.kind_symbols[kind])
+            ids[symbol] = id
+            self.kind_symbols[kind].append(symbol)
+
+        return id
+
+    def id(self, kind:SymbolKind, name:str) -> Optional[int]:
+        symbol = self.symbols.get(name)
+        if symbol is None:
+            return None
+
+        return self.kind_ids[kind].get(symbol)
+
+    def name(self, kind:SymbolKind, id:int) -> str:
+        return self.names[self.kind_symbols[kind][id]]
+
+    def size(self, kind:SymbolKind) -> int:
+        return len(self.kind_symbols[kind])
+
+    def symbols_of(self, kind:SymbolKind) -> List[int]:
+        # Symbols of the kind, in the order of their ids
+        return self.kind_symbols[kind]
+
+    def names_of(self, kind:SymbolKind) -> List[str]:
+        return [self.names[symbol] for symbol in self.kind_symbols[kind]]
+
+    def has_symbol(self, kind:SymbolKind, symbol:int) -> bool:
+        return symbol in self.kind_ids[kind]
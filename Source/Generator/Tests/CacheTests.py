@@ -0,0 +1,100 @@
+import unittest
+import os
+import io
+import contextlib
+import tempfile
+import Cache
+from Lexer import FloHsmLexer
+from Parser import FloHsmParser
+
+class CacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.temp_dir.name
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def cached_files(self) -> list:
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_explicit_cache_directory(self) -> None:
+        self.assertEqual(os.path.abspath('abc'), Cache.cache_directory('abc'))
+
+    def test_empty_cache_directory_disables_cache(self) -> None:
+        self.assertIsNone(Cache.cache_directory(''))
+
+    def test_store_and_load(self) -> None:
+        Cache.store(self.cache_dir, 'entry', {'a' : 1})
+        self.assertEqual({'a' : 1}, Cache.load(self.cache_dir, 'entry'))
+
+    def test_digest_of_chunks(self) -> None:
+        self.assertEqual(Cache.digest('S1\nS2\n', 'x'), Cache.digest_chunks(['S1', '\nS2', '\n'], 'x'))
+        self.assertEqual(Cache.digest(''), Cache.digest_chunks([]))
+
+    def test_digesting_reader(self) -> None:
+        # Chunks that the reader of the chunks didn't read are hashed as well
+        reader = Cache.DigestingReader(['S1', '\nS2', '\n'])
+        self.assertEqual('S1', next(reader))
+        self.assertEqual(Cache.digest('S1\nS2\n'), reader.digest())
+
+    def test_prune_keeps_most_recently_used_entries(self) -> None:
+        for i, name in enumerate(['model_a', 'model_b', 'model_c', 'other']):
+            Cache.store(self.cache_dir, name, i)
+            os.utime(os.path.join(self.cache_dir, name), (1000 + i, 1000 + i))
+
+        # Loading an entry makes it the most recently used one
+        self.assertEqual(0, Cache.load(self.cache_dir, 'model_a'))
+        Cache.prune(self.cache_dir, 'model_', 2)
+
+        self.assertEqual(['model_a', 'model_c', 'other'], self.cached_files())
+
+    def test_missing_entry_is_a_miss(self) -> None:
+        self.assertIsNone(Cache.load(self.cache_dir, 'entry'))
+
+    def test_corrupt_entry_is_a_miss(self) -> None:
+        with open(os.path.join(self.cache_dir, 'entry'), 'wb') as f:
+            f.write(b'garbage')
+
+        self.assertIsNone(Cache.load(self.cache_dir, 'entry'))
+
+    def test_parser_tables_are_stored_in_cache(self) -> None:
+        with contextlib.redirect_stderr(io.StringIO()):
+            FloHsmParser(self.cache_dir)
+
+        self.assertEqual(['lextab_{}.pickle'.format(FloHsmLexer.grammar_hash()),
+                          'parsetab_{}.pickle'.format(FloHsmParser.grammar_hash())], self.cached_files())
+
+    def test_parser_from_cache_parses_identically(self) -> None:
+        description = '''
+        [*] --> S1
+        state S1 {
+          [*] --> S2 : A0
+          state S2 : E1 [G1 & !G2] / A1(3)
+        }
+        S1 --> S3 : E2 / A2
+        S3 --> S1 : E3
+        '''
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            cold = FloHsmParser(self.cache_dir)
+        warm = FloHsmParser(self.cache_dir)
+
+        cold.parse(description)
+        warm.parse(description)
+
+        self.assertEqual(0, len(warm.errors))
+        self.assertEqual([s.name for s in cold.states], [s.name for s in warm.states])
+        self.assertEqual([s.parent for s in cold.states], [s.parent for s in warm.states])
+
+    def test_parser_errors_from_cache(self) -> None:
+        with contextlib.redirect_stderr(io.StringIO()):
+            FloHsmParser(self.cache_dir)
+        parser = FloHsmParser(self.cache_dir)
+
+        parser.parse('state S1 $')
+        self.assertEqual(1, len(parser.errors))
+        self.assertTrue(parser.errors[0].startswith('Lexical error: illegal token \'$\''))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,7 +1,8 @@
 ﻿import unittest
+import pickle
 from Descriptors import State, StateType, InternalTransition, InitialTransition,\
                                     StateTransition, ChoiceTransition, Action, ActionType
-from Descriptors import Guard, SimpleGuard, NotGuard, AndGuard, OrGuard, EntryExit
+from Descriptors import Guard, SimpleGuard, NotGuard, AndGuard, OrGuard, EntryExit, GuardTable
 import Helpers
 
 class DescriptorTests(Helpers.FloHsmTester):
@@ -318,6 +319,90 @@ class DescriptorTests(Helpers.FloHsmTester):
 
         self.assertTrue(g.evaluate(32, bit_index))
 
+    def test_compiled_guard_agrees_with_evaluate(self) -> None:
+        # (!G1 || ((!G2 || G3) && G1))
+        g = OrGuard(NotGuard(Helpers.TestGuard('G1')), AndGuard(OrGuard(NotGuard(Helpers.TestGuard('G2')), Helpers.TestGuard('G3')), Helpers.TestGuard('G1')))
+        
+        for bit_index in [{'G1' : 0, 'G2' : 1, 'G3' : 2}, {'G1' : 3, 'G2' : 0, 'G3' : 5}]:
+            function = g.compile(bit_index)
+            bitwise = g.compile_bitwise(bit_index)
+            # Bit i of the value of condition c is the value of c in assignment i
+            bits = [sum(1 << i for i in range(64) if i & (1 << b)) for b in range(6)]
+            words = bitwise(bits)
+            for i in range(64):
+                self.assertEqual(g.evaluate(i, bit_index), function(i))
+                self.assertEqual(g.evaluate(i, bit_index), words & (1 << i) != 0)
+
+    def test_compiled_guard_is_cached(self) -> None:
+        g = AndGuard(Helpers.TestGuard('G1'), NotGuard(Helpers.TestGuard('G2')))
+
+        self.assertIs(g.compile({'G1' : 0, 'G2' : 1}), g.compile({'G1' : 0, 'G2' : 1, 'G3' : 2}))
+        self.assertIsNot(g.compile({'G1' : 0, 'G2' : 1}), g.compile({'G1' : 1, 'G2' : 0}))
+        self.assertIs(g.guard_conditions(), g.guard_conditions())
+
+    def test_compiled_functions_belong_to_guard_table(self) -> None:
+        tables = [GuardTable(), GuardTable()]
+        guards = [OrGuard(SimpleGuard('G1', 1, table), SimpleGuard('G2', 1, table)) for table in tables]
+        functions = [g.compile({'G1' : 0, 'G2' : 1}) for g in guards]
+
+        self.assertIsNot(functions[0], functions[1])
+        self.assertEqual(1, len(tables[0].compiled_sources))
+        self.assertEqual(0, len(pickle.loads(pickle.dumps(tables[0])).compiled_sources))
+
+    def test_compile_long_guard(self) -> None:
+        # Deeper than the nesting limit of the Python parser (200)
+        conditions = ['G{}'.format(i) for i in range(250)]
+        g: Guard = Helpers.TestGuard(conditions[0])
+        for c in conditions[1:]:
+            g = AndGuard(g, Helpers.TestGuard(c))
+
+        bit_index = Guard.generate_bit_index(set(conditions))
+        self.assertTrue(g.compile(bit_index)((1 << 250) - 1))
+        self.assertFalse(g.compile(bit_index)((1 << 249) - 1))
+
+    def test_pickle_compiled_guard(self) -> None:
+        g = OrGuard(Helpers.TestGuard('G1'), Helpers.TestGuard('G2'))
+        g.compile({'G1' : 0, 'G2' : 1})
+
+        copy = pickle.loads(pickle.dumps(g))
+        self.assertEqual(g, copy)
+        self.assertTrue(copy.compile({'G1' : 0, 'G2' : 1})(2))
+
+    def test_structurally_equal_guards_share_node(self) -> None:
+        table = GuardTable()
+        g1 = AndGuard(SimpleGuard('G1', 1, table), NotGuard(SimpleGuard('G2', 1, table)))
+        g2 = AndGuard(SimpleGuard('G1', 2, table), NotGuard(SimpleGuard('G2', 2, table)))
+        g3 = AndGuard(NotGuard(SimpleGuard('G2', 3, table)), SimpleGuard('G1', 3, table))
+
+        self.assertIs(g1.node, g2.node)
+        self.assertIs(g1.operands[1].node, g3.operands[0].node)
+        self.assertIsNot(g1.node, g3.node)
+        self.assertEqual(g1, g2)
+        self.assertNotEqual(g1, g3)
+        self.assertIs(g1.guard_conditions(), g2.guard_conditions())
+        self.assertEqual(1, g1.lineno())
+        self.assertEqual(2, g2.lineno())
+
+    def test_guards_of_different_tables_are_compared_by_string(self) -> None:
+        g1 = OrGuard(SimpleGuard('G1', 1, GuardTable()), SimpleGuard('G2', 1))
+        g2 = OrGuard(SimpleGuard('G1', 1, GuardTable()), SimpleGuard('G2', 1))
+
+        self.assertIsNot(g1.node, g2.node)
+        self.assertEqual(g1, g2)
+        self.assertNotEqual(g1, NotGuard(g2))
+
+    def test_canonical_string(self) -> None:
+        a, b, c = Helpers.TestGuard('A'), Helpers.TestGuard('B'), Helpers.TestGuard('C')
+
+        self.assertEqual('(A && B)', AndGuard(b, a).canonical_string())
+        self.assertEqual('(A && B && C)', AndGuard(AndGuard(c, a), AndGuard(b, a)).canonical_string())
+        self.assertEqual('(A || B || C)', OrGuard(c, OrGuard(b, a)).canonical_string())
+        self.assertEqual('A', NotGuard(NotGuard(a)).canonical_string())
+        self.assertEqual('!A', NotGuard(NotGuard(NotGuard(a))).canonical_string())
+        self.assertEqual('A', AndGuard(a, NotGuard(NotGuard(a))).canonical_string())
+        self.assertEqual('(!(A && B) || C)', OrGuard(c, NotGuard(AndGuard(b, a))).canonical_string())
+        self.assertEqual('((A || B) && C)', AndGuard(c, OrGuard(b, a)).canonical_string())
+
     def test_guard_lineno(self) -> None:
         g1 = SimpleGuard('G1', 1234)
         g2 = SimpleGuard('G2', 4321)
@@ -376,6 +461,65 @@ class DescriptorTests(Helpers.FloHsmTester):
         self.assertEqual(1, len(s.state_transitions_for_event('E1')))
         st = s.state_transitions_for_event('E1')
 
+    def test_guards_for_event_in_order_of_internal_and_state_transitions(self) -> None:
+        g1, g2, g3 = Helpers.TestGuard('G1'), Helpers.TestGuard('G2'), Helpers.TestGuard('G3')
+        st1 = StateTransition(event='E1', toState='S2', guard=g1)
+        st2 = StateTransition(event='E1', toState='S3')
+        it1 = InternalTransition(event='E1', action=Action('A1'), guard=g2)
+        it2 = InternalTransition(event='E2', action=Action('A2'), guard=g3)
+        s = State(name='S', lineno=0, internal_transitions=[it1, it2], state_transitions=[st1, st2])
+
+        self.assertEqual([g2, g1], s.guards_for_event('E1'))
+        self.assertEqual([g3], s.guards_for_event('E2'))
+        self.assertEqual([], s.guards_for_event('E3'))
+
+    def test_event_index_is_updated_after_merge(self) -> None:
+        s1 = State(name='S', lineno=1, state_transitions=[StateTransition(event='E1', toState='S2')])
+        s2 = State(name='S', lineno=2, state_transitions=[StateTransition(event='E1', toState='S3', guard=Helpers.TestGuard('G1'))],
+                   internal_transitions=[InternalTransition(event='E2', action=Action('A2'))])
+        self.assertEqual({'E1'}, s1.events())
+        self.assertEqual(1, len(s1.state_transitions_for_event('E1')))
+
+        self.assertTrue(s1.merge(s2))
+
+        self.assertEqual({'E1', 'E2'}, s1.events())
+        self.assertEqual(['S2', 'S3'], [st.toState for st in s1.state_transitions_for_event('E1')])
+        self.assertEqual({'G1'}, s1.guard_conditions_for_event('E1'))
+        self.assertEqual(1, len(s1.internal_transitions_for_event('E2')))
+
+    def test_event_index_is_updated_after_adding_transitions(self) -> None:
+        s = State(name='S', lineno=0, state_transitions=[StateTransition(event='E1', toState='S2')])
+        self.assertEqual(set(), s.guard_conditions_for_event('E1'))
+
+        s.state_transitions.append(StateTransition(event='E1', toState='S3', guard=Helpers.TestGuard('G1')))
+        s.internal_transitions.append(InternalTransition(event='E2', action=Action('A2')))
+
+        self.assertEqual({'E1', 'E2'}, s.events())
+        self.assertEqual({'G1'}, s.guard_conditions_for_event('E1'))
+        self.assertEqual(1, len(s.internal_transitions_for_event('E2')))
+
+    def test_descriptors_have_no_instance_dict(self) -> None:
+        g = AndGuard(SimpleGuard('G1', 1), NotGuard(OrGuard(SimpleGuard('G2', 1), SimpleGuard('G3', 1))))
+        s = State(name='S', lineno=1, initial_transition=InitialTransition('S1'), entry=EntryExit(Action('A1'), g),
+                  internal_transitions=[InternalTransition('E1', Action('A2'))], state_transitions=[StateTransition('E2', 'S2', guard=g)],
+                  choice_transitions=[ChoiceTransition('S3', g)])
+        s.events()
+
+        for descriptor in [g, g.operands[1], s, s.initial_transition, s.entry, s.entry.action, s.internal_transitions[0],
+                           s.state_transitions[0], s.choice_transitions[0], s.transitions_for_event('E1')]:
+            self.assertFalse(hasattr(descriptor, '__dict__'), type(descriptor).__name__)
+
+    def test_pickle_state(self) -> None:
+        s = State(name='S', lineno=1, parent='P', internal_transitions=[InternalTransition('E1', Action('A1', ActionType.INT, '5'))],
+                  state_transitions=[StateTransition('E2', 'S2', guard=SimpleGuard('G1', 2))])
+        s.events()
+
+        copy = pickle.loads(pickle.dumps(s))
+
+        self.assertState(copy, name='S', parent='P', num_int_transitions=1, num_state_transitions=1)
+        self.assertEqual('A1(5)', copy.internal_transitions[0].action.invocation_string())
+        self.assertEqual({'G1'}, copy.guard_conditions_for_event('E2'))
+
     def test_action_prototype_and_invocation_strings(self) -> None:
         a1 = Action(name='A1', type=ActionType.INT, value='10')
         a2 = Action(name='A2', type=ActionType.FLOAT, value='12.34')
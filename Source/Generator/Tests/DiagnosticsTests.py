@@ -0,0 +1,21 @@
+import unittest
+from Diagnostics import Diagnostic
+
+class DiagnosticsTests(unittest.TestCase):
+    def test_lines_are_sorted_and_unique(self) -> None:
+        d = Diagnostic(Diagnostic.ERROR, 'message', [12, 3, 12])
+        self.assertEqual([3, 12], d.lines)
+        self.assertEqual(3, d.line())
+
+    def test_generated_states_have_no_line(self) -> None:
+        d = Diagnostic(Diagnostic.WARNING, 'message', [-1])
+        self.assertEqual([], d.lines)
+        self.assertIsNone(d.line())
+        self.assertEqual([], Diagnostic(Diagnostic.WARNING, 'message').lines)
+
+    def test_to_dict(self) -> None:
+        d = Diagnostic(Diagnostic.WARNING, 'message', [5, 2])
+        self.assertEqual({'severity' : 'warning', 'message' : 'message', 'line' : 2, 'lines' : [2, 5]}, d.to_dict())
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,235 @@
+import unittest
+import os
+import sys
+import subprocess
+import tempfile
+import json
+import concurrent.futures
+import FloHsm
+from typing import Dict
+
+generator_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+examples_dir = os.path.join(generator_dir, '..', 'Generated')
+
+class FloHsmTests(unittest.TestCase):
+    def run_generator(self, *args:str, hash_seed:str='0') -> int:
+        env = dict(os.environ, PYTHONHASHSEED=hash_seed, FLOHSM_CACHE_DIR='')
+        return subprocess.run([sys.executable, os.path.join(generator_dir, 'FloHsm.py')] + list(args),
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+
+    def generate(self, input_file:str, hash_seed:str) -> Dict[str, bytes]:
+        with tempfile.TemporaryDirectory() as outdir:
+            self.assertEqual(0, self.run_generator(input_file, '-o', outdir, hash_seed=hash_seed))
+
+            generated = dict()
+            for file_name in os.listdir(outdir):
+                with open(os.path.join(outdir, file_name), 'rb') as f:
+                    generated[file_name] = f.read()
+
+            return generated
+
+    def assertDeterministic(self, input_file:str) -> None:
+        reference = self.generate(input_file, '0')
+        self.assertIn('Interfaces.hpp', reference)
+
+        for hash_seed in ['1', '2', '12345']:
+            self.assertEqual(reference, self.generate(input_file, hash_seed))
+
+    def test_output_does_not_depend_on_hash_seed_exhaustive(self) -> None:
+        self.assertDeterministic(os.path.join(examples_dir, 'TestExhaustive', 'exhaustive.txt'))
+
+    def test_output_does_not_depend_on_hash_seed_choice(self) -> None:
+        self.assertDeterministic(os.path.join(examples_dir, 'TestChoice', 'choice.txt'))
+
+    def test_diagnostics_do_not_depend_on_hash_seed(self) -> None:
+        with tempfile.TemporaryDirectory() as outdir:
+            input_file = os.path.join(outdir, 'events.txt')
+            with open(input_file, 'w') as f:
+                f.write('[*] --> S1\n')
+                for event in ['Ea', 'Eb', 'Ec', 'Ed', 'Ee']:
+                    f.write('S1 --> S2 : {0} [G1]\nS1 --> S3 : {0} [G1 | G2]\n'.format(event))
+                f.write('S2 --> S1 : Ef [G4 | !G4]\nS2 --> S3 : Eg [G5 | !G5]\nS3 --> S1 : Eh [G4 & !G4]\n')
+
+            outputs = set()
+            for hash_seed in ['1', '2', '3', '4', '5']:
+                command = [sys.executable, os.path.join(generator_dir, 'FloHsm.py'), '--check', input_file]
+                result = subprocess.run(command, env=dict(os.environ, PYTHONHASHSEED=hash_seed, FLOHSM_CACHE_DIR=''), capture_output=True, text=True)
+                outputs.add(result.stdout)
+
+            self.assertEqual(1, len(outputs))
+            self.assertEqual(8, len(json.loads(outputs.pop())))
+
+    def test_depfile(self) -> None:
+        input_file = os.path.join(examples_dir, 'TestChoice', 'choice.txt')
+        with tempfile.TemporaryDirectory() as outdir:
+            depfile = os.path.join(outdir, 'choice.d')
+            self.assertEqual(0, self.run_generator(input_file, '-o', outdir, '--depfile', depfile))
+
+            with open(depfile, 'r') as f:
+                targets, dependencies = f.read().replace('\\\n', '').split(':', 1)
+
+            self.assertEqual([os.path.join(outdir, f) for f in ['Interfaces.hpp', 'StateIds.hpp', 'States.hpp', 'StateMachine.hpp']],
+                             targets.split())
+            dependencies_list = dependencies.split()
+            self.assertIn(os.path.abspath(input_file), dependencies_list)
+            self.assertIn(os.path.join(os.path.abspath(generator_dir), 'templates', 'Interfaces.hpp.template'), dependencies_list)
+            self.assertIn(os.path.join(os.path.abspath(generator_dir), 'Parser.py'), dependencies_list)
+
+    def test_up_to_date_run_does_not_import_parser_or_templates(self) -> None:
+        input_file = os.path.join(examples_dir, 'TestChoice', 'choice.txt')
+        with tempfile.TemporaryDirectory() as outdir:
+            self.assertEqual(0, self.run_generator(input_file, '-o', outdir))
+
+            command = [sys.executable, '-X', 'importtime', os.path.join(generator_dir, 'FloHsm.py'), input_file, '-o', outdir]
+            result = subprocess.run(command, env=dict(os.environ, FLOHSM_CACHE_DIR=''), capture_output=True, text=True)
+            self.assertEqual(0, result.returncode)
+
+            imported = [line.split('|')[-1].strip() for line in result.stderr.splitlines()]
+            for module in ['mako', 'ply', 'Parser', 'CodeGenerator']:
+                self.assertNotIn(module, imported)
+
+    def test_check(self) -> None:
+        with tempfile.TemporaryDirectory() as outdir:
+            invalid_file = os.path.join(outdir, 'invalid.txt')
+            with open(invalid_file, 'w') as f:
+                f.write('[*] --> S1\nS1 --> S2 : E1 [G1]\nS1 --> S3 : E1 [G1]\n')
+
+            valid_file = os.path.join(examples_dir, 'TestChoice', 'choice.txt')
+            command = [sys.executable, os.path.join(generator_dir, 'FloHsm.py'), '--check', valid_file, invalid_file, '-o', outdir]
+            result = subprocess.run(command, env=dict(os.environ, FLOHSM_CACHE_DIR=''), capture_output=True, text=True)
+
+            self.assertEqual(1, result.returncode)
+            self.assertEqual([{'file' : invalid_file, 'severity' : 'error', 'line' : 2, 'lines' : [2, 3],
+                               'message' : 'Ambiguous transition for event E1 in S1: Guard expressions G1 and G1 evaluate to true when G1==true. See lines 2 and 3'}],
+                             json.loads(result.stdout))
+            self.assertEqual(['invalid.txt'], os.listdir(outdir))
+
+    def test_batch(self) -> None:
+        input_files = [os.path.join(examples_dir, 'TestChoice', 'choice.txt'),
+                       os.path.join(examples_dir, 'TestExhaustive', 'exhaustive.txt')]
+        with tempfile.TemporaryDirectory() as outdir:
+            self.assertEqual(0, self.run_generator(*input_files, '-o', outdir, '--jobs', '2'))
+            self.assertEqual(['choice', 'exhaustive'], sorted(os.listdir(outdir)))
+            self.assertIn('States.hpp', os.listdir(os.path.join(outdir, 'choice')))
+            self.assertIn('States.hpp', os.listdir(os.path.join(outdir, 'exhaustive')))
+
+    def test_batch_arguments(self) -> None:
+        input_files = [os.path.join(examples_dir, 'TestChoice', 'choice.txt'),
+                       os.path.join(examples_dir, 'TestExhaustive', 'exhaustive.txt')]
+        with tempfile.TemporaryDirectory() as outdir:
+            self.assertEqual(2, self.run_generator(*input_files, '-o', outdir, '--jobs', '0'))
+            self.assertEqual(2, self.run_generator(input_files[0], input_files[0], '-o', outdir))
+            self.assertEqual(2, self.run_generator(input_files[0], os.path.join(examples_dir, 'TestChoice', 'other.txt')))
+            self.assertEqual([], os.listdir(outdir))
+
+    def test_batch_continues_after_failure(self) -> None:
+        with tempfile.TemporaryDirectory() as outdir:
+            invalid_file = os.path.join(outdir, 'invalid.txt')
+            with open(invalid_file, 'w') as f:
+                f.write('state S1 $')
+
+            input_files = [invalid_file, os.path.join(examples_dir, 'TestChoice', 'choice.txt'), os.path.join(outdir, 'missing.txt')]
+            self.assertEqual(1, self.run_generator(*input_files, '-o', outdir))
+            self.assertIn('States.hpp', os.listdir(os.path.join(outdir, 'choice')))
+            self.assertFalse(os.path.exists(os.path.join(outdir, 'invalid')))
+
+class GenerateModelTests(unittest.TestCase):
+    def read_example(self, *path:str) -> str:
+        with open(os.path.join(examples_dir, *path), 'r') as f:
+            return f.read()
+
+    def test_generate_model(self) -> None:
+        outputs = FloHsm.generate_model(self.read_example('TestChoice', 'choice.txt'), '')
+
+        self.assertEqual(['Interfaces.hpp', 'StateIds.hpp', 'StateMachine.hpp', 'States.hpp'], sorted(outputs.keys()))
+        self.assertIn('virtual void A6() = 0;', outputs['Interfaces.hpp'])
+        self.assertIn('class choice1 : public StateBase', outputs['States.hpp'])
+
+    def test_generate_model_with_errors(self) -> None:
+        with self.assertRaises(FloHsm.GenerationError) as context:
+            FloHsm.generate_model('[*] --> S1\nS1 --> S1 : E1 [G1 | !G1]', '')
+
+        self.assertEqual(['Guard expression (G1 || !G1) (State S1, line 2) always evaluates to true'], context.exception.messages)
+
+    def test_generate_model_concurrently(self) -> None:
+        texts = [self.read_example('TestChoice', 'choice.txt'),
+                 self.read_example('TestExhaustive', 'exhaustive.txt'),
+                 self.read_example('TestCompositeState', 'CompositeState.txt'),
+                 self.read_example('TestActionWithArgument', 'ActionWithArgument.txt')] * 4
+        expected = [FloHsm.generate_model(text, '') for text in texts]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            actual = list(executor.map(lambda text: FloHsm.generate_model(text, ''), texts))
+
+        self.assertEqual(expected, actual)
+
+    def test_check_uses_scanning_lexer_unless_selected(self) -> None:
+        previous = os.environ.pop('FLOHSM_LEXER', None)
+        try:
+            self.assertEqual('scanner', FloHsm.check_lexer(None))
+            self.assertEqual('ply', FloHsm.check_lexer('ply'))
+            os.environ['FLOHSM_LEXER'] = 'ply'
+            self.assertEqual('ply', FloHsm.check_lexer(None))
+        finally:
+            os.environ.pop('FLOHSM_LEXER', None)
+            if previous is not None:
+                os.environ['FLOHSM_LEXER'] = previous
+
+class WatcherTests(unittest.TestCase):
+    def write(self, path:str, text:str, mtime:int) -> None:
+        # Explicit modification times, because consecutive writes may be within the file system's timestamp resolution
+        with open(path, 'w') as f:
+            f.write(text)
+        os.utime(path, ns=(mtime, mtime))
+
+    def test_regenerates_on_change(self) -> None:
+        with tempfile.TemporaryDirectory() as outdir:
+            input_file = os.path.join(outdir, 'machine.txt')
+            self.write(input_file, '[*] --> S1\nS1 --> S2 : E1\n', 1000000000)
+
+            watcher = FloHsm.Watcher([(input_file, outdir)], '')
+            results = watcher.poll()
+            self.assertEqual(1, len(results))
+            self.assertTrue(results[0].success)
+            self.assertIn('States.hpp', os.listdir(outdir))
+            self.assertEqual([], watcher.poll())
+
+            self.write(input_file, '[*] --> S1\nS1 --> S2 : E1\nS2 --> S1 : E2\n', 2000000000)
+            results = watcher.poll()
+            self.assertEqual(1, len(results))
+            self.assertTrue(results[0].success)
+            with open(os.path.join(outdir, 'Interfaces.hpp'), 'r') as f:
+                self.assertIn('E2', f.read())
+
+    def test_unchanged_text_is_not_regenerated(self) -> None:
+        with tempfile.TemporaryDirectory() as outdir:
+            input_file = os.path.join(outdir, 'machine.txt')
+            self.write(input_file, '[*] --> S1\n', 1000000000)
+
+            watcher = FloHsm.Watcher([(input_file, outdir)], '')
+            self.assertEqual(1, len(watcher.poll()))
+
+            self.write(input_file, '[*] --> S1\n', 2000000000)
+            self.assertEqual([], watcher.poll())
+
+    def test_errors_and_missing_files(self) -> None:
+        with tempfile.TemporaryDirectory() as outdir:
+            input_file = os.path.join(outdir, 'machine.txt')
+            self.write(input_file, 'state S1 $', 1000000000)
+
+            watcher = FloHsm.Watcher([(input_file, outdir)], '')
+            results = watcher.poll()
+            self.assertEqual(1, len(results))
+            self.assertFalse(results[0].success)
+            self.assertNotEqual([], results[0].messages)
+
+            os.remove(input_file)
+            self.assertEqual([], watcher.poll())
+
+            self.write(input_file, '[*] --> S1\n', 2000000000)
+            results = watcher.poll()
+            self.assertEqual(1, len(results))
+            self.assertTrue(results[0].success)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,148 @@
+import unittest
+import random
+from GuardAnalysis import Bdd, BddEngine, EnumerationEngine, NumpyEngine, SatEngine, GuardEngine, guard_engine, GUARD_ENGINES
+from SemanticAnalyzer import SemanticAnalyzer
+from Descriptors import Guard, SimpleGuard, NotGuard, AndGuard, OrGuard, StateType, ChoiceTransition, StateTransition
+from typing import List
+import Helpers
+
+try:
+    import numpy
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
+def available_engines() -> List[str]:
+    # Engines with optional dependencies are skipped when the dependency is not installed
+    return [name for name in sorted(GUARD_ENGINES) if name != 'numpy' or numpy_available]
+
+def random_guard(rng:random.Random, conditions:List[str], depth:int) -> Guard:
+    kind = rng.randrange(4) if depth > 0 else 0
+    if kind == 0:
+        return SimpleGuard(rng.choice(conditions), 1)
+    elif kind == 1:
+        return NotGuard(random_guard(rng, conditions, depth - 1))
+    elif kind == 2:
+        return AndGuard(random_guard(rng, conditions, depth - 1), random_guard(rng, conditions, depth - 1))
+    else:
+        return OrGuard(random_guard(rng, conditions, depth - 1), random_guard(rng, conditions, depth - 1))
+
+def conjunction(guards:List[Guard]) -> Guard:
+    result = guards[0]
+    for g in guards[1:]:
+        result = AndGuard(result, g)
+    return result
+
+def disjunction(guards:List[Guard]) -> Guard:
+    result = guards[0]
+    for g in guards[1:]:
+        result = OrGuard(result, g)
+    return result
+
+class BddTests(unittest.TestCase):
+    def test_constants(self) -> None:
+        bdd = Bdd(2)
+        a = bdd.variable(0)
+        self.assertEqual(Bdd.FALSE, bdd.conjunction(a, bdd.negation(a)))
+        self.assertEqual(Bdd.TRUE, bdd.disjunction(a, bdd.negation(a)))
+
+    def test_equal_functions_have_equal_nodes(self) -> None:
+        bdd = Bdd(3)
+        a, b, c = bdd.variable(0), bdd.variable(1), bdd.variable(2)
+        self.assertEqual(bdd.disjunction(bdd.conjunction(a, b), bdd.conjunction(a, c)),
+                         bdd.conjunction(a, bdd.disjunction(b, c)))
+        self.assertEqual(bdd.negation(bdd.conjunction(a, b)),
+                         bdd.disjunction(bdd.negation(a), bdd.negation(b)))
+
+    def test_first_satisfying_levels_prefers_false_at_the_root(self) -> None:
+        bdd = Bdd(3)
+        a, b, c = bdd.variable(0), bdd.variable(1), bdd.variable(2)
+        self.assertEqual([2], bdd.first_satisfying_levels(bdd.disjunction(a, bdd.disjunction(b, c))))
+        self.assertEqual([0, 2], bdd.first_satisfying_levels(bdd.conjunction(a, c)))
+        self.assertEqual([], bdd.first_satisfying_levels(bdd.negation(a)))
+        self.assertIsNone(bdd.first_satisfying_levels(Bdd.FALSE))
+
+class GuardEngineTests(unittest.TestCase):
+    def test_unknown_engine(self) -> None:
+        with self.assertRaises(ValueError):
+            guard_engine('unknown')
+
+    def assertAgreesWithEnumeration(self, engine:GuardEngine, name:str, conditions:List[str], depth:int=3) -> None:
+        rng = random.Random(1234)
+        reference = EnumerationEngine()
+        for _ in range(200):
+            guards = [random_guard(rng, conditions, depth) for _ in range(rng.randrange(1, 5))]
+            all_conditions = set().union(*[g.guard_conditions() for g in guards])
+            bit_index = Guard.generate_bit_index(all_conditions)
+
+            self.assertEqual(reference.constant_value(guards[0]), engine.constant_value(guards[0]), name)
+            self.assertEqual(reference.first_overlap(guards, bit_index), engine.first_overlap(guards, bit_index), name)
+            self.assertEqual(reference.first_uncovered(guards, bit_index), engine.first_uncovered(guards, bit_index), name)
+
+    def test_engines_agree_with_enumeration(self) -> None:
+        for name in available_engines():
+            self.assertAgreesWithEnumeration(guard_engine(name), name, ['A', 'B', 'C', 'D', 'E'])
+
+    def test_enumeration_with_compiled_guards(self) -> None:
+        engine = EnumerationEngine()
+        engine.MIN_COMPILED_CONDITIONS = 0
+        self.assertAgreesWithEnumeration(engine, 'enumeration, compiled', ['A', 'B', 'C', 'D', 'E'])
+
+    @unittest.skipUnless(numpy_available, 'NumPy is not installed')
+    def test_numpy_engine_in_chunks(self) -> None:
+        # Chunks are at least one word (64 assignments)
+        engine = NumpyEngine()
+        engine.CHUNK_BITS = 6
+        self.assertAgreesWithEnumeration(engine, 'numpy', ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I'], depth=5)
+
+    def test_many_guard_conditions(self) -> None:
+        for engine in [BddEngine(), SatEngine()]:
+            self.assertManyGuardConditions(engine)
+
+    def assertManyGuardConditions(self, engine:GuardEngine) -> None:
+        conditions = ['G{:02}'.format(i) for i in range(40)]
+
+        tautology = conjunction([OrGuard(SimpleGuard(c, 1), NotGuard(SimpleGuard(c, 1))) for c in conditions])
+        self.assertTrue(engine.constant_value(tautology))
+        self.assertIsNone(engine.constant_value(disjunction([SimpleGuard(c, 1) for c in conditions])))
+
+        # Exactly one of the guards is true when G00..G38 are false, except when G39 is true as well
+        guards = [conjunction([SimpleGuard(c, 1) if c == d else NotGuard(SimpleGuard(c, 1)) for c in conditions[:-1]]) for d in conditions[:-1]]
+        guards.append(SimpleGuard(conditions[-1], 1))
+        bit_index = Guard.generate_bit_index(set(conditions))
+        self.assertEqual(1 | (1 << 39), engine.first_overlap(guards, bit_index))
+        self.assertEqual(0, engine.first_uncovered(guards, bit_index))
+
+class SemanticAnalyzerGuardEngineTests(Helpers.FloHsmTester):
+    def analyze(self, guard_engine_name:str, states:list) -> SemanticAnalyzer:
+        analyzer = SemanticAnalyzer(guard_engine_name)
+        analyzer.analyze(states)
+        return analyzer
+
+    def test_ambiguous_transition_with_many_guard_conditions(self) -> None:
+        for name in ['bdd', 'sat']:
+            conditions = ['G{:02}'.format(i) for i in range(30)]
+            g1 = conjunction([SimpleGuard(c, 10) for c in conditions[:20]])
+            g2 = conjunction([SimpleGuard(c, 11) for c in conditions[10:]])
+            s1 = Helpers.TestState(name='S1', lineno=2, state_transitions=[StateTransition('E1', 'S1', guard=g1), StateTransition('E1', 'S1', guard=g2)])
+
+            analyzer = self.analyze(name, [Helpers.InitialState('S1'), s1])
+
+            self.assertEqual(1, len(analyzer.errors), name)
+            self.assertIn(' evaluate to true when G00==true and ', analyzer.errors[0])
+            self.assertIn(' and G29==true. See lines 10 and 11', analyzer.errors[0])
+
+    def test_choice_reports_first_ambiguous_and_first_uncovered_assignment(self) -> None:
+        for name in available_engines():
+            s = Helpers.TestState(name='S', lineno=5, state_type=StateType.CHOICE, choice_transitions=[
+                ChoiceTransition(toState='S2', guard=SimpleGuard('A', 7)),
+                ChoiceTransition(toState='S3', guard=SimpleGuard('B', 8))])
+
+            analyzer = self.analyze(name, [Helpers.InitialState('S'), s])
+
+            self.assertEqual(['No outgoing transition for choice pseudo state S: Guard expressions A and B evaluate to false when A==false and B==false. See lines 7 and 8',
+                              'Ambiguous outgoing transition for choice pseudo state S: Guard expressions A and B evaluate to true when A==true and B==true. See lines 7 and 8'],
+                             analyzer.errors)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
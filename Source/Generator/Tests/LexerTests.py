@@ -1,16 +1,43 @@
 ﻿import unittest
-from Lexer import FloHsmLexer
+import os
+import random
+import io
+from Lexer import FloHsmLexer, ScanningLexer, create_lexer
+from LineReader import line_groups
+from typing import Any, Iterable, List, Tuple, Union
 import ply.lex as lex
 
+def tokens(lexer:Union[FloHsmLexer, ScanningLexer], text:str) -> List[Tuple[str, str, int, int]]:
+    lexer.input(text)
+    result = list()
+    t = lexer.token()
+    while t is not None:
+        result.append((t.type, t.value, t.lineno, t.lexpos))
+        t = lexer.token()
+    return result
+
+def stream_tokens(lexer:Union[FloHsmLexer, ScanningLexer], chunks:Iterable[str]) -> List[Tuple[str, str, int, int]]:
+    lexer.input_stream(chunks)
+    result = list()
+    t = lexer.token()
+    while t is not None:
+        result.append((t.type, t.value, t.lineno, t.lexpos))
+        t = lexer.token()
+    return result
+
 class LexerTests(unittest.TestCase):
+    def create_lexer(self) -> Union[FloHsmLexer, ScanningLexer]:
+        # Without the lexer table cache, so that tests don't depend on or change the cache of the user
+        return FloHsmLexer('')
+
     def setUp(self) -> None:
-        self.lexer = FloHsmLexer()
+        self.lexer = self.create_lexer()
 
     def tearDown(self) -> None:
         self.assertToken(self.lexer.token(), 'NEWLINE', '\n')
         self.assertEqual(self.lexer.token(), None)
 
-    def assertToken(self, actual:lex.Token, expectedType:str, expectedValue:str) -> None:
+    def assertToken(self, actual:Any, expectedType:str, expectedValue:str) -> None:
         self.assertEqual(actual.type, expectedType)
         self.assertEqual(actual.value, expectedValue)
 
@@ -165,5 +192,70 @@ class LexerTests(unittest.TestCase):
         self.assertToken(self.lexer.token(), 'LBRACKET', '[')
         self.assertToken(self.lexer.token(), 'RBRACE', '}')
 
+    def test_LexerCanBeReused(self) -> None:
+        self.lexer.input('A\nB')
+        self.assertToken(self.lexer.token(), 'NAME', 'A')
+        self.assertToken(self.lexer.token(), 'NEWLINE', '\n')
+        self.assertToken(self.lexer.token(), 'NAME', 'B')
+        self.assertToken(self.lexer.token(), 'NEWLINE', '\n')
+        self.assertEqual(self.lexer.token(), None)
+
+        self.lexer.input('C')
+        t = self.lexer.token()
+        self.assertToken(t, 'NAME', 'C')
+        self.assertEqual(1, t.lineno)
+
+class ScanningLexerTests(LexerTests):
+    # All tests of the PLY lexer, for the scanning lexer
+    def create_lexer(self) -> Union[FloHsmLexer, ScanningLexer]:
+        return ScanningLexer()
+
+class LexerComparisonTests(unittest.TestCase):
+    def test_same_tokens_as_ply(self) -> None:
+        ply_lexer = FloHsmLexer('')
+        scanning_lexer = ScanningLexer()
+        text = '[*] --> S1\nstate S1 {\n  S2 : E1 [!(G1 & G2) | G3] / A1(-0x1F)\n\n\tS2 --> [*] : E2 / A2(+1.5e-3)\n}\nS1 : <<entry>> / A3("a\\"b")\nS3 --> S4 : <<choice>> [G] / A4(.)\n State TRUE $ ^\n'
+        self.assertEqual(tokens(ply_lexer, text), tokens(scanning_lexer, text))
+        self.assertEqual(ply_lexer.line_number(), scanning_lexer.line_number())
+
+    def test_same_tokens_as_ply_for_random_input(self) -> None:
+        ply_lexer = FloHsmLexer('')
+        scanning_lexer = ScanningLexer()
+        rng = random.Random(1234)
+        alphabet = list('aZ_09xX.eE+-<>[]*(){}:!&|/"\\ \t\n$') + ['state', '<<choice>>', '<<entry>>', '<<exit>>', '-->', '[*]', 'TRUE', '0x1f']
+        for _ in range(500):
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randrange(30)))
+            self.assertEqual(tokens(ply_lexer, text), tokens(scanning_lexer, text), repr(text))
+            self.assertEqual(ply_lexer.line_number(), scanning_lexer.line_number())
+
+    def test_same_tokens_for_line_groups(self) -> None:
+        rng = random.Random(4321)
+        alphabet = list('aZ_09.+-[]*(){}:!&|/" \t$') + ['\n', '\n\n', 'state', '<<choice>>', '-->']
+        for lexer in [FloHsmLexer(''), ScanningLexer()]:
+            for _ in range(200):
+                text = ''.join(rng.choice(alphabet) for _ in range(rng.randrange(60)))
+                expected = tokens(lexer, text)
+                line_number = lexer.line_number()
+                for block_size in [1, 3, 8]:
+                    self.assertEqual(expected, stream_tokens(lexer, line_groups(io.StringIO(text), block_size)), repr(text))
+                    self.assertEqual(line_number, lexer.line_number())
+
+    def test_create_lexer(self) -> None:
+        self.assertIsInstance(create_lexer('ply', ''), FloHsmLexer)
+        self.assertIsInstance(create_lexer('scanner', ''), ScanningLexer)
+        with self.assertRaises(ValueError):
+            create_lexer('unknown', '')
+
+    def test_create_lexer_from_environment(self) -> None:
+        previous = os.environ.get('FLOHSM_LEXER')
+        try:
+            os.environ['FLOHSM_LEXER'] = 'scanner'
+            self.assertIsInstance(create_lexer(None, ''), ScanningLexer)
+            del os.environ['FLOHSM_LEXER']
+            self.assertIsInstance(create_lexer(None, ''), FloHsmLexer)
+        finally:
+            if previous is not None:
+                os.environ['FLOHSM_LEXER'] = previous
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
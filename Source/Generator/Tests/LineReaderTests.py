@@ -0,0 +1,48 @@
+import unittest
+import io
+import os
+import random
+import tempfile
+from LineReader import line_groups, read_line_groups
+from typing import List
+
+def groups(text:str, block_size:int) -> List[str]:
+    return list(line_groups(io.StringIO(text), block_size))
+
+class LineReaderTests(unittest.TestCase):
+    def test_groups_end_before_last_newlines_of_a_block(self) -> None:
+        self.assertEqual(['S1 --> S2', '\nS2 --> S3', '\n\nS3 : E1 / A1', '\n'], groups('S1 --> S2\nS2 --> S3\n\nS3 : E1 / A1\n', 12))
+
+    def test_long_line_is_one_group(self) -> None:
+        self.assertEqual(['S1 --> S2 : E1', '\nS2'], groups('S1 --> S2 : E1\nS2', 4))
+
+    def test_no_newline(self) -> None:
+        self.assertEqual(['S1'], groups('S1', 4))
+        self.assertEqual([], groups('', 4))
+
+    def test_groups_are_the_text(self) -> None:
+        rng = random.Random(1234)
+        for _ in range(500):
+            text = ''.join(rng.choice(['a', 'b', ' ', '\n']) for _ in range(rng.randrange(40)))
+            block_size = rng.randrange(1, 10)
+            result = groups(text, block_size)
+
+            self.assertEqual(text, ''.join(result))
+            # Runs of newlines are never split over groups
+            for group in result:
+                self.assertNotEqual('', group)
+            for first, second in zip(result, result[1:]):
+                self.assertFalse(first.endswith('\n'), repr(text))
+                self.assertTrue(second.startswith('\n'), repr(text))
+
+    def test_read_line_groups(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, 'sm.txt')
+            with open(input_file, 'w') as f:
+                f.write('[*] --> S1\nS1 --> S2 : E1\n' * 100)
+
+            self.assertEqual('[*] --> S1\nS1 --> S2 : E1\n' * 100, ''.join(read_line_groups(input_file, 64)))
+            self.assertLess(1, len(list(read_line_groups(input_file, 64))))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,77 @@
+import unittest
+import os
+import tempfile
+import Cache
+from Manifest import Manifest, MANIFEST_NAME
+
+class ManifestTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.temp_dir.name
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def manifest(self, input_hash:str='input') -> Manifest:
+        return Manifest('generator', 'sm.txt', input_hash, {'Interfaces.hpp' : 'template'})
+
+    def write(self, file_name:str, content:str) -> None:
+        with open(os.path.join(self.folder, file_name), 'w') as f:
+            f.write(content)
+
+    def test_same_inputs(self) -> None:
+        self.assertTrue(self.manifest().same_inputs(self.manifest()))
+
+    def test_different_inputs(self) -> None:
+        other = self.manifest()
+        self.assertFalse(self.manifest().same_inputs(self.manifest('changed')))
+
+        other.generator = 'changed'
+        self.assertFalse(self.manifest().same_inputs(other))
+
+        other = self.manifest()
+        other.templates['Interfaces.hpp'] = 'changed'
+        self.assertFalse(self.manifest().same_inputs(other))
+
+        other = self.manifest()
+        other.input_file = 'other.txt'
+        self.assertFalse(self.manifest().same_inputs(other))
+
+    def test_save_and_load(self) -> None:
+        manifest = self.manifest()
+        manifest.outputs['States.hpp'] = 'output'
+        manifest.save(self.folder)
+
+        loaded = Manifest.load(self.folder)
+        assert loaded is not None
+        self.assertTrue(manifest.same_inputs(loaded))
+        self.assertEqual({'States.hpp' : 'output'}, loaded.outputs)
+
+    def test_missing_or_corrupt_manifest(self) -> None:
+        self.assertIsNone(Manifest.load(self.folder))
+
+        self.write(MANIFEST_NAME, '{"generator" : ')
+        self.assertIsNone(Manifest.load(self.folder))
+
+    def test_outputs_up_to_date(self) -> None:
+        manifest = self.manifest()
+        manifest.outputs['States.hpp'] = Cache.digest('content')
+        self.write('States.hpp', 'content')
+
+        self.assertTrue(manifest.outputs_up_to_date(self.folder))
+
+    def test_changed_output_is_not_up_to_date(self) -> None:
+        manifest = self.manifest()
+        manifest.outputs['States.hpp'] = Cache.digest('content')
+        self.write('States.hpp', 'changed content')
+
+        self.assertFalse(manifest.outputs_up_to_date(self.folder))
+
+    def test_missing_output_is_not_up_to_date(self) -> None:
+        manifest = self.manifest()
+        manifest.outputs['States.hpp'] = Cache.digest('content')
+
+        self.assertFalse(manifest.outputs_up_to_date(self.folder))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
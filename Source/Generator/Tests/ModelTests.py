@@ -0,0 +1,129 @@
+import unittest
+import os
+import io
+import contextlib
+import tempfile
+import Model
+import Cache
+
+class ModelTests(unittest.TestCase):
+    description = '''
+    [*] --> S1
+    state S1 {
+      [*] --> S2 : A0
+      state S2 : E1 [G1 & !G2] / A1(3)
+    }
+    S1 --> S3 : E2 / A2
+    S3 --> S1 : E3
+    '''
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.temp_dir.name
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def model_files(self) -> list:
+        return [f for f in os.listdir(self.cache_dir) if f.startswith('model_')]
+
+    def analyze(self, text:str) -> Model.Model:
+        with contextlib.redirect_stderr(io.StringIO()):
+            return Model.analyze(text, self.cache_dir)
+
+    def test_analyzed_model(self) -> None:
+        model = self.analyze(self.description)
+
+        self.assertEqual(0, len(model.errors))
+        self.assertEqual(0, len(model.warnings))
+        self.assertEqual(['FloHsmInitial_5OdpEA31BEcPrWrNx8u7', 'S1', 'S3', 'S2'], model.state_names)
+        self.assertEqual({'E1', 'E2', 'E3'}, model.event_names)
+        self.assertEqual({'G1', 'G2'}, model.guard_names)
+        self.assertEqual({'void A0()', 'void A1(int i)', 'void A2()'}, model.action_prototypes)
+
+    def test_model_is_stored_in_cache(self) -> None:
+        self.analyze(self.description)
+        self.assertEqual(1, len(self.model_files()))
+
+    def test_model_from_cache_equals_analyzed_model(self) -> None:
+        analyzed = self.analyze(self.description)
+        cached = self.analyze(self.description)
+
+        self.assertEqual(1, len(self.model_files()))
+        self.assertEqual(analyzed.state_names, cached.state_names)
+        self.assertEqual(analyzed.event_names, cached.event_names)
+        self.assertEqual(analyzed.guard_names, cached.guard_names)
+        self.assertEqual(analyzed.action_prototypes, cached.action_prototypes)
+        self.assertEqual([s.parent for s in analyzed.states], [s.parent for s in cached.states])
+
+    def test_changed_text_is_a_cache_miss(self) -> None:
+        self.analyze(self.description)
+        model = self.analyze(self.description + 'S3 --> S2 : E4\n')
+
+        self.assertEqual(2, len(self.model_files()))
+        self.assertIn('E4', model.event_names)
+
+    def test_errors_and_warnings_are_cached(self) -> None:
+        self.analyze('state S1 $')
+        model = self.analyze('state S1 $')
+
+        self.assertEqual(1, len(model.errors))
+        self.assertTrue(model.errors[0].startswith('Lexical error'))
+
+        self.analyze('[*] --> S1\nS1 --> S1 : E1 [G1 | !G1]')
+        model = self.analyze('[*] --> S1\nS1 --> S1 : E1 [G1 | !G1]')
+        self.assertEqual(['Guard expression (G1 || !G1) (State S1, line 2) always evaluates to true'], model.warnings)
+
+    def test_analyzed_file_equals_analyzed_text(self) -> None:
+        input_file = os.path.join(self.temp_dir.name, 'sm.txt')
+        with open(input_file, 'w') as f:
+            f.write(self.description)
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            from_file = Model.analyze_file(input_file, '')
+        from_text = self.analyze(self.description)
+
+        self.assertEqual(from_text.state_names, from_file.state_names)
+        self.assertEqual(from_text.action_prototypes, from_file.action_prototypes)
+        self.assertEqual([s.parent for s in from_text.states], [s.parent for s in from_file.states])
+
+        # Both are the same cache entry
+        with contextlib.redirect_stderr(io.StringIO()):
+            Model.analyze_file(input_file, self.cache_dir)
+        self.assertEqual(1, len(self.model_files()))
+
+    def test_text_that_changes_while_it_is_analyzed(self) -> None:
+        # The text is hashed before it is parsed. A model must be stored with the text it was parsed from
+        changed = self.description + 'S3 --> S1 : E9\n'
+        texts = iter([self.description, changed])
+        with contextlib.redirect_stderr(io.StringIO()):
+            model = Model.analyze_chunks(lambda: (next(texts),), self.cache_dir)
+
+        self.assertIn('E9', model.event_names)
+        self.assertEqual(Cache.digest(changed), model.input_hash)
+        self.assertNotIn('E9', self.analyze(self.description).event_names)
+        self.assertIn('E9', self.analyze(changed).event_names)
+        self.assertEqual(2, len(self.model_files()))
+
+    def test_number_of_cached_models_is_limited(self) -> None:
+        for i in range(Model.MAX_CACHED_MODELS + 3):
+            self.analyze(self.description + 'S3 --> S2 : E{}\n'.format(i))
+
+        self.assertEqual(Model.MAX_CACHED_MODELS, len(self.model_files()))
+
+    def test_lexer(self) -> None:
+        with contextlib.redirect_stderr(io.StringIO()):
+            model = Model.analyze(self.description, '', lexer='scanner')
+            self.assertRaises(ValueError, Model.analyze, self.description, '', lexer='unknown')
+
+        self.assertEqual(self.analyze(self.description).state_names, model.state_names)
+
+    def test_no_cache(self) -> None:
+        with contextlib.redirect_stderr(io.StringIO()):
+            model = Model.analyze(self.description, '')
+
+        self.assertEqual(0, len(model.errors))
+        self.assertEqual(0, len(self.model_files()))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
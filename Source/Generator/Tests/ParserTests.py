@@ -1,11 +1,31 @@
 ﻿import unittest
+import io
 from Parser import FloHsmParser
+from LineReader import line_groups
 from Descriptors import Guard, State, StateType, Action, ActionType
+from SemanticAnalyzer import SemanticAnalyzer
+from typing import Any, List, Tuple
 import Helpers
 
+def describe(states:List[State]) -> List[Tuple[Any, ...]]:
+    # Everything the semantic analyzer and the code generator use of the states
+    def guard(g:Any) -> Any:
+        return g.to_string() if g is not None else None
+    def action(a:Any) -> Any:
+        return a.invocation_string() if a is not None else None
+
+    return [(s.name, s.lineno, s.parent, s.state_type, s.is_composite,
+             (guard(s.entry.guard), action(s.entry.action)) if s.entry else None,
+             (guard(s.exit.guard), action(s.exit.action)) if s.exit else None,
+             (s.initial_transition.toState, action(s.initial_transition.action)) if s.initial_transition else None,
+             [(t.event, guard(t.guard), action(t.action)) for t in s.internal_transitions],
+             [(t.event, t.toState, guard(t.guard), action(t.action)) for t in s.state_transitions],
+             [(t.toState, guard(t.guard), action(t.action)) for t in s.choice_transitions]) for s in states]
+
 class ParserTests(Helpers.FloHsmTester):
     def setUp(self) -> None:
-        self.parser = FloHsmParser()
+        # Without the parser table cache, so that tests don't depend on or change the cache of the user
+        self.parser = FloHsmParser('')
                 
     def parse(self, state_description:str) -> None:
         self.parser.parse(state_description)
@@ -142,6 +162,22 @@ class ParserTests(Helpers.FloHsmTester):
         
         self.assertGuard(g, '((G1 && G2) && G3)', ['G1', 'G2', 'G3']);
 
+    def test_repeated_guards_share_node(self) -> None:
+        description = 'state S1 : E1 [G1 & !G2] / A1\nstate S1 : E2 [G1 & !G2] / A1'
+
+        self.parse(description)
+        self.assertParseResult(num_states=2)
+        g1 = self.parser.states[0].internal_transitions[0].guard
+        g2 = self.parser.states[1].internal_transitions[0].guard
+
+        self.assertIs(g1.node, g2.node)
+        self.assertEqual(1, g1.lineno())
+        self.assertEqual(2, g2.lineno())
+
+        # Every model has its own table
+        self.parse(description)
+        self.assertIsNot(g1.node, self.parser.states[0].internal_transitions[0].guard.node)
+
     def test_or_guard(self) -> None:
         description = 'state S1 : E1 [G1 | G2] / A1'
 
@@ -620,5 +656,109 @@ class ParserTests(Helpers.FloHsmTester):
         self.assertStateTransition(t, to='T', event='E1', 
                                    action=Action(name='A1', type=ActionType.STRING, value='"Test123"'));
 
+    def test_parser_can_be_reused(self) -> None:
+        self.parse('state S1 $')
+        self.assertParseResult(num_states=0, num_errors=1)
+
+        self.parse('state S2\nS2 --> S3 : E1')
+        self.assertParseResult(num_states=3)
+        self.assertState(self.parser.states[0], name='S2')
+        self.assertState(self.parser.states[1], name='S2', num_state_transitions=1)
+        self.assertEqual([2], self.parser.states[1].lineno)
+
+    def test_errors_have_line_numbers(self) -> None:
+        self.parse('\n\nstate S1 $')
+        self.assertParseResult(num_states=0, num_errors=1)
+        self.assertEqual(self.parser.errors, [d.message for d in self.parser.diagnostics])
+        self.assertEqual([3], self.parser.diagnostics[0].lines)
+
+    def test_merge_while_parsing(self) -> None:
+        self.parser.parse('S1 --> S2 : E1\nstate S2\nS1 : E2 / A2', merge=True)
+
+        self.assertParseResult(num_states=2)
+        self.assertState(self.parser.states[0], name='S1', num_int_transitions=1, num_state_transitions=1)
+        self.assertState(self.parser.states[1], name='S2')
+        self.assertEqual([1, 3], self.parser.states[0].lineno)
+        self.assertEqual([1, 2], self.parser.states[1].lineno)
+        self.assertEqual([], self.parser.merge_errors)
+
+    def test_merge_while_parsing_equals_merge_of_states(self) -> None:
+        # Top-level definitions are merged after the definitions in composite states, inner composite
+        # states before outer ones. Merge errors are reported with the same lines
+        description = '''[*] --> C1
+S3 : E3 / A3
+S3 --> S4 : E1
+state C1 {
+    [*] --> S3
+    S3 : entry / A1
+    state C2 {
+        [*] --> S4
+        S4 : entry / A4
+        S4 --> S3 : E2 [G1]
+        S4 --> [*] : E5
+    }
+    state S3 : entry / A2
+    S5 --> S6 : <<choice>> [G3]
+}
+state C3 {
+    [*] --> S4
+    [*] --> S6
+    S4 : exit / A5
+}
+state S4 : entry / A6
+S4 : exit / A7
+S4 : E1 [!G1] / A8
+S6 --> S3 : <<choice>> [G2]
+S6 --> S4 : <<choice>> [!G2]
+state S6 <<choice>>
+[*] --> S3
+'''
+        self.parser.parse(description)
+        self.assertEqual([], self.parser.errors)
+        reference = SemanticAnalyzer()
+        reference.analyze(self.parser.states)
+
+        self.parser.parse(description, merge=True)
+        merged = SemanticAnalyzer()
+        merged.analyze(self.parser.states, self.parser.merge_errors)
+
+        self.assertNotEqual([], [e for e in reference.errors if e.startswith('Unable to merge')])
+        self.assertEqual(describe(reference.states), describe(merged.states))
+        self.assertEqual([(d.message, d.lines) for d in reference.diagnostics], [(d.message, d.lines) for d in merged.diagnostics])
+
+    def test_every_merge_error_is_reported_once_with_its_lines(self) -> None:
+        self.parser.parse('[*] --> S1\nS1 : <<entry>> / A1\nS1 : <<entry>> / A2\nS1 : <<exit>> / A3\nS1 : <<exit>> / A4\n', merge=True)
+
+        self.assertEqual([[1, 2, 3], [1, 2, 4, 5]], [lines for _, lines in self.parser.merge_errors])
+        self.assertTrue(self.parser.merge_errors[0][0].startswith('Unable to merge. Only one entry'))
+        self.assertTrue(self.parser.merge_errors[1][0].startswith('Unable to merge. Only one exit'))
+
+    def test_parse_stream_equals_parse(self) -> None:
+        # Errors mention the position of the token in the whole input
+        description = '''[*] --> C1
+state C1 {
+    [*] --> S3
+
+    S3 : entry / A1(1, "a")
+    S3 --> S4 : E2 [G1 & !G2]
+}
+S4 : E1 $ / A2
+S4 --> --> S3
+state S5 <<choice>>
+S5 --> S3 : <<choice>> [G3]
+S4 --> S5 : E3'''
+        self.parser.parse(description, merge=True)
+        expected = (describe(self.parser.states), self.parser.errors, self.parser.merge_errors)
+        self.assertEqual(3, len(self.parser.errors))
+
+        for block_size in [1, 10, 1000]:
+            self.parser.parse_stream(line_groups(io.StringIO(description), block_size), merge=True)
+            self.assertEqual(expected, (describe(self.parser.states), self.parser.errors, self.parser.merge_errors))
+
+class ScanningLexerParserTests(ParserTests):
+    # All parser tests, with the scanning lexer
+    def setUp(self) -> None:
+        self.parser = FloHsmParser('', 'scanner')
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,75 @@
+import unittest
+import itertools
+import random
+from SatSolver import SatSolver
+from typing import List
+
+def solver_with(number_of_variables:int, clauses:List[List[int]]) -> SatSolver:
+    solver = SatSolver()
+    for _ in range(number_of_variables):
+        solver.new_variable()
+    for c in clauses:
+        solver.add_clause(c)
+    return solver
+
+def satisfies(solution:List[bool], clauses:List[List[int]]) -> bool:
+    return all(any(solution[abs(l)] == (l > 0) for l in c) for c in clauses)
+
+class SatSolverTests(unittest.TestCase):
+    def test_empty_formula(self) -> None:
+        self.assertEqual([False], SatSolver().solve())
+
+    def test_unit_clauses(self) -> None:
+        solver = solver_with(2, [[1], [-2]])
+        self.assertEqual([False, True, False], solver.solve())
+        self.assertIsNone(solver.solve([2]))
+
+    def test_contradiction(self) -> None:
+        solver = solver_with(1, [[1], [-1]])
+        self.assertIsNone(solver.solve())
+
+    def test_assumptions(self) -> None:
+        clauses = [[1, 2], [-1, 3], [-2, 3]]
+        solver = solver_with(3, clauses)
+        self.assertIsNone(solver.solve([-3]))
+        solution = solver.solve([-1])
+        self.assertIsNotNone(solution)
+        self.assertTrue(satisfies(solution, clauses))
+        self.assertFalse(solution[1])
+
+        # Assumptions don't constrain later calls
+        self.assertIsNotNone(solver.solve([1]))
+
+    def test_pigeonhole(self) -> None:
+        # Five pigeons don't fit in four holes, which takes conflict analysis to find out
+        pigeons, holes = 5, 4
+        var = lambda p, h: p * holes + h + 1
+        clauses = [[var(p, h) for h in range(holes)] for p in range(pigeons)]
+        clauses += [[-var(p, h), -var(q, h)] for h in range(holes) for p, q in itertools.combinations(range(pigeons), 2)]
+        self.assertIsNone(solver_with(pigeons * holes, clauses).solve())
+
+        clauses = [[var(p, h) for h in range(holes)] for p in range(holes)]
+        clauses += [[-var(p, h), -var(q, h)] for h in range(holes) for p, q in itertools.combinations(range(holes), 2)]
+        solution = solver_with(holes * holes, clauses).solve()
+        self.assertIsNotNone(solution)
+        self.assertTrue(satisfies(solution, clauses))
+
+    def test_random_formulas_agree_with_enumeration(self) -> None:
+        rng = random.Random(1234)
+        for _ in range(300):
+            number_of_variables = rng.randrange(1, 8)
+            clauses = [[rng.choice([-1, 1]) * rng.randrange(1, number_of_variables + 1) for _ in range(rng.randrange(1, 4))]
+                       for _ in range(rng.randrange(1, 30))]
+            assumptions = [rng.choice([-1, 1]) * rng.randrange(1, number_of_variables + 1) for _ in range(rng.randrange(3))]
+
+            expected = any(satisfies([False] + list(values), clauses + [[a] for a in assumptions])
+                           for values in itertools.product([False, True], repeat=number_of_variables))
+
+            solver = solver_with(number_of_variables, clauses)
+            solution = solver.solve(assumptions)
+            self.assertEqual(expected, solution is not None, clauses)
+            if solution is not None:
+                self.assertTrue(satisfies(solution, clauses + [[a] for a in assumptions]))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -3,6 +3,7 @@ from SemanticAnalyzer import SemanticAnalyzer
 from Descriptors import State, StateType, InternalTransition, StateTransition,\
                                     InitialTransition, ChoiceTransition, Action, ActionType
 from Descriptors import SimpleGuard, OrGuard, AndGuard, NotGuard, EntryExit
+from SymbolTable import SymbolKind
 from typing import List, Optional
 import Helpers
 
@@ -50,6 +51,15 @@ class SemanticAnalyzerTests(Helpers.FloHsmTester):
         self.assertState(self.analyzer.states[0], name='S1')
         self.assertState(self.analyzer.states[1], name='S2')
 
+    def test_merge_interleaved_states(self) -> None:
+        states = [Helpers.TestState(name='S{}'.format(i % 3), lineno=i, state_transitions=[StateTransition('E{}'.format(i), 'S0')]) for i in range(9)]
+        self.analyzer.merge_states(states)
+
+        self.assertEqual(0, len(self.analyzer.errors))
+        self.assertEqual(['S0', 'S1', 'S2'], [s.name for s in self.analyzer.states])
+        self.assertEqual(['E1', 'E4', 'E7'], [st.event for st in self.analyzer.state_for_name['S1'].state_transitions])
+        self.assertEqual([1, 4, 7], self.analyzer.state_for_name['S1'].lineno)
+
     def test_states_with_same_name_cannot_have_different_parents(self) -> None:
         s1 = Helpers.TestState(name='S', parent='P1', lineno=7880)
         s2 = Helpers.TestState(name='S', parent='P2', lineno=6312)
@@ -64,6 +74,38 @@ class SemanticAnalyzerTests(Helpers.FloHsmTester):
         self.assertState(self.analyzer.states[1], name='P2')
         self.assertState(self.analyzer.states[2], name='S', parent='P1')
 
+    def test_states_are_sorted_by_depth(self) -> None:
+        states = [Helpers.TestState(name='C2', parent='B1'), Helpers.TestState(name='B1', parent='A'), Helpers.TestState(name='C1', parent='B2'),
+                  Helpers.TestState(name='A'), Helpers.TestState(name='B2', parent='A'), Helpers.TestState(name='D')]
+        self.analyzer.merge_states(states)
+        self.analyzer.check_inheritance()
+        self.analyzer.sort_states()
+
+        self.assertEqual(0, len(self.analyzer.errors))
+        self.assertEqual(['A', 'D', 'B1', 'B2', 'C2', 'C1'], [s.name for s in self.analyzer.states])
+
+    def test_sort_deep_hierarchy(self) -> None:
+        states = [Helpers.TestState(name='S{}'.format(i), parent='S{}'.format(i - 1) if i > 0 else None) for i in reversed(range(5000))]
+        self.analyzer.merge_states(states)
+        self.analyzer.check_inheritance()
+        self.analyzer.sort_states()
+
+        self.assertEqual(0, len(self.analyzer.errors))
+        self.assertEqual(['S{}'.format(i) for i in range(5000)], [s.name for s in self.analyzer.states])
+
+    def test_unsorted_states(self) -> None:
+        states = [Helpers.TestState(name='A'), Helpers.TestState(name='B', parent='X'), Helpers.TestState(name='C', parent='B'),
+                  Helpers.TestState(name='D', parent='E'), Helpers.TestState(name='E', parent='D')]
+        self.analyzer.merge_states(states)
+        self.analyzer.check_inheritance()
+        self.analyzer.sort_states()
+
+        self.assertEqual(['Detected unknown state \'X\' at line(s) [0]',
+                          'Detected circular inheritance for state D on line(s) [0]',
+                          'Detected circular inheritance for state E on line(s) [0]',
+                          'Failed to sort states hierarchically. Continue with unsorted states.'], self.analyzer.errors)
+        self.assertEqual(['B', 'C', 'D', 'E'], [s.name for s in self.analyzer.unsorted_states])
+
     def test_inheritance_from_self(self) -> None:
         s1 = Helpers.TestState(name='S1', parent='S1', lineno=77)
         self.analyzer.analyze([s1])
@@ -107,6 +149,26 @@ class SemanticAnalyzerTests(Helpers.FloHsmTester):
         self.assertState(self.analyzer.states[2], name='S2', parent='S3')
         self.assertState(self.analyzer.states[3], name='S3', parent='S1')
 
+    def test_circular_inheritance_of_ancestors(self) -> None:
+        s1 = Helpers.TestState(name='S1', parent='S2', lineno=1)
+        s2 = Helpers.TestState(name='S2', parent='S3', lineno=2)
+        s3 = Helpers.TestState(name='S3', parent='S2', lineno=3)
+        s4 = Helpers.TestState(name='S4', parent='S1', lineno=4)
+        self.analyzer.analyze([s4, s1, s2, s3])
+
+        self.assertEqual(['Detected circular inheritance for state S2 on line(s) [3]',
+                          'Detected circular inheritance for state S3 on line(s) [2]'],
+                         [e for e in self.analyzer.errors if 'inheritance' in e])
+
+    def test_unknown_parent_is_reported_once(self) -> None:
+        s1 = Helpers.TestState(name='S1', parent='P', lineno=1)
+        s2 = Helpers.TestState(name='S2', parent='S1', lineno=2)
+        s3 = Helpers.TestState(name='S3', parent='P', lineno=3)
+        self.analyzer.analyze([s1, s2, s3])
+
+        self.assertEqual(['Detected unknown state \'P\' at line(s) [1]', 'Detected unknown state \'P\' at line(s) [3]'],
+                         [e for e in self.analyzer.errors if 'unknown' in e])
+
     def test_parent_must_exist(self) -> None:
         s1 = Helpers.TestState(name='S', parent='P1', lineno=9294)
         self.analyzer.analyze([s1])
@@ -170,6 +232,28 @@ class SemanticAnalyzerTests(Helpers.FloHsmTester):
         self.assertEqual(1, len(self.analyzer.states))
         self.assertState(self.analyzer.states[0], name='S', num_int_transitions=1)
 
+    def test_name_collisions_are_reported_in_order_of_definition(self) -> None:
+        s1 = Helpers.TestState(name='S1', lineno=1, internal_transitions=[ InternalTransition(event='S2', action=Action('G2'), guard=Helpers.TestGuard('S1')) ])
+        s2 = Helpers.TestState(name='S2', lineno=2, internal_transitions=[ InternalTransition(event='E', action=Action('S1'), guard=Helpers.TestGuard('G2')) ])
+        self.analyzer.analyze([s1, s2])
+
+        self.assertEqual(['State name \'S1\' is also used as guard name',
+                          'State name \'S1\' is also used as action name',
+                          'State name \'S2\' is also used as event name',
+                          'Guard name \'S1\' is also used as action name',
+                          'Guard name \'G2\' is also used as action name'], self.analyzer.errors[:5])
+
+    def test_symbol_ids_of_states_are_their_positions(self) -> None:
+        s1 = Helpers.TestState(name='S1', lineno=1, internal_transitions=[ InternalTransition(event='E1', action=Action('A1')) ])
+        s2 = Helpers.TestState(name='S2', lineno=2, parent='S1', internal_transitions=[ InternalTransition(event='E2', action=Action('A1')) ])
+        self.analyzer.analyze([s2, s1])
+
+        self.assertEqual(['S1', 'S2'], self.analyzer.state_names)
+        self.assertEqual(0, self.analyzer.symbols.id(SymbolKind.STATE, 'S1'))
+        self.assertEqual(1, self.analyzer.symbols.id(SymbolKind.STATE, 'S2'))
+        self.assertEqual(['E1', 'E2'], self.analyzer.symbols.names_of(SymbolKind.EVENT))
+        self.assertEqual(['A1'], self.analyzer.symbols.names_of(SymbolKind.ACTION))
+
     def test_no_top_level_initial_transition(self) -> None:
         s = Helpers.TestState(name='S')
         self.analyzer.analyze([s])
@@ -235,6 +319,28 @@ class SemanticAnalyzerTests(Helpers.FloHsmTester):
 
         self.assertEqual(0, len(self.analyzer.errors))
 
+    def test_long_chain_of_transitions(self) -> None:
+        states: List[State] = [Helpers.InitialState('S0')]
+        states += [Helpers.TestState(name='S{}'.format(i), state_transitions=[StateTransition(event='E', toState='S{}'.format(i + 1))]) for i in range(5000)]
+        states.append(Helpers.TestState(name='S5000'))
+        states.append(Helpers.TestState(name='U', state_transitions=[StateTransition(event='E', toState='S0')]))
+        self.analyzer.analyze(states)
+
+        self.assertEqual(['State \'U\' (line(s) [0]) is not reachable'], self.analyzer.errors)
+
+    def test_reachability_with_unknown_parent_and_circular_inheritance(self) -> None:
+        initial = Helpers.InitialState('S1')
+        s1 = Helpers.TestState(name='S1', parent='X', state_transitions=[StateTransition(event='E', toState='S2')])
+        s2 = Helpers.TestState(name='S2', parent='S3')
+        s3 = Helpers.TestState(name='S3', parent='S2', state_transitions=[StateTransition(event='E', toState='S4')])
+        s4 = Helpers.TestState(name='S4')
+        s5 = Helpers.TestState(name='S5')
+        self.analyzer.analyze([initial, s1, s2, s3, s4, s5])
+
+        self.assertContainsErrorMessage('Detected unknown state \'X\' at line(s) [0]')
+        self.assertContainsErrorMessage('State \'S5\' (line(s) [0]) is not reachable')
+        self.assertEqual(1, len([e for e in self.analyzer.errors if 'is not reachable' in e]))
+
     def test_states_are_sorted_hierarchically(self) -> None:
         s1 = Helpers.TestState(name='S1')
         s2 = Helpers.TestState(name='S2')
@@ -568,5 +674,19 @@ class SemanticAnalyzerTests(Helpers.FloHsmTester):
         self.assertContainsErrorMessage('Ambiguous outgoing transition for choice pseudo state S1: Guard expressions (A && B) and (A || B) evaluate to true when A==true and B==true. See lines 2155 and 529')
         self.assertContainsErrorMessage('No outgoing transition for choice pseudo state S1: Guard expressions (A && B) and (A || B) evaluate to false when A==false and B==false. See lines 2155 and 529')
 
+    def test_diagnostics_have_line_numbers(self) -> None:
+        initial = Helpers.InitialState('S1')
+        s1 = Helpers.TestState(name='S1', lineno=741, state_type=StateType.CHOICE, choice_transitions=[
+            ChoiceTransition(toState='S2', guard=AndGuard(SimpleGuard(guard='A', lineno=2155), SimpleGuard(guard='B', lineno=2155))), 
+            ChoiceTransition(toState='S3', guard=OrGuard(SimpleGuard(guard='A', lineno=529), SimpleGuard(guard='B', lineno=529)))])
+        s4 = Helpers.TestState(name='S4', lineno=12)
+
+        self.analyzer.analyze([initial, s1, s4])
+
+        self.assertEqual(self.analyzer.errors, [d.message for d in self.analyzer.diagnostics])
+        self.assertEqual(['error'] * 3, [d.severity for d in self.analyzer.diagnostics])
+        self.assertEqual([[529, 2155], [529, 2155], [12]], [d.lines for d in self.analyzer.diagnostics])
+        self.assertEqual(529, self.analyzer.diagnostics[0].line())
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,51 @@
+import unittest
+import pickle
+from SymbolTable import SymbolTable, SymbolKind
+
+class SymbolTableTests(unittest.TestCase):
+    def test_dense_ids_per_kind(self) -> None:
+        symbols = SymbolTable()
+        self.assertEqual(0, symbols.add(SymbolKind.STATE, 'S1'))
+        self.assertEqual(1, symbols.add(SymbolKind.STATE, 'S2'))
+        self.assertEqual(0, symbols.add(SymbolKind.EVENT, 'E1'))
+        self.assertEqual(0, symbols.add(SymbolKind.STATE, 'S1'))
+
+        self.assertEqual(2, symbols.size(SymbolKind.STATE))
+        self.assertEqual(1, symbols.size(SymbolKind.EVENT))
+        self.assertEqual(0, symbols.size(SymbolKind.GUARD))
+        self.assertEqual(['S1', 'S2'], symbols.names_of(SymbolKind.STATE))
+
+    def test_reverse_maps(self) -> None:
+        symbols = SymbolTable()
+        symbols.add(SymbolKind.GUARD, 'G1')
+        symbols.add(SymbolKind.GUARD, 'G2')
+
+        self.assertEqual(1, symbols.id(SymbolKind.GUARD, 'G2'))
+        self.assertEqual('G2', symbols.name(SymbolKind.GUARD, 1))
+        self.assertIsNone(symbols.id(SymbolKind.GUARD, 'G3'))
+        self.assertIsNone(symbols.id(SymbolKind.ACTION, 'G1'))
+
+    def test_name_of_different_kinds_has_one_symbol(self) -> None:
+        symbols = SymbolTable()
+        symbols.add(SymbolKind.STATE, 'S')
+        symbols.add(SymbolKind.ACTION, 'A')
+        symbols.add(SymbolKind.EVENT, ''.join(['S']))
+
+        symbol = symbols.symbol('S')
+        self.assertEqual(2, len(symbols.names))
+        self.assertEqual([symbol], symbols.symbols_of(SymbolKind.EVENT))
+        self.assertTrue(symbols.has_symbol(SymbolKind.STATE, symbol))
+        self.assertTrue(symbols.has_symbol(SymbolKind.EVENT, symbol))
+        self.assertFalse(symbols.has_symbol(SymbolKind.ACTION, symbol))
+
+    def test_pickle(self) -> None:
+        symbols = SymbolTable()
+        symbols.add(SymbolKind.STATE, 'S1')
+        symbols.add(SymbolKind.ACTION, 'A1')
+
+        copy = pickle.loads(pickle.dumps(symbols))
+        self.assertEqual(0, copy.id(SymbolKind.ACTION, 'A1'))
+        self.assertEqual('S1', copy.name(SymbolKind.STATE, 0))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)